@@ -0,0 +1,163 @@
+# answer_cache.py
+"""
+Cache for AI answers, keyed on the normalized question, the spec context and
+the model name.
+
+Entries live in an in-process LRU with a TTL. When a SQLite path is given,
+entries are also written to disk, so they survive restarts and are shared
+between processes (e.g. several Streamlit workers on one host).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Lowercases, collapses whitespace and drops trailing punctuation, so 'What is UNH?' == 'what is  unh'."""
+    return _WHITESPACE_RE.sub(" ", question.lower()).strip().rstrip("?!. ")
+
+
+def make_cache_key(question, spec_details=None, model_name=""):
+    """Stable key for (normalized question, spec context, model name)."""
+    spec = spec_details or {}
+    parts = [
+        normalize_question(question),
+        spec.get("standard", ""), spec.get("message_type", ""), spec.get("version", ""),
+        model_name,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU + TTL answer cache with an optional SQLite backend.
+
+    Args:
+        max_entries (int): Entries kept in memory (and on disk) before the least recently used are evicted.
+        ttl_seconds (float): Age after which an entry is treated as missing.
+        db_path (str): Optional SQLite file shared between processes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries = OrderedDict()  # key -> (created_at, answer)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS answers ("
+                    "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    def _connection(self):
+        """One SQLite connection per thread; WAL lets several processes read while one writes."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Returns the cached answer for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db_path:
+            try:
+                with self._connection() as conn:
+                    row = conn.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+                    if row and now - row[1] <= self.ttl_seconds:
+                        conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+                        self._remember(key, row[1], row[0])
+                        with self._lock:
+                            self.hits += 1
+                            self.disk_hits += 1
+                        return row[0]
+            except sqlite3.Error as e:
+                print(f"WARN: Answer cache read failed: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, answer):
+        """Stores `answer` under `key` in memory and, if configured, on disk."""
+        now = time.time()
+        self._remember(key, now, answer)
+        if self.db_path:
+            try:
+                with self._connection() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO answers (key, answer, created_at, last_used) VALUES (?, ?, ?, ?)",
+                        (key, answer, now, now),
+                    )
+                    conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+                    conn.execute(
+                        "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            except sqlite3.Error as e:
+                print(f"WARN: Answer cache write failed: {e}")
+
+    def _remember(self, key, created_at, answer):
+        with self._lock:
+            self._entries[key] = (created_at, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM answers")
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "backend": "sqlite" if self.db_path else "memory",
+            }
+
+
+def answer_cache_from_env():
+    """Builds the cache from GEMINI_CACHE_MAX_ENTRIES, GEMINI_CACHE_TTL_SECONDS and GEMINI_CACHE_DB_PATH."""
+    return AnswerCache(
+        max_entries=int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        db_path=os.getenv("GEMINI_CACHE_DB_PATH") or None,
+    )
@@ -0,0 +1,90 @@
+# app_resources.py
+"""
+Process-wide resources of the Streamlit app.
+
+Streamlit re-executes main_app.py on every interaction. The DB client, the
+Gemini model, the spec maps and the stylesheet do not depend on the session,
+so they are built once per process behind st.cache_resource here. They are
+defined in this module rather than in main_app: modules main_app imports are
+loaded once, while decorators in the script itself would run again (and
+inspect the function's source) on every rerun.
+
+Clearing the caches (Streamlit's "Clear cache" menu entry, or
+clear_app_caches()) also resets the auth_db and gemini_handler singletons, so
+rotated credentials or an edited spec list take effect without restarting the
+server. The stylesheet is read again when its modification time changes.
+"""
+import os
+
+import streamlit as st
+
+from auth_db import get_db, reset_db
+
+DEFAULT_APP_ID = 'default-app-id-local-dev'
+
+
+def _reset_model(_model):
+    from gemini_handler import reset_model
+    reset_model()
+
+
+@st.cache_resource(show_spinner=False, on_release=lambda _: reset_db())
+def app_db():
+    """(db, is_mock_db) from auth_db.get_db."""
+    return get_db()
+
+
+@st.cache_resource(show_spinner=False, on_release=_reset_model)
+def app_model():
+    """The Gemini model from gemini_handler.get_model, or None if unavailable."""
+    from gemini_handler import get_model
+    return get_model()
+
+
+@st.cache_resource(show_spinner=False)
+def load_spec_maps():
+    """(EDI_SPEC_DETAILS_MAP, LOCAL_SPEC_OPTIONS_MAP); shared by all sessions, never mutated."""
+    spec_details_map = {
+        "DELFOR_D04A": {"display": "DELFOR D04A", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D04A"},
+        "DELFOR_D96A": {"display": "DELFOR D96A", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D96A"},
+        "DESADV_D07A": {"display": "DESADV D07A", "standard": "EDIFACT", "message_type": "DESADV", "version": "D07A"},
+        "DESADV_D96A": {"display": "DESADV D96A", "standard": "EDIFACT", "message_type": "DESADV", "version": "D96A"},
+        "X12_830_004010": {"display": "830 004010", "standard": "X12", "message_type": "830", "version": "004010"},
+        "X12_856_004010": {"display": "856 004010", "standard": "X12", "message_type": "856", "version": "004010"},
+    }
+    spec_options_map = {"Select a Specification...": None}
+    for key, details in spec_details_map.items():
+        spec_options_map[details["display"]] = key
+    return spec_details_map, spec_options_map
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _read_css(file_path, mtime):
+    with open(file_path, "r", encoding='utf-8') as f:
+        return f.read()
+
+
+def read_css(file_path):
+    """Contents of the stylesheet at `file_path`, or None if it does not exist."""
+    try:
+        mtime = os.path.getmtime(file_path)
+    except OSError:
+        return None
+    return _read_css(file_path, mtime)
+
+
+@st.cache_resource(show_spinner=False)
+def announce_startup(app_id, collection):
+    """Prints the startup lines once per process instead of on every rerun."""
+    print(f"--- SCRIPT START (Auth Debug v7) ---")
+    if app_id != DEFAULT_APP_ID:
+        print(f"CANVAS_ENV: Using provided __app_id: {app_id}")
+    else:
+        print(f"LOCAL_ENV: __app_id not found in globals, using default: {app_id}")
+    print(f"DB_STATUS: Connected on first login/registration (auth_db.get_db). Collection path: {collection}")
+
+
+def clear_app_caches():
+    """Drops every cached process-wide resource; each is rebuilt on next use."""
+    st.cache_resource.clear()
+    st.cache_data.clear()
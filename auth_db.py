@@ -0,0 +1,357 @@
+# auth_db.py
+# User credential database for main_app. The Firebase Admin SDK is imported and the
+# credential probing chain runs only when the database is first needed (login or
+# registration), and only once per process: this module, unlike the Streamlit script,
+# is not re-executed on every rerun.
+#
+# Without Firebase credentials, users are kept in a local SQLite file (AUTH_DB_PATH)
+# that survives browser sessions and restarts. Bulk import of supplier accounts:
+#     python auth_db.py import users.csv [--collection <path>] [--replace]
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import streamlit as st
+
+DEFAULT_AUTH_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "auth_users.sqlite")
+IMPORT_BATCH_SIZE = 1000
+
+class MockFirestoreDocument:
+    def __init__(self, doc_id, data=None):
+        self.id = doc_id; self._data = data if data is not None else {}; self._exists = data is not None
+    def get(self): return self 
+    def to_dict(self): return self._data
+    @property 
+    def exists(self): return self._exists
+    def set(self, data_to_set):
+        if self.id:
+            st.session_state._mock_db_users_store_session_data[self.id] = data_to_set 
+            self._data = data_to_set; self._exists = True
+            print(f"MOCK_DB_SET (Session): User '{self.id}'. Store: {st.session_state._mock_db_users_store_session_data}")
+        else: print("MOCK_DB_SET_ERROR: Document ID is None.")
+
+class MockFirestoreQuery: 
+    def __init__(self, field, op, value):
+        self._results = []
+        if field == "email" and op == "==" and value in st.session_state._mock_db_users_store_session_data:
+            self._results.append(MockFirestoreDocument(value, st.session_state._mock_db_users_store_session_data[value]))
+    def stream(self): return self._results; 
+    def get(self): return self._results
+
+class MockFirestoreCollection:
+    def document(self, doc_id=None): 
+        if doc_id: return MockFirestoreDocument(doc_id, st.session_state._mock_db_users_store_session_data.get(doc_id))
+        raise ValueError("Mock document requires an ID for user collection.")
+    def where(self, field, op, value): return MockFirestoreQuery(field, op, value)
+
+class MockDB: 
+    def collection(self, collection_name): 
+        print(f"MOCK_DB_ACCESS: Using MockDB for collection '{collection_name}'")
+        return MockFirestoreCollection()
+
+
+# --- Local SQLite credential store (Firestore client subset used by main_app) ---
+class SqliteDocument:
+    """Document reference and snapshot in one, like the mock: `.exists`/`.to_dict()` reflect the last read."""
+    def __init__(self, db, collection_name, doc_id, data=None):
+        self._db = db; self._collection = collection_name; self.id = doc_id
+        self._data = data if data is not None else db._read(collection_name, doc_id)
+    def get(self): return SqliteDocument(self._db, self._collection, self.id)
+    def to_dict(self): return self._data
+    @property
+    def exists(self): return self._data is not None
+    def set(self, data_to_set):
+        self._db._write(self._collection, self.id, data_to_set)
+        self._data = data_to_set
+
+class SqliteQuery:
+    def __init__(self, db, collection_name, field, op, value):
+        self._db = db; self._collection = collection_name
+        self._field = field; self._op = op; self._value = value
+    def stream(self):
+        rows = self._db._query(self._collection, self._field, self._op, self._value)
+        return [SqliteDocument(self._db, self._collection, doc_id, json.loads(data)) for doc_id, data in rows]
+    def get(self): return self.stream()
+
+class SqliteCollection:
+    def __init__(self, db, collection_name):
+        self._db = db; self._name = collection_name
+    def document(self, doc_id=None):
+        if doc_id: return SqliteDocument(self._db, self._name, doc_id)
+        raise ValueError("Local document requires an ID for user collection.")
+    def where(self, field, op, value): return SqliteQuery(self._db, self._name, field, op, value)
+
+class SqliteDB:
+    """
+    File-backed stand-in for the Firestore client. Documents are JSON rows keyed by
+    (collection, doc_id) with an indexed email column. WAL mode and a busy timeout
+    let several Streamlit worker processes share the file.
+    """
+    def __init__(self, path=DEFAULT_AUTH_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []  # every thread's connection, so close() can reach them
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                email TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS documents_email ON documents (collection, email);
+            """
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Used by its own thread only; check_same_thread=False lets close() run from another one.
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Closes the connections of every thread; the store must not be used afterwards."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def collection(self, collection_name): return SqliteCollection(self, collection_name)
+
+    def _read(self, collection_name, doc_id):
+        row = self._connection().execute(
+            "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection_name, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, collection_name, doc_id, data):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, email, data) VALUES (?, ?, ?, ?)",
+                (collection_name, doc_id, data.get("email"), json.dumps(data)),
+            )
+
+    def _query(self, collection_name, field, op, value):
+        if op not in ("==", "in"):
+            raise ValueError(f"Unsupported query operator for local DB: '{op}'")
+        column = {"email": "email", "__name__": "doc_id"}.get(field)
+        if column is None:
+            column = "json_extract(data, ?)"
+            params = [f"$.{field}"]
+        else:
+            params = []
+        values = list(value) if op == "in" else [value]
+        if not values:
+            return []
+        placeholders = ", ".join("?" * len(values))
+        return self._connection().execute(
+            f"SELECT doc_id, data FROM documents WHERE collection = ? AND {column} IN ({placeholders})",
+            [collection_name] + params + values,
+        ).fetchall()
+
+    def import_documents(self, collection_name, documents, replace=False):
+        """
+        Bulk-writes (doc_id, data) pairs in batched transactions. Existing documents are
+        kept unless `replace` is set. Returns the number of documents written.
+        """
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        conn = self._connection()
+        written = 0
+        batch = []
+        def flush():
+            nonlocal written
+            with conn:
+                cursor = conn.executemany(
+                    f"{verb} INTO documents (collection, doc_id, email, data) VALUES (?, ?, ?, ?)", batch
+                )
+            written += cursor.rowcount
+            batch.clear()
+        for doc_id, data in documents:
+            batch.append((collection_name, doc_id, data.get("email"), json.dumps(data)))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        return written
+
+def _local_db():
+    """The SQLite store at AUTH_DB_PATH, or the session-only MockDB if the file cannot be opened."""
+    path = os.getenv("AUTH_DB_PATH", DEFAULT_AUTH_DB_PATH)
+    try:
+        db = SqliteDB(path)
+        print(f"INFO: Using local SQLite user store at {path}.")
+        return db
+    except sqlite3.Error as e:
+        print(f"WARN: Could not open local user store '{path}' ({e}). Using MOCK Firestore (session only).")
+        return MockDB()
+
+
+_db_lock = threading.Lock()
+_db = None
+_is_mock_db = True
+
+def _initialize_db():
+    db = None
+    is_mock_db = True # Assume mock initially
+    try:
+        print("FIREBASE_INIT: Attempting to initialize Firebase Admin SDK...")
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+    
+        if not firebase_admin._apps:
+            cred_initialized = False
+            # 1. Try GOOGLE_APPLICATION_CREDENTIALS env var (for local development)
+            google_app_creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+            if google_app_creds_path:
+                print(f"FIREBASE_INIT: Found GOOGLE_APPLICATION_CREDENTIALS env var: {google_app_creds_path}")
+                if os.path.exists(google_app_creds_path):
+                    try:
+                        cred = credentials.Certificate(google_app_creds_path) # Use Certificate for explicit path
+                        firebase_admin.initialize_app(cred)
+                        db = firestore.client()
+                        is_mock_db = False
+                        print("SUCCESS: Firebase Admin SDK initialized using GOOGLE_APPLICATION_CREDENTIALS env var (path).")
+                        cred_initialized = True
+                    except Exception as e_gac_path:
+                        print(f"WARN: Failed to init Firebase from GOOGLE_APPLICATION_CREDENTIALS path '{google_app_creds_path}': {e_gac_path}. Will try Streamlit secrets or mock.")
+                else:
+                    print(f"WARN: GOOGLE_APPLICATION_CREDENTIALS path does not exist: {google_app_creds_path}. Will try Streamlit secrets or mock.")
+        
+            # 2. Try Streamlit Secrets (for deployed environment like Streamlit Cloud)
+            if not cred_initialized and "FIREBASE_SERVICE_ACCOUNT_JSON" in st.secrets:
+                print("FIREBASE_INIT: GOOGLE_APPLICATION_CREDENTIALS not used or failed. Trying Streamlit Secret.")
+                try:
+                    cred_json_str = st.secrets["FIREBASE_SERVICE_ACCOUNT_JSON"]
+                    cred_dict = json.loads(cred_json_str)
+                    cred = credentials.Certificate(cred_dict)
+                    # Check if an app is already initialized (might happen with st.secrets in some contexts)
+                    if not firebase_admin._apps: # Re-check before initializing again
+                        firebase_admin.initialize_app(cred)
+                    else: # If already initialized (e.g. by a failed GAC attempt that still created an app object)
+                        print("WARN: Firebase app object exists, but re-initializing with Streamlit Secret.")
+                        # This scenario is tricky; ideally, only one successful init.
+                        # Forcing re-init might be needed if the first attempt was partial/failed.
+                        # However, firebase_admin.initialize_app(cred) will error if default app exists.
+                        # A more robust solution might involve naming apps if multiple initializations are possible.
+                        # For now, assume if an app exists, it might be the one we want, or it's a problem.
+                        pass # db = firestore.client() will use the existing default app.
+
+                    db = firestore.client(); is_mock_db = False
+                    print("SUCCESS: Firebase Admin SDK initialized from Streamlit Secret (FIREBASE_SERVICE_ACCOUNT_JSON).")
+                    cred_initialized = True
+                except Exception as e_streamlit_secret:
+                    print(f"WARN: Failed to init Firebase from Streamlit JSON secret: {e_streamlit_secret}")
+        
+            if not cred_initialized:
+                print("INFO: No valid REAL Firebase Admin credentials found (env var or Streamlit Secret). Using local user store.")
+                db = _local_db(); is_mock_db = True # Fallback to the local store
+        else: # Firebase app already initialized
+            db = firestore.client(); is_mock_db = False
+            print("INFO: Firebase Admin SDK already initialized (Real Firestore).")
+
+    except (ImportError, Exception) as e: 
+        print(f"WARN: General failure during Firebase Admin SDK init attempts ({type(e).__name__}: {e}). Using local user store.")
+        db = _local_db(); is_mock_db = True
+    return db, is_mock_db
+
+def get_db():
+    """Returns (db, is_mock_db), initializing Firebase (or the mock) on first use."""
+    global _db, _is_mock_db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db, _is_mock_db = _initialize_db()
+                print(f"DB_STATUS: Using {db_status()}.")
+    return _db, _is_mock_db
+
+def reset_db():
+    """
+    Drops the process-wide client; the next get_db() initializes it again (e.g. after
+    rotating credentials). Closes the local store and deletes the default Firebase app,
+    so the next initialization reads the credentials again instead of reusing the app.
+    """
+    global _db, _is_mock_db
+    with _db_lock:
+        db, _db, _is_mock_db = _db, None, True
+        if isinstance(db, SqliteDB):
+            db.close()
+        firebase_admin = sys.modules.get("firebase_admin")
+        if firebase_admin is not None and firebase_admin._apps:
+            try:
+                firebase_admin.delete_app(firebase_admin.get_app())
+            except ValueError:
+                pass  # No default app (only named ones)
+
+def db_status():
+    """Short description for logs that does not trigger initialization."""
+    if _db is None: return "not initialized"
+    if isinstance(_db, SqliteDB): return f"Local SQLite ({_db.path})"
+    return "MockDB (persists in session)" if _is_mock_db else "Real Firestore"
+
+
+# --- Bulk import ---
+def _hash_password(password):
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password)
+
+def read_user_rows(path, skipped=None):
+    """
+    Reads users from a CSV file with an 'email' column and either a 'hashed_password'
+    column or a plain 'password' column (hashed here). Yields (email, data) pairs.
+    Rows with neither are skipped rather than given a blank password; their line
+    numbers are appended to `skipped` if a list is given.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        rows = []
+        for row in reader:
+            if not (row.get("email") or "").strip():
+                continue
+            if not (row.get("hashed_password") or row.get("password")):
+                print(f"WARN: Skipping {row['email'].strip()} on line {reader.line_num} of {path}: no password or hashed_password.")
+                if skipped is not None:
+                    skipped.append(reader.line_num)
+                continue
+            rows.append(row)
+    plain = [row["password"] for row in rows if not row.get("hashed_password")]
+    if plain:
+        # Password hashing is deliberately slow (~70 ms each); spread it over all cores.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor() as executor:
+            hashes = iter(list(executor.map(_hash_password, plain, chunksize=64)))
+    for row in rows:
+        email = row["email"].strip()
+        hashed = row.get("hashed_password") or next(hashes)
+        yield email, {"email": email, "hashed_password": hashed}
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Bulk-imports user accounts into the local SQLite user store.")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("csv_path")
+    parser.add_argument("--collection", default="artifacts/default-app-id-local-dev/user_auth_credentials")
+    parser.add_argument("--db", default=os.getenv("AUTH_DB_PATH", DEFAULT_AUTH_DB_PATH))
+    parser.add_argument("--replace", action="store_true", help="Overwrite accounts that already exist.")
+    args = parser.parse_args(argv)
+    skipped = []
+    written = SqliteDB(args.db).import_documents(args.collection, read_user_rows(args.csv_path, skipped), replace=args.replace)
+    print(f"Imported {written} users into {args.db} ({args.collection}).")
+    if skipped:
+        print(f"ERROR: Skipped {len(skipped)} rows without a password.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+# benchmarks/import_time.py
+"""
+Cold import time of the app modules, and a guard against heavy imports
+creeping back onto the local (no-LLM, no-auth) path.
+
+Each module is imported in a fresh interpreter with `python -X importtime`;
+the cumulative time of the top-level import is reported, and the run fails
+(exit code 1) if a module exceeds its budget or pulls in a forbidden package.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> (budget in ms, packages that must not be imported by it)
+CHECKS = {
+    "gemini_handler": (150, ("google.generativeai", "firebase_admin", "streamlit", "requests")),
+    "edi_explainers.registry": (100, ("google.generativeai", "firebase_admin", "streamlit", "requests", "numpy")),
+    "fastapi_app": (1500, ("google.generativeai", "firebase_admin", "streamlit")),
+}
+
+
+def measure(module):
+    """Returns (cumulative import time in ms, set of imported module names)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    imported = set()
+    total_us = None
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            total_us = int(cumulative)
+    return (total_us or 0) / 1000.0, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget_ms, forbidden) in CHECKS.items():
+        samples = []
+        imported = set()
+        for _ in range(args.runs):
+            elapsed_ms, imported = measure(module)
+            samples.append(elapsed_ms)
+        median_ms = statistics.median(samples)
+        leaked = sorted(name for name in forbidden if name in imported)
+        status = "ok"
+        if median_ms > budget_ms:
+            status = f"OVER BUDGET ({budget_ms} ms)"
+        if leaked:
+            status = f"imports {', '.join(leaked)}"
+        failed = failed or status != "ok"
+        print(f"{module:<26} {median_ms:9.1f} ms  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# benchmarks/load_test.py
+"""
+Capacity test of the FastAPI service under uvicorn.
+
+Starts `fastapi_app:app` under uvicorn with --workers processes on a free
+local port (or targets a running service with --url) and drives it with an
+async client at a fixed request rate for --duration seconds, after a
+--warmup that is not counted. Requests are drawn from a weighted mix:
+  segment      POST /explain_segment/ for a random segment of a random spec
+  resource     GET  /specs/{standard}/{message_type}/{version}/segments/{segment}
+  batch        POST /explain_segments/ with BATCH_SIZE segments of one spec
+  search       GET  /search with a free-text question
+  specs        GET  /specs
+  chat         POST /chat, answered by the AI model
+  chat_stream  POST /chat with stream=true, read to the end
+Segment codes come from the service's own /specs listing.
+
+The load is open-loop (like wrk2): request i is due at start + i / rps whether
+or not earlier requests have finished, and its latency is measured from that
+due time. A saturated service therefore shows up as growing latency instead of
+as a silently lower request rate. "client lag" is how late the generator
+itself dispatched requests; if it is more than a few ms the client, not the
+service, is the bottleneck: lower --rps or run several generators. Each
+request may open its own connection (up to --connections), as independent
+users would; a smaller pool would queue fast requests behind slow chats in the
+client. Throughput counts the successful responses completed in the window.
+
+--stub-gemini starts the service with the offline stub model
+(GEMINI_STUB_MODEL) answering after --stub-latency seconds (streamed answers
+with --stub-chunk-delay between chunks) and adds chat to the mix, so the chat
+path's capacity can be measured without an API key. Without it chat is only
+sent if --mix asks for it. Note that Gemini call limits
+(GEMINI_MAX_CONCURRENT_CALLS) apply per uvicorn worker process.
+
+Usage (from the repository root):
+    python benchmarks/load_test.py [--workers 2] [--rps 200] [--duration 30] [--stub-gemini]
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --mix segment=1,resource=1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+import httpcore
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = {"segment": 10, "resource": 6, "batch": 2, "search": 1, "specs": 1}
+STUB_CHAT_MIX = {"chat": 2, "chat_stream": 2}
+BATCH_SIZE = 10
+
+SEARCH_QUERIES = [
+    "delivery schedule number",
+    "quantity per pack",
+    "ship to party address",
+    "despatch date",
+    "packaging identification",
+    "forecast period",
+]
+CHAT_QUESTIONS = [
+    "What is NAD+SE?",
+    "Explain DTM+137 and DTM+157",
+    "How do I send QTY+52 for packaging?",
+    "Is LIN mandatory?",
+    "What's the difference between NAD+ST and NAD+SF?",
+    "Which segments are needed for a DESADV with CPS, PAC and LIN groups?",
+]
+
+
+# --- Server ---
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url, server, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            httpx.get(f"{base_url}/specs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"uvicorn did not start at {base_url}")
+
+
+def start_server(args):
+    """Starts uvicorn with args.workers processes; returns (process, base URL)."""
+    port = _free_port()
+    env = dict(os.environ)
+    if args.stub_gemini:
+        env.update({
+            "GEMINI_STUB_MODEL": "1",
+            "GEMINI_STUB_LATENCY_SECONDS": str(args.stub_latency),
+            "GEMINI_STUB_CHUNK_DELAY_SECONDS": str(args.stub_chunk_delay),
+        })
+        env.pop("GEMINI_CACHE_DB_PATH", None)  # Keep stub answers out of a persistent answer cache
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fastapi_app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,  # the service prints a line per request
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_up(base_url, server)
+    except RuntimeError:
+        server.terminate()
+        server.wait()
+        raise
+    return server, base_url
+
+
+# --- Requests ---
+def parse_mix(text):
+    """'segment=10,chat=1' -> {'segment': 10.0, 'chat': 1.0}."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in REQUEST_BUILDERS:
+            raise argparse.ArgumentTypeError(f"unknown request kind '{name}' (known: {', '.join(REQUEST_BUILDERS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _random_segment(rng, specs):
+    spec = rng.choice(specs)
+    return spec, rng.choice(spec["segments"])
+
+
+def _spec_fields(spec):
+    return {"standard": spec["standard"], "message_type": spec["message_type"], "version": spec["version"]}
+
+
+def _segment_request(rng, specs, args):
+    spec, segment = _random_segment(rng, specs)
+    return "POST", "/explain_segment/", dict(_spec_fields(spec), segment=segment)
+
+
+def _resource_request(rng, specs, args):
+    # The resource path needs a version segment; unversioned specs are only queried by POST.
+    spec, segment = _random_segment(rng, [spec for spec in specs if spec["version"]] or specs)
+    return "GET", f"/specs/{spec['standard']}/{spec['message_type']}/{spec['version']}/segments/{segment}", None
+
+
+def _batch_request(rng, specs, args):
+    spec = rng.choice(specs)
+    segments = [rng.choice(spec["segments"]) for _ in range(BATCH_SIZE)]
+    return "POST", "/explain_segments/", dict(_spec_fields(spec), segments=segments)
+
+
+def _search_request(rng, specs, args):
+    return "GET", "/search?" + urlencode({"q": rng.choice(SEARCH_QUERIES)}), None
+
+
+def _specs_request(rng, specs, args):
+    return "GET", "/specs", None
+
+
+def _chat_payload(rng, specs, args, stream):
+    spec = rng.choice(specs)
+    return dict(_spec_fields(spec), message=rng.choice(CHAT_QUESTIONS), stream=stream,
+                bypass_cache=rng.random() < args.chat_cache_miss)
+
+
+def _chat_request(rng, specs, args):
+    return "POST", "/chat", _chat_payload(rng, specs, args, stream=False)
+
+
+def _chat_stream_request(rng, specs, args):
+    return "POST", "/chat", _chat_payload(rng, specs, args, stream=True)
+
+
+REQUEST_BUILDERS = {
+    "segment": _segment_request,
+    "resource": _resource_request,
+    "batch": _batch_request,
+    "search": _search_request,
+    "specs": _specs_request,
+    "chat": _chat_request,
+    "chat_stream": _chat_stream_request,
+}
+
+
+# --- Load generation ---
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one origin, reused most recently used first,
+    at most `size` open. httpx's pool scans all its connections and queued requests
+    whenever one finishes; with hundreds of slow chats in flight that made the
+    client, not the service, the bottleneck.
+    """
+
+    def __init__(self, base_url, size, timeout):
+        url = httpx.URL(base_url)
+        self._base_url = str(url).rstrip("/")
+        self._origin = httpcore.Origin(url.scheme.encode(), url.host.encode(), url.port or 80)
+        self._host = url.netloc
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self._timeouts = {"connect": timeout, "read": timeout, "write": timeout}
+
+    async def request(self, method, path, payload=None):
+        """Sends the request, reads the whole response (streamed or not) and returns its status code."""
+        headers = [(b"Host", self._host)]
+        content = b""
+        if payload is not None:
+            content = json.dumps(payload).encode("utf-8")
+            headers.append((b"Content-Type", b"application/json"))
+        async with self._slots:  # waiting for a connection is part of the latency
+            connection = None
+            while self._idle and connection is None:
+                connection = self._idle.pop()
+                if connection.has_expired():  # closed by the server's keep-alive timeout
+                    await connection.aclose()
+                    connection = None
+            connection = connection or httpcore.AsyncHTTPConnection(self._origin)
+            try:
+                async with connection.stream(method, self._base_url + path, headers=headers, content=content,
+                                             extensions={"timeout": self._timeouts}) as response:
+                    async for _ in response.aiter_stream():
+                        pass
+            except BaseException:
+                await connection.aclose()
+                raise
+            if connection.is_available():
+                self._idle.append(connection)
+            else:
+                await connection.aclose()
+            return response.status
+
+    async def aclose(self):
+        for connection in self._idle:
+            await connection.aclose()
+        self._idle.clear()
+
+
+async def _send(pool, kind, method, path, payload, due, records):
+    """Sends one request and appends (kind, due time, completion time, error or None) to records."""
+    error = None
+    try:
+        status = await pool.request(method, path, payload)
+        if status >= 400:
+            error = f"HTTP {status}"
+    except (httpcore.TimeoutException, httpcore.NetworkError, httpcore.ProtocolError) as e:
+        error = type(e).__name__
+    records.append((kind, due, time.perf_counter(), error))
+
+
+async def generate_load(args, base_url, specs, mix):
+    """Sends the warm-up and measured load; returns (records, client lags, (window start, window end))."""
+    rng = random.Random(args.seed)
+    kinds, weights = list(mix), list(mix.values())
+    pool = ConnectionPool(base_url, args.connections, args.timeout)
+    records, lags, tasks = [], [], []
+    try:
+        start = time.perf_counter() + 0.1
+        window = (start + args.warmup, start + args.warmup + args.duration)
+        for i in range(int(args.rps * (args.warmup + args.duration))):
+            due = start + i / args.rps
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if due >= window[0]:
+                lags.append(max(time.perf_counter() - due, 0.0))
+            kind = rng.choices(kinds, weights)[0]
+            method, path, payload = REQUEST_BUILDERS[kind](rng, specs, args)
+            tasks.append(asyncio.create_task(_send(pool, kind, method, path, payload, due, records)))
+        await asyncio.gather(*tasks)
+    finally:
+        await pool.aclose()
+    return records, lags, window
+
+
+# --- Report ---
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(records, window):
+    """
+    Latency percentiles (ms) and error rate of the requests due in `window`, and
+    throughput as the successful responses completed within it per second.
+    """
+    window_start, window_end = window
+    measured = [record for record in records if record[1] >= window_start]
+    latencies = sorted(done - due for _, due, done, _ in measured)
+    errors = Counter(error for _, _, _, error in measured if error)
+    completed = sum(1 for _, _, done, error in records if not error and window_start <= done < window_end)
+    summary = {
+        "requests": len(measured),
+        "throughput_rps": completed / (window_end - window_start),
+        "error_rate": sum(errors.values()) / len(measured) if measured else 0.0,
+        "errors": dict(errors),
+    }
+    if latencies:
+        summary.update({
+            "p50_ms": _percentile(latencies, 0.50) * 1e3,
+            "p95_ms": _percentile(latencies, 0.95) * 1e3,
+            "p99_ms": _percentile(latencies, 0.99) * 1e3,
+            "max_ms": latencies[-1] * 1e3,
+        })
+    return summary
+
+
+def report(records, lags, window):
+    results = {"total": summarize(records, window)}
+    for kind in sorted({record[0] for record in records}):
+        results[kind] = summarize([record for record in records if record[0] == kind], window)
+    lags.sort()
+    client_lag = {"p50_ms": _percentile(lags, 0.50) * 1e3, "p99_ms": _percentile(lags, 0.99) * 1e3} if lags else {}
+
+    print(f"\n{'requests':<12}{'count':>8}{'ok rps':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, stats in results.items():
+        if not stats["requests"]:
+            continue
+        print(f"{kind:<12}{stats['requests']:>8}{stats['throughput_rps']:>10.1f}{stats['error_rate']:>9.1%}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    for kind, stats in results.items():
+        if stats["errors"]:
+            print(f"{kind} errors: " + ", ".join(f"{error} x{count}" for error, count in stats["errors"].items()))
+    if client_lag:
+        print(f"client lag: p50 {client_lag['p50_ms']:.1f} ms, p99 {client_lag['p99_ms']:.1f} ms")
+    return results, client_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running service; by default uvicorn is started locally.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    parser.add_argument("--rps", type=float, default=100, help="Target request rate.")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load before measuring.")
+    parser.add_argument("--connections", type=int, default=1000,
+                        help="Maximum open connections of the client; keep it above rps x slowest latency (e.g. of chat).")
+    parser.add_argument("--timeout", type=float, default=90, help="Connect and read timeout of a request in seconds.")
+    parser.add_argument("--mix", type=parse_mix, help=f"Request weights, e.g. segment=10,chat=1 (default {DEFAULT_MIX}, plus {STUB_CHAT_MIX} with --stub-gemini).")
+    parser.add_argument("--stub-gemini", action="store_true", help="Offline stub model; adds chat to the default mix.")
+    parser.add_argument("--stub-latency", type=float, default=0.8, help="Seconds the stub model takes per answer.")
+    parser.add_argument("--stub-chunk-delay", type=float, default=0.05, help="Seconds between the stub model's streamed chunks.")
+    parser.add_argument("--chat-cache-miss", type=float, default=0.5, help="Share of chat requests that bypass the answer cache.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    mix = args.mix or dict(DEFAULT_MIX, **(STUB_CHAT_MIX if args.stub_gemini else {}))
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server, base_url = start_server(args)
+    try:
+        specs = [spec for spec in httpx.get(f"{base_url}/specs", timeout=10).json()["specs"] if spec["segments"]]
+        print(f"Load: {args.rps:g} rps for {args.duration:g} s (+{args.warmup:g} s warm-up) against {base_url}"
+              f"{'' if args.url else f' ({args.workers} uvicorn workers)'}; mix {mix}")
+        records, lags, window = asyncio.run(generate_load(args, base_url, specs, mix))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results, client_lag = report(records, lags, window)
+    if args.output:
+        settings = {name: value for name, value in vars(args).items() if name != "output"}
+        settings["mix"] = mix
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "client_lag": client_lag, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
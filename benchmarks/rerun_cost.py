@@ -0,0 +1,141 @@
+# benchmarks/rerun_cost.py
+"""
+Wall time of Streamlit reruns of main_app.py.
+
+Runs the app script headless with streamlit.testing (AppTest), logged in on
+the chat page in Local Data mode with a spec selected, and times:
+  - idle:   a rerun without input (e.g. after a widget interaction)
+  - submit: a chat submit, i.e. the rerun that answers the question plus the
+            st.rerun() that renders it
+"wall" includes AppTest's own overhead (script thread, element tree parsing);
+"script" is the time spent executing main_app itself.
+
+The script's print output goes to /dev/null, as to a log file. To compare
+against an older version, point --script at its checkout, e.g.
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/rerun_cost.py --script /tmp/before/main_app.py
+
+Usage (from the repository root):
+    python benchmarks/rerun_cost.py [--iterations 50] [--script main_app.py]
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION = "What is NAD+SE?"
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": statistics.median(samples) * 1e3,
+        "p95_ms": samples[max(int(len(samples) * 0.95) - 1, 0)] * 1e3,
+        "mean_ms": statistics.fmean(samples) * 1e3,
+    }
+
+
+_script_seconds = []
+
+
+def _time_script_executions():
+    """Records the duration of every execution of the script body in _script_seconds."""
+    from streamlit.runtime.scriptrunner import script_runner
+
+    exec_script = script_runner.exec_func_with_error_handling
+
+    def timed_exec(func, ctx):
+        start = time.perf_counter()
+        try:
+            return exec_script(func, ctx)
+        finally:
+            _script_seconds.append(time.perf_counter() - start)
+
+    script_runner.exec_func_with_error_handling = timed_exec
+
+
+def _timed_run(at):
+    """Returns (wall seconds, seconds spent in the script) of one AppTest run."""
+    del _script_seconds[:]
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"main_app raised: {at.exception[0].message}")
+    return elapsed, sum(_script_seconds)
+
+
+def _share_script_cache():
+    """
+    AppTest compiles the script (with Streamlit's magic AST pass) on every run,
+    while the Streamlit server compiles it once and reuses the bytecode. Share
+    one cache across runs so only the per-rerun work of the script is timed.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = ScriptCache()
+
+    class SharedScriptCache(ScriptCache):
+        def get_bytecode(self, script_path):
+            return shared.get_bytecode(script_path)
+
+    app_test.ScriptCache = local_script_runner.ScriptCache = SharedScriptCache
+
+
+def measure(script, iterations):
+    from streamlit.testing.v1 import AppTest
+
+    _share_script_cache()
+    _time_script_executions()
+
+    at = AppTest.from_file(script, default_timeout=60)
+    at.session_state["logged_in"] = True
+    at.session_state["user_email"] = "bench@example.com"
+    at.session_state["page"] = "chat"
+    _timed_run(at)
+    at.toggle(key="ai_model_toggle_sidebar_final_v7").set_value(False)
+    _timed_run(at)
+    at.selectbox(key="local_spec_selector_sidebar_final_v7").select("DELFOR D04A")
+    _timed_run(at)
+
+    samples = {"idle": [], "submit": []}
+    for _ in range(iterations):
+        samples["idle"].append(_timed_run(at))
+        at.text_input(key="user_input_widget_chat_session_final_v7").input(QUESTION)
+        next(button for button in at.button if button.label == "✈️").click()
+        samples["submit"].append(_timed_run(at))
+    return {
+        name: {"wall": _summary([wall for wall, _ in runs]), "script": _summary([script for _, script in runs])}
+        for name, runs in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--script", default=os.path.join(ROOT, "main_app.py"))
+    args = parser.parse_args()
+
+    script = os.path.abspath(args.script)
+    # No conversation log file and no FastAPI service needed for the measurement.
+    os.environ.setdefault("CONVERSATION_LOG_PATH", "")
+    os.environ.setdefault("EXPLAINER_TRANSPORT", "inprocess")
+    os.chdir(os.path.dirname(script))  # main_app reads assets/ relative to its directory
+    sys.path.insert(0, os.path.dirname(script))
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = measure(script, args.iterations)
+
+    print(f"{script} ({args.iterations} iterations)")
+    for name, kinds in results.items():
+        for kind, stats in kinds.items():
+            label = f"{name} {kind}"
+            print(f"{label:<14} p50 {stats['p50_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms   mean {stats['mean_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+# benchmarks/suite.py
+"""
+Reproducible benchmark suite for the explainer and chat handler hot paths.
+
+Benchmarks (select with --filter, a substring of the name):
+  explain_segment.<module>     explain_segment() of each edi_explainers/edifact and /x12 module,
+                               over every segment key of its table
+  extract_segments.corpus      gemini_handler.extract_segments_from_query on QUERY_CORPUS
+  api.explain_segment          POST /explain_segment/ through an in-process ASGI client,
+                               API_CONCURRENCY requests in flight
+  handler.ai.cache_miss        get_gemini_response in AI mode, stub model, answer cache bypassed
+  handler.ai.cache_hit         get_gemini_response in AI mode, answered from the answer cache
+  handler.local.inprocess      get_gemini_response in Local Data mode, in-process explainer
+  handler.local.http_stub      get_gemini_response in Local Data mode, HTTP transport against a
+                               stub FastAPI that returns canned answers (handler + HTTP overhead)
+
+Like timeit/asv, each benchmark is first calibrated to a number of calls that
+takes at least --min-time, then timed --repeat times. Times are reported per
+operation (one explained segment, one query, one request or one answer).
+As in asv, the suite runs in --processes fresh interpreters and keeps, per
+benchmark, the process with the fastest sample: timings of the same code can
+differ by a constant factor between processes (memory layout, CPU placement).
+
+Results are written as JSON (default benchmarks/results/<commit>.json) with
+the commit, Python version and machine, so runs can be compared with
+--compare: a benchmark whose fastest sample is more than --threshold times
+the baseline's is reported as a regression and the exit code is 1. Compare
+runs from the same machine only.
+
+Usage (from the repository root):
+    python benchmarks/suite.py [--filter api] [--repeat 20] [--processes 3] [--output results.json]
+    python benchmarks/suite.py --compare benchmarks/results/<old commit>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import gc
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Offline and in-memory: stub model, no answer cache file, no metrics dump, no FastAPI service.
+os.environ["GEMINI_STUB_MODEL"] = "1"
+os.environ["EXPLAINER_TRANSPORT"] = "inprocess"
+for name in ("GEMINI_CACHE_DB_PATH", "EDI_METRICS_DUMP_PATH", "CHAT_TRANSPORT"):
+    os.environ.pop(name, None)
+sys.path.insert(0, ROOT)
+
+SPEC_DETAILS = {"display": "DELFOR D04A", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D04A"}
+
+# Questions as users type them: one or several codes, qualified and bare, upper and lower
+# case, codes inside longer words that must not match, and questions without any code.
+QUERY_CORPUS = [
+    "What is NAD+SE?",
+    "what does the BGM segment contain",
+    "Explain DTM+137 and DTM+157 in DELFOR",
+    "How do I send QTY+52 for packaging?",
+    "Is LIN mandatory?",
+    "What's the difference between NAD+ST and NAD+SF?",
+    "UNH",
+    "Show me the usage of PAC, PCI and GIN",
+    "Which qualifiers does DTM support?",
+    "What does RFF+ON mean in a DESADV D96A message?",
+    "loc+11 vs loc+159",
+    "Where do I put the delivery schedule number?",
+    "What is the quantity per pack in the load carrier?",
+    "I got an error on SCC+1 in my forecast, what does it mean?",
+    "Which segments are needed for a DESADV with CPS, PAC and LIN groups?",
+    "Can you explain UNB, UNH, BGM, DTM+137, NAD+SE, NAD+BY, LIN, QTY+113 and UNT?",
+    "How should suppliers acknowledge a delivery schedule?",
+    "What is the GIN+ML segment used for in D07A?",
+    "IMD and FTX: are they required?",
+    "What's the format of the date in DTM+2?",
+]
+
+API_REQUESTS_PER_CALL = 200
+API_CONCURRENCY = 20
+
+
+# --- Timing ---
+def _calibrate(fn, min_time):
+    """Number of calls of fn that takes at least min_time seconds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def run_benchmark(fn, ops_per_call, repeat, min_time):
+    """Times fn and returns per-operation statistics in microseconds."""
+    fn()  # warm-up (lazy initialization, caches)
+    number = _calibrate(fn, min_time)
+    samples = []
+    gc.collect()
+    gc.disable()  # as timeit: collections triggered by earlier benchmarks' garbage are noise here
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / (number * ops_per_call) * 1e6)
+    finally:
+        gc.enable()
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "median_us": median,
+        "min_us": samples[0],
+        "p95_us": samples[max(int(len(samples) * 0.95) - 1, 0)],
+        "mean_us": statistics.fmean(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops_per_second": 1e6 / median if median else None,
+        "calls_per_sample": number,
+        "ops_per_call": ops_per_call,
+        "repeat": repeat,
+    }
+
+
+# --- Benchmarks ---
+def _explain_segment_benchmarks():
+    from edi_explainers import edifact, x12
+
+    benchmarks = {}
+    for package in (edifact, x12):
+        for module_name, table_name in package.EXPLAINER_MODULES.values():
+            module = importlib.import_module(f"{package.__name__}.{module_name}")
+            keys = list(getattr(module, table_name))
+
+            def explain_all(explain=module.explain_segment, keys=keys):
+                for key in keys:
+                    explain(key)
+
+            benchmarks[f"explain_segment.{module_name}"] = (explain_all, len(keys))
+    return benchmarks
+
+
+def _extract_benchmark():
+    from gemini_handler import extract_segments_from_query
+
+    def extract_corpus():
+        for query in QUERY_CORPUS:
+            extract_segments_from_query(query)
+
+    return extract_corpus, len(QUERY_CORPUS)
+
+
+def _api_benchmark():
+    import httpx
+    from fastapi_app import app
+
+    payloads = [{"segment": segment, "standard": "EDIFACT", "message_type": "DELFOR", "version": "D04A"}
+                for segment in ("NAD+SE", "BGM", "DTM+137", "QTY+52", "UNH")]
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+
+    async def worker(count):
+        for i in range(count):
+            response = await client.post("/explain_segment/", json=payloads[i % len(payloads)])
+            response.raise_for_status()
+
+    async def post_all():
+        per_worker = API_REQUESTS_PER_CALL // API_CONCURRENCY
+        await asyncio.gather(*(worker(per_worker) for _ in range(API_CONCURRENCY)))
+
+    def post_requests():
+        loop.run_until_complete(post_all())
+
+    def close():
+        loop.run_until_complete(client.aclose())
+        loop.close()
+
+    return post_requests, API_REQUESTS_PER_CALL, close
+
+
+class _StubExplainerHandler(BaseHTTPRequestHandler):
+    """Stands in for the FastAPI explainer service: canned answers, no registry lookup."""
+    protocol_version = "HTTP/1.1"  # keep-alive, as uvicorn
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid the delayed-ACK stall
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.startswith("/explain_segments/"):
+            results = [{"segment": segment, "found": True, "explanation": "Stub explanation."} for segment in payload.get("segments", [])]
+            body = {"results": results, "found": len(results), "not_found": 0}
+        else:
+            body = {"segment": payload.get("segment"), "explanation": "Stub explanation."}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def _explainer_transport(transport):
+    """Makes gemini_handler use `transport` for the duration of the block."""
+    import gemini_handler
+
+    previous = gemini_handler.get_explainer_transport()
+    gemini_handler._explainer_transport = transport
+    try:
+        yield
+    finally:
+        gemini_handler._explainer_transport = previous
+
+
+def _handler_benchmarks():
+    from gemini_handler import get_gemini_response
+
+    question = "What is NAD+SE?"
+    get_gemini_response(question, use_gemini_model=True, spec_details=SPEC_DETAILS)  # fills the answer cache
+    return {
+        "handler.ai.cache_miss": (lambda: get_gemini_response(question, use_gemini_model=True, spec_details=SPEC_DETAILS, bypass_cache=True), 1),
+        "handler.ai.cache_hit": (lambda: get_gemini_response(question, use_gemini_model=True, spec_details=SPEC_DETAILS), 1),
+        "handler.local.inprocess": (lambda: get_gemini_response(question, use_gemini_model=False, spec_details=SPEC_DETAILS), 1),
+        "handler.local.http_stub": (lambda: get_gemini_response(question, use_gemini_model=False, spec_details=SPEC_DETAILS), 1),
+    }
+
+
+def run_suite(name_filter, repeat, min_time):
+    """Runs the selected benchmarks and returns {name: statistics}."""
+    from explainer_transport import HttpTransport
+
+    selected = lambda name: not name_filter or name_filter in name
+    results = {}
+
+    def record(name, fn, ops, setup=contextlib.nullcontext):
+        if selected(name):
+            with setup():
+                results[name] = run_benchmark(fn, ops, repeat, min_time)
+            print(f"  {name:<34} {results[name]['median_us']:12.2f} us/op", file=sys.__stdout__)
+
+    for name, (fn, ops) in _explain_segment_benchmarks().items():
+        record(name, fn, ops)
+    record("extract_segments.corpus", *_extract_benchmark())
+    if selected("api.explain_segment"):
+        fn, ops, close = _api_benchmark()
+        try:
+            record("api.explain_segment", fn, ops)
+        finally:
+            close()
+    handler_benchmarks = _handler_benchmarks()
+    if any(selected(name) for name in handler_benchmarks):
+        stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubExplainerHandler)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        stub_transport = HttpTransport(f"http://127.0.0.1:{stub.server_address[1]}")
+        try:
+            for name, (fn, ops) in handler_benchmarks.items():
+                setup = (lambda: _explainer_transport(stub_transport)) if name.endswith("http_stub") else contextlib.nullcontext
+                record(name, fn, ops, setup)
+        finally:
+            stub.shutdown()
+    return results
+
+
+# --- Results ---
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_processes(args):
+    """Runs the suite in args.processes fresh interpreters; per benchmark, keeps the fastest process."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for process in range(args.processes):
+            print(f"Process {process + 1}/{args.processes}", flush=True)
+            output = os.path.join(tmp, f"{process}.json")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--filter", args.filter, "--repeat", str(args.repeat),
+                            "--min-time", str(args.min_time), "--worker-output", output], check=True)
+            with open(output, encoding="utf-8") as f:
+                for name, stats in json.load(f).items():
+                    best = results.get(name)
+                    process_min_us = (best["process_min_us"] if best else []) + [stats["min_us"]]
+                    if best is None or stats["min_us"] < best["min_us"]:
+                        best = stats
+                    results[name] = dict(best, process_min_us=process_min_us)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the change of the fastest samples against `baseline`; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark (min us/op)':<36}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, stats in results.items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            print(f"{name:<36}{'-':>12}{stats['min_us']:>12.2f}{'new':>8}")
+            continue
+        ratio = stats["min_us"] / old["min_us"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36}{old['min_us']:>12.2f}{stats['min_us']:>12.2f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed samples per benchmark.")
+    parser.add_argument("--min-time", type=float, default=0.02, help="Minimum seconds per sample.")
+    parser.add_argument("--output", help="JSON results file (default benchmarks/results/<commit>.json).")
+    parser.add_argument("--compare", help="JSON results of a baseline run to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Ratio of fastest samples above which a benchmark counts as regressed.")
+    parser.add_argument("--processes", type=int, default=3, help="Fresh interpreters the suite runs in.")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)  # one process of the suite, writing raw results here
+    args = parser.parse_args()
+
+    if args.worker_output:
+        # The handler and API log every request; keep that out of the measurement output.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results = run_suite(args.filter, args.repeat, args.min_time)
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+        return
+
+    commit = _git_commit()
+    print(f"Running benchmarks at {commit}...")
+    results = run_processes(args)
+
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"repeat": args.repeat, "min_time": args.min_time, "processes": args.processes, "filter": args.filter},
+        "benchmarks": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit', args.compare)}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold}x: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
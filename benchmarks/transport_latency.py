@@ -0,0 +1,94 @@
+# benchmarks/transport_latency.py
+"""
+Measures per-question latency of the explainer transports.
+
+Starts fastapi_app under uvicorn on a free local port and times the same
+explain_segment payload through:
+  - inprocess:     InProcessTransport (registry call, no socket)
+  - http-pooled:   HttpTransport (keep-alive requests.Session)
+  - http-unpooled: a fresh requests.post per call (the previous behavior)
+
+Usage (from the repository root):
+    python benchmarks/transport_latency.py [--iterations 500]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from explainer_transport import HttpTransport, InProcessTransport  # noqa: E402
+
+PAYLOAD = {"segment": "NAD+SE", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D04A"}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/specs", timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"uvicorn did not start at {base_url}")
+
+
+def _time_calls(call, iterations):
+    call()  # warm-up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "p50_us": statistics.median(samples) * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95) - 1] * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fastapi_app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(base_url)
+        in_process = InProcessTransport()
+        pooled = HttpTransport(base_url)
+        results = {
+            "inprocess": _time_calls(lambda: in_process.explain_segment(PAYLOAD), args.iterations),
+            "http-pooled": _time_calls(lambda: pooled.explain_segment(PAYLOAD), args.iterations),
+            "http-unpooled": _time_calls(lambda: requests.post(f"{base_url}/explain_segment/", json=PAYLOAD, timeout=15).json(), args.iterations),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'transport':<15}{'p50 (us)':>12}{'p95 (us)':>12}{'mean (us)':>12}")
+    for name, stats in results.items():
+        print(f"{name:<15}{stats['p50_us']:>12.1f}{stats['p95_us']:>12.1f}{stats['mean_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
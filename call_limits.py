@@ -0,0 +1,253 @@
+# call_limits.py
+"""
+Limits for expensive upstream calls (Gemini).
+
+- SingleFlight coalesces concurrent identical calls: the first caller for a
+  key runs the call, later callers with the same key wait for its result
+  instead of issuing their own.
+- ConcurrencyLimiter caps the calls running at once per process; callers
+  beyond the cap queue for a slot and give up with CallQueueTimeout after
+  a timeout.
+- CircuitBreaker tracks the error and slow-call rate of recent calls and
+  opens when it crosses a threshold, so callers can fail over immediately
+  instead of waiting on a failing upstream; after a cool-down it lets
+  single probe calls through (half-open) and closes again on success.
+  `allow` returns a permit that is passed back with the call's outcome;
+  while half-open, only the probe's outcome changes the state.
+
+Queue depth, calls in flight and queue wait time are exported per limiter
+(edi_call_queue_depth, edi_call_in_flight, edi_call_queue_wait_seconds) so
+the cap can be sized from /metrics or a metrics dump; breaker state is
+edi_circuit_state.
+"""
+import threading
+import time
+from collections import deque
+
+from metrics import METRICS, count_event
+
+QUEUE_DEPTH = METRICS.gauge("edi_call_queue_depth", "Callers waiting for a call slot.", ("limiter",))
+IN_FLIGHT = METRICS.gauge("edi_call_in_flight", "Calls holding a slot.", ("limiter",))
+QUEUE_WAIT_SECONDS = METRICS.histogram("edi_call_queue_wait_seconds", "Time callers waited for a call slot.", ("limiter",))
+CIRCUIT_STATE = METRICS.gauge("edi_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.", ("breaker",))
+
+
+class CallQueueTimeout(TimeoutError):
+    """No call slot became free within the queue timeout."""
+
+
+class SharedCallAbandoned(RuntimeError):
+    """The leader of a shared call stopped before its result was complete (e.g. a closed stream)."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers with the same key."""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """Returns (call, is_leader). The leader must call `finish`; followers `wait`."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publishes the leader's result (or exception) to the followers."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+        if call.followers:
+            count_event(self.name, "coalesced", call.followers)
+
+    def wait(self, call, timeout=None):
+        """Waits for the leader's result; re-raises its exception."""
+        if not call.done.wait(timeout):
+            raise CallQueueTimeout(f"{self.name}: shared call did not finish within {timeout} s")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn, timeout=None):
+        """Runs fn() unless an identical call is in flight. Returns (result, shared)."""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call, timeout), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result, False
+
+
+class ConcurrencyLimiter:
+    """
+    Args:
+        name (str): Label of the limiter's metrics.
+        max_concurrent (int): Calls allowed to run at once.
+        queue_timeout (float): Seconds a caller waits for a slot before CallQueueTimeout.
+    """
+
+    def __init__(self, name, max_concurrent, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def slot(self):
+        """Context manager holding one call slot for its block."""
+        return _Slot(self)
+
+    def _acquire(self):
+        QUEUE_DEPTH.inc(limiter=self.name)
+        start = time.perf_counter()
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            QUEUE_DEPTH.dec(limiter=self.name)
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, limiter=self.name)
+        if not acquired:
+            count_event(self.name, "queue_timeout")
+            raise CallQueueTimeout(f"{self.name}: no call slot free within {self.queue_timeout} s")
+        IN_FLIGHT.inc(limiter=self.name)
+
+    def _release(self):
+        IN_FLIGHT.dec(limiter=self.name)
+        self._slots.release()
+
+
+class _Slot:
+    __slots__ = ("_limiter",)
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+
+    def __enter__(self):
+        self._limiter._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._limiter._release()
+        return False
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name (str): Label of the breaker's metrics and events.
+        failure_rate (float): Share of failed or slow calls in the window that opens the circuit.
+        min_calls (int): Calls needed in the window before the rate is acted on.
+        window (int): Number of most recent calls the rate is computed over.
+        slow_call_seconds (float): Successful calls slower than this count as failures.
+        open_seconds (float): Cool-down before a probe call is let through.
+    """
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window=20, slow_call_seconds=15.0, open_seconds=30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failed or slow call
+        self._opened_at = 0.0
+        self._probe = None  # permit of the half-open probe in flight
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"INFO: Circuit '{self.name}' {self.state} -> {state}")
+            count_event(self.name, f"circuit_{state}")
+        self.state = state
+        CIRCUIT_STATE.set(self._STATE_VALUES[state], breaker=self.name)
+
+    def allow(self):
+        """
+        A truthy permit if a call may go out now, else None. While open, None until the
+        cool-down ends; then one probe at a time. Pass the permit to `record_cancelled`.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and self._probe is None:
+                self._probe = object()
+                return self._probe
+        count_event(self.name, "circuit_rejected")
+        return None
+
+    def _is_probe(self, permit):
+        return permit is not None and permit is self._probe
+
+    def record_success(self, permit, seconds):
+        """
+        Reports a call allowed with `permit` that succeeded in `seconds`. While half-open,
+        only the probe's result closes the circuit; results of calls allowed earlier are
+        just recorded.
+        """
+        if seconds > self.slow_call_seconds:
+            self.record_failure(permit, seconds)
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._is_probe(permit):
+                self._probe = None
+                self._outcomes.clear()
+                self._set_state(self.CLOSED)
+            self._outcomes.append(False)
+
+    def record_failure(self, permit, seconds=0.0):
+        """
+        Reports a call allowed with `permit` that failed (or was slow). While half-open,
+        only the probe's failure reopens the circuit.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._is_probe(permit):
+                self._probe = None
+                self._open()
+                return
+            self._outcomes.append(True)
+            if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls \
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def record_cancelled(self, permit):
+        """
+        The call allowed with `permit` never reached the upstream (e.g. it timed out in a
+        queue). Frees the half-open probe if `permit` is the probe's; a call allowed while
+        the breaker was closed leaves a later probe alone.
+        """
+        with self._lock:
+            if self._is_probe(permit):
+                self._probe = None
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._set_state(self.OPEN)
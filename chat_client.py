@@ -0,0 +1,65 @@
+# chat_client.py
+"""
+Client of the FastAPI /chat endpoint.
+
+With CHAT_TRANSPORT=http the Streamlit app does not call Gemini itself: AI
+questions are posted to /chat, which assembles the prompt and runs the model
+call on the backend's bounded executor (see fastapi_app.py). The Streamlit
+script thread only relays the streamed answer, and concurrency, the answer
+cache and the circuit breaker are shared by every user of that backend.
+"""
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5
+# The backend enforces the per-request deadline (CHAT_TIMEOUT_SECONDS); this only guards against a hung connection.
+DEFAULT_READ_TIMEOUT_SECONDS = 120
+CHAT_SERVICE_ERROR_MESSAGE = "Error: Could not reach the chat service. Please try again shortly."
+
+
+class ChatClient:
+    """Posts chat questions to /chat over one pooled keep-alive session."""
+
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=DEFAULT_READ_TIMEOUT_SECONDS):
+        # requests is only imported when the HTTP chat backend is actually used.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.url = f"{base_url.rstrip('/')}/chat"
+        self.timeout = (connect_timeout, read_timeout)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)  # No retries: a retried question would be asked twice
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _payload(message, spec_details, bypass_cache, stream):
+        payload = {"message": message, "bypass_cache": bypass_cache, "stream": stream}
+        if spec_details:
+            payload.update({key: spec_details.get(key) for key in ("display", "standard", "message_type", "version")})
+        return payload
+
+    def ask(self, message, spec_details=None, bypass_cache=False):
+        """The whole answer as one string."""
+        try:
+            response = self.session.post(self.url, json=self._payload(message, spec_details, bypass_cache, False), timeout=self.timeout)
+            if response.status_code == 504: # The backend's deadline passed; it says so in the detail
+                return response.json()["detail"]
+            response.raise_for_status()
+            return response.json()["answer"]
+        except (self._requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"ERROR: Chat request to {self.url} failed: {e}")
+            return CHAT_SERVICE_ERROR_MESSAGE
+
+    def stream(self, message, spec_details=None, bypass_cache=False):
+        """Yields the answer's text chunks as the backend streams them."""
+        try:
+            with self.session.post(self.url, json=self._payload(message, spec_details, bypass_cache, True), stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                    if chunk:
+                        yield chunk
+        except self._requests.exceptions.RequestException as e:
+            print(f"ERROR: Chat stream from {self.url} failed: {e}")
+            yield CHAT_SERVICE_ERROR_MESSAGE
@@ -0,0 +1,138 @@
+# chat_history.py
+"""
+Bounded chat history for the Streamlit chat page.
+
+The page used to keep every message in st.session_state.messages and render
+all of them on each rerun, so long sessions got slower with every question.
+`ChatHistory` keeps only the newest messages in full; older ones are either
+spilled to a per-session JSONL file (CHAT_HISTORY_SPILL_DIR) and read back
+one page at a time, or compacted into truncated previews, of which a bounded
+number is kept. With an archive (a user's conversation log, see
+conversation_log.py) every message is persisted there instead, and a history
+restored at login loads only its newest page. Memory and per-rerun render cost
+then depend on the window size, not on the length of the conversation.
+"""
+import json
+import os
+import uuid
+from array import array
+from collections import deque
+
+# Messages rendered per page ("Load earlier messages" shows one more page).
+DEFAULT_WINDOW_SIZE = 20
+# Newest messages kept in memory in full.
+DEFAULT_RECENT_SIZE = 100
+# Without a spill directory: older messages kept as previews, and their length.
+DEFAULT_COMPACTED_SIZE = 400
+COMPACT_PREVIEW_CHARS = 300
+
+
+class ChatHistory:
+    """
+    Append-only message history with absolute indices (0 = first message).
+
+    Args:
+        recent_size (int): Newest messages kept in full in memory.
+        compacted_size (int): Older messages kept as previews when not spilling.
+        spill_path (str): JSONL file older messages are written to; None keeps previews only.
+        archive: Persistent store with count(), append(role, content) and read(start, stop),
+            such as a UserConversation. Takes the place of the spill file and previews.
+        initial_page (int): Newest archived messages loaded up front.
+    """
+
+    def __init__(self, recent_size=DEFAULT_RECENT_SIZE, compacted_size=DEFAULT_COMPACTED_SIZE, spill_path=None,
+                 archive=None, initial_page=DEFAULT_WINDOW_SIZE):
+        self.recent_size = recent_size
+        self.spill_path = None if archive else spill_path
+        self.archive = archive
+        self._recent = deque()  # (index, message)
+        self._compacted = deque(maxlen=compacted_size)  # (index, message with preview content)
+        self._offsets = array("q")  # spill file offset of message i
+        self._total = 0
+        if archive:
+            self._total = archive.count()
+            self._recent.extend(archive.read(max(self._total - initial_page, 0), self._total))
+        elif spill_path:
+            open(spill_path, "w", encoding="utf-8").close()
+
+    def __len__(self):
+        return self._total
+
+    def append(self, role, content):
+        if self.archive:
+            self.archive.append(role, content)
+        self._recent.append((self._total, {"role": role, "content": content}))
+        self._total += 1
+        while len(self._recent) > self.recent_size:
+            self._evict(*self._recent.popleft())
+
+    def _evict(self, index, msg):
+        if self.archive:
+            return  # Already persisted; read back from the archive when paged to
+        if self.spill_path:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.seek(0, os.SEEK_END)
+                self._offsets.append(f.tell())
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+            return
+        content = msg["content"]
+        if len(content) > COMPACT_PREVIEW_CHARS:
+            content = content[:COMPACT_PREVIEW_CHARS].rstrip() + " …"
+        self._compacted.append((index, {"role": msg["role"], "content": content}))
+
+    def earliest_index(self):
+        """Index of the oldest message that can still be shown."""
+        if self._offsets or self.archive:
+            return 0
+        if self._compacted:
+            return self._compacted[0][0]
+        return self._recent[0][0] if self._recent else 0
+
+    def window(self, count):
+        """The newest `count` available messages as (index, message) pairs, oldest first."""
+        start = max(self._total - count, self.earliest_index())
+        return self.messages(start, self._total)
+
+    def messages(self, start, stop):
+        """(index, message) pairs for the available indices in [start, stop)."""
+        result = []
+        first_recent = self._recent[0][0] if self._recent else self._total
+        if start < first_recent:
+            older_stop = min(stop, first_recent)
+            if self.archive:
+                result.extend(self.archive.read(start, older_stop))
+            elif self._offsets:
+                result.extend(self._read_spilled(start, older_stop))
+            else:
+                result.extend(item for item in self._compacted if start <= item[0] < older_stop)
+        for offset in range(max(start, first_recent), min(stop, self._total)):
+            result.append(self._recent[offset - first_recent])
+        return result
+
+    def _read_spilled(self, start, stop):
+        result = []
+        with open(self.spill_path, encoding="utf-8") as f:
+            f.seek(self._offsets[start])
+            for index in range(start, stop):
+                result.append((index, json.loads(f.readline())))
+        return result
+
+    def close(self):
+        """Deletes the spill file."""
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+def chat_history_from_env(archive=None):
+    """New history backed by `archive` if given, else spilling to a fresh file in CHAT_HISTORY_SPILL_DIR if that is set."""
+    spill_dir = os.getenv("CHAT_HISTORY_SPILL_DIR")
+    spill_path = None
+    if spill_dir and not archive:
+        os.makedirs(spill_dir, exist_ok=True)
+        spill_path = os.path.join(spill_dir, f"chat-{uuid.uuid4().hex}.jsonl")
+    return ChatHistory(
+        recent_size=int(os.getenv("CHAT_HISTORY_RECENT_SIZE", DEFAULT_RECENT_SIZE)),
+        compacted_size=int(os.getenv("CHAT_HISTORY_COMPACTED_SIZE", DEFAULT_COMPACTED_SIZE)),
+        spill_path=spill_path,
+        archive=archive,
+    )
@@ -0,0 +1,187 @@
+# conversation_log.py
+"""
+Append-only per-user conversation log.
+
+Chat turns are keyed by the user's email and written to a local SQLite file
+(CONVERSATION_LOG_PATH) by a background thread in batched transactions, so
+persisting a turn never blocks a Streamlit rerun. The writer numbers each
+turn inside its transaction, so several tabs or workers of the same user
+append to one sequence without overwriting or dropping each other's turns.
+Reads go through the
+(user, seq) primary key: the newest page of a 10k-turn history is a single
+index range scan, and older pages are fetched only when asked for.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.sqlite")
+WRITE_BATCH_SIZE = 200
+WRITE_INTERVAL_SECONDS = 0.5
+
+
+class ConversationLog:
+    """
+    Args:
+        path (str): SQLite file of the log.
+        batch_size (int): Most turns written per transaction.
+        interval (float): Seconds the writer waits to collect a batch.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, batch_size=WRITE_BATCH_SIZE, interval=WRITE_INTERVAL_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._local = threading.local()
+        self._pending = queue.Queue()
+        self._unwritten_lock = threading.Lock()
+        self._unwritten = Counter()  # user -> queued turns not yet committed
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS turns (
+                user TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (user, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes (background thread) ---
+    def append(self, user, role, content):
+        """Queues a turn of `user`; the background writer gives it the next turn number."""
+        with self._unwritten_lock:
+            self._unwritten[user] += 1
+        self._pending.put((user, role, content, time.time(), user))
+
+    def _next_batch(self):
+        """Queued turns for one transaction, and the flush requests that cut the batch short."""
+        batch, flushes = [], []
+        item = self._pending.get()
+        deadline = time.monotonic() + self.interval
+        while True:
+            if isinstance(item, threading.Event):
+                flushes.append(item)
+                break
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                item = self._pending.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+        return batch, flushes
+
+    def _write_loop(self):
+        conn = self._connection()
+        # Take the write lock up front so MAX(seq) cannot change under another writer.
+        conn.isolation_level = "IMMEDIATE"
+        while True:
+            batch, flushes = self._next_batch()
+            try:
+                if batch:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO turns (user, seq, role, content, created_at) "
+                            "SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM turns WHERE user = ?",
+                            batch,
+                        )
+            except sqlite3.Error as e:
+                print(f"ERROR: Could not write {len(batch)} conversation turns to {self.path}: {e}")
+            finally:
+                with self._unwritten_lock:
+                    for user, *_ in batch:
+                        self._unwritten[user] -= 1
+                        if not self._unwritten[user]:
+                            del self._unwritten[user]
+                for flushed in flushes:
+                    flushed.set()
+
+    def flush(self, user=None):
+        """Blocks until the turns queued so far (of `user`, or of everyone) are written, without waiting for a full batch."""
+        with self._unwritten_lock:
+            if not (self._unwritten[user] if user is not None else self._unwritten):
+                return
+        flushed = threading.Event()
+        self._pending.put(flushed)
+        flushed.wait()
+
+    # --- Reads ---
+    def count(self, user):
+        """Number of turns logged for `user`, including those still queued in this process."""
+        self.flush(user)
+        row = self._connection().execute("SELECT MAX(seq) FROM turns WHERE user = ?", (user,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def read(self, user, start, stop):
+        """(seq, {"role", "content"}) pairs of `user` for seq in [start, stop), oldest first."""
+        self.flush(user)
+        rows = self._connection().execute(
+            "SELECT seq, role, content FROM turns WHERE user = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (user, start, stop),
+        )
+        return [(seq, {"role": role, "content": content}) for seq, role, content in rows]
+
+    def for_user(self, user):
+        return UserConversation(self, user)
+
+
+class UserConversation:
+    """One user's view of the log."""
+
+    def __init__(self, log, user):
+        self.log = log
+        self.user = user
+
+    def count(self):
+        return self.log.count(self.user)
+
+    def append(self, role, content):
+        self.log.append(self.user, role, content)
+
+    def read(self, start, stop):
+        return self.log.read(self.user, start, stop)
+
+
+_log_lock = threading.Lock()
+_conversation_log = None
+
+
+def get_conversation_log():
+    """
+    Process-wide log at CONVERSATION_LOG_PATH, opened on first use. Returns None
+    if CONVERSATION_LOG_PATH is set to an empty string or the file cannot be opened.
+    """
+    global _conversation_log
+    if _conversation_log is None:
+        with _log_lock:
+            if _conversation_log is None:
+                path = os.getenv("CONVERSATION_LOG_PATH", DEFAULT_LOG_PATH)
+                if not path:
+                    _conversation_log = False
+                else:
+                    try:
+                        _conversation_log = ConversationLog(path)
+                        print(f"INFO: Conversation log at {path}.")
+                    except sqlite3.Error as e:
+                        print(f"WARN: Could not open conversation log '{path}' ({e}). Chats are kept for the session only.")
+                        _conversation_log = False
+    return _conversation_log or None
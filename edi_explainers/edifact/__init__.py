@@ -1,4 +1,24 @@
-from .delfor_d04a import *
-from .delfor_d96a import *
-from .desadv_d96a import *
-from .desadv_d07a import *
\ No newline at end of file
+# edi_explainers/edifact/__init__.py
+# Each explainer module defines its own `segment_explanations_<version>` table and
+# `explain_segment` function, and several of those names clash across modules
+# (e.g. DELFOR D96A and DESADV D96A both define `segment_explanations_d96a`).
+# The modules are therefore never star-imported; they are loaded by name, and
+# only when their tables are needed, so importing this package (e.g. for the
+# tokenizer) stays cheap.
+import importlib
+
+# (message_type, version) -> (explainer module, name of its segment table)
+EXPLAINER_MODULES = {
+    ("DELFOR", "D04A"): ("delfor_d04a", "segment_explanations_d04a"),
+    ("DELFOR", "D96A"): ("delfor_d96a", "segment_explanations_d96a"),
+    ("DESADV", "D07A"): ("desadv_d07a", "segment_explanations_d07a"),
+    ("DESADV", "D96A"): ("desadv_d96a", "segment_explanations_d96a"),
+}
+
+
+def load_segment_tables():
+    """Imports every explainer module and returns {(message_type, version): segment table}."""
+    return {
+        spec: getattr(importlib.import_module(f"{__name__}.{module_name}"), table_name)
+        for spec, (module_name, table_name) in EXPLAINER_MODULES.items()
+    }
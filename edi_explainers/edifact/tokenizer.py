@@ -0,0 +1,215 @@
+# edi_explainers/edifact/tokenizer.py
+"""
+Streaming UN/EDIFACT tokenizer.
+
+`iter_segments` reads an interchange chunk by chunk and yields one `Segment`
+at a time (`SegmentReader` does the same for input that is pushed in), so
+multi-megabyte interchanges are processed in constant memory (one chunk plus
+the segment currently being read). It honors the UNA service
+string advice, release characters and the component/element/segment
+separators.
+"""
+import codecs
+import re
+from collections import namedtuple
+
+ServiceCharacters = namedtuple("ServiceCharacters", "component element decimal release repetition segment")
+
+# UNA:+.? ' - the defaults used when an interchange has no UNA segment
+DEFAULT_SERVICE_CHARACTERS = ServiceCharacters(":", "+", ".", "?", " ", "'")
+
+# tag: e.g. "DTM"; elements: list of data elements, each a list of components
+# (release characters already removed); raw: the segment text as received.
+Segment = namedtuple("Segment", "tag elements raw")
+
+CHUNK_SIZE = 64 * 1024
+
+_SEGMENT_START_RE = re.compile(r"\s*[A-Z][A-Z0-9]{2}\+")
+_HEADER_START_RE = re.compile(r"(UNB|UNH)\+")
+
+
+def looks_like_interchange(text):
+    """
+    True if `text` looks like pasted EDIFACT data rather than a question: it starts
+    with UNA, with a terminated UNB or UNH segment, or with at least two terminated
+    segments. A question such as "NAD+SE what's it for?" is none of these.
+    """
+    stripped = text.lstrip()
+    if stripped.startswith("UNA"):
+        return True
+    pieces = stripped.split(DEFAULT_SERVICE_CHARACTERS.segment, 2)
+    if len(pieces) < 2 or not _SEGMENT_START_RE.match(pieces[0]):
+        return False
+    return bool(_HEADER_START_RE.match(stripped)) or (len(pieces) == 3 and bool(_SEGMENT_START_RE.match(pieces[1])))
+
+
+def segment_qualifiers(segment):
+    """First component of each data element, e.g. ['137'] for DTM+137:20230803:102."""
+    return [element[0] if element else "" for element in segment.elements]
+
+
+def _iter_chunks(source, chunk_size, encoding):
+    """Yields text chunks from a string, bytes, file-like object or iterable of chunks."""
+    if isinstance(source, str):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+        return
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    if isinstance(source, (bytes, bytearray)):
+        yield decoder.decode(bytes(source), final=True)
+        return
+
+    if hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+    else:
+        chunks = source
+    for chunk in chunks:
+        yield decoder.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _is_released(buffer, pos, start, release):
+    """True if the character at `pos` is escaped by an odd run of release characters."""
+    count = 0
+    pos -= 1
+    while pos >= start and buffer[pos] == release:
+        count += 1
+        pos -= 1
+    return count % 2 == 1
+
+
+def _split(text, separator, release, unescape):
+    """Splits `text` on `separator`, skipping separators preceded by the release character."""
+    if not release or release not in text:
+        return text.split(separator)
+
+    parts = []
+    current = []
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if char == release and i + 1 < length:
+            if not unescape:
+                current.append(char)
+            current.append(text[i + 1])
+            i += 2
+            continue
+        if char == separator:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    parts.append("".join(current))
+    return parts
+
+
+def parse_segment(raw, service=DEFAULT_SERVICE_CHARACTERS):
+    """Parses the text of one segment (without its terminator) into a `Segment`."""
+    release = service.release if service.release.strip() else ""
+    elements = _split(raw, service.element, release, unescape=False)
+    tag = _split(elements[0], service.component, release, unescape=True)[0].upper()
+    parsed = [_split(element, service.component, release, unescape=True) for element in elements[1:]]
+    return Segment(tag, parsed, raw)
+
+
+class SegmentReader:
+    """
+    Push-style tokenizer: `feed` it text as it arrives and it returns the
+    segments completed so far. Only the unfinished segment is kept between
+    calls, so memory stays bounded by chunk size plus segment size. Used by
+    `iter_segments` and by callers that receive input asynchronously.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._service = None
+        self._search_from = 0
+
+    def feed(self, text):
+        """Adds `text` to the input and returns the list of completed segments."""
+        self._buffer += text
+        segments = []
+        if self._service is None:
+            # Wait until we can see whether the interchange starts with a UNA service string advice.
+            if len(self._buffer.lstrip()) < 9:
+                return segments
+            self._read_service_string(segments)
+        self._split_segments(segments)
+        return segments
+
+    def _read_service_string(self, segments):
+        """Takes the service characters from a leading UNA (appended to `segments`), else the defaults."""
+        stripped = self._buffer.lstrip()
+        self._buffer = stripped
+        self._service = DEFAULT_SERVICE_CHARACTERS
+        if stripped.startswith("UNA") and len(stripped) >= 9:
+            self._service = ServiceCharacters(*stripped[3:9])
+            segments.append(Segment("UNA", [[stripped[3:9]]], stripped[:9]))
+            self._buffer = stripped[9:]
+
+    def _split_segments(self, segments):
+        """Appends every terminated segment of the buffer to `segments`; keeps the unfinished rest."""
+        buffer = self._buffer
+        terminator = self._service.segment
+        release = self._service.release if self._service.release.strip() else ""
+        start = 0
+        search_from = self._search_from
+        while True:
+            end = buffer.find(terminator, search_from)
+            if end == -1:
+                break
+            if release and _is_released(buffer, end, start, release):
+                search_from = end + 1
+                continue
+            raw = buffer[start:end].lstrip().rstrip("\r\n")
+            start = search_from = end + 1
+            if raw:
+                segments.append(parse_segment(raw, self._service))
+
+        # Keep only the unfinished segment and remember how far it has been searched.
+        self._buffer = buffer[start:]
+        self._search_from = len(self._buffer)
+
+    def close(self):
+        """
+        Returns the segments still buffered: those of an input too short to have been
+        split yet, and the last segment if the input did not end with a terminator.
+        """
+        segments = []
+        if self._service is None:
+            if self._buffer.lstrip().startswith("UNA") and len(self._buffer.strip()) < 9:
+                raw = self._buffer.strip()
+                self._buffer = ""
+                return [Segment("UNA", [[raw[3:9]]], raw)]  # Truncated service string advice only
+            self._read_service_string(segments)
+            self._split_segments(segments)
+        raw = self._buffer.strip()
+        self._buffer = ""
+        self._search_from = 0
+        if raw:
+            segments.append(parse_segment(raw, self._service))
+        return segments
+
+
+def iter_segments(source, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+    """
+    Lazily tokenizes an EDIFACT interchange.
+
+    Args:
+        source: The interchange as a string, bytes, a file-like object opened in
+            text or binary mode, or any iterable of str/bytes chunks.
+        chunk_size (int): Number of characters/bytes read per chunk.
+        encoding (str): Encoding used to decode byte input.
+
+    Yields:
+        Segment: One segment at a time, including a leading UNA if present.
+    """
+    reader = SegmentReader()
+    for chunk in _iter_chunks(source, chunk_size, encoding):
+        yield from reader.feed(chunk)
+    yield from reader.close()
@@ -0,0 +1,172 @@
+# edi_explainers/interchange.py
+"""
+Annotates every segment of a whole interchange with its explanation.
+
+Works on top of the streaming tokenizers (EDIFACT and X12): `annotate_interchange`
+is a generator, so callers can render or send each annotation as soon as its
+segment has been read, without holding the interchange or the annotated
+result in memory.
+"""
+from .edifact import tokenizer as edifact_tokenizer
+from .edifact.tokenizer import CHUNK_SIZE
+from .registry import SPEC_REGISTRY, resolve_segment_key, spec_display_name, spec_key
+from .x12 import FUNCTIONAL_GROUPS
+from .x12 import tokenizer as x12_tokenizer
+
+# standard -> tokenizer module (looks_like_interchange, SegmentReader, iter_segments, segment_qualifiers)
+TOKENIZERS = {"EDIFACT": edifact_tokenizer, "X12": x12_tokenizer}
+
+# standard -> envelope segments that do not depend on the message, explained by (nearly) every
+# table of that standard: the interchange header/trailer, plus UNT and the X12 functional group.
+ENVELOPE_TAGS = {
+    "EDIFACT": frozenset({"UNB", "UNZ", "UNT"}),
+    "X12": frozenset({"ISA", "IEA", "GS", "GE"}),
+}
+
+
+def detect_standard(text):
+    """'EDIFACT' or 'X12' if `text` looks like pasted data of that standard, None for a question."""
+    for standard, tokenizer in TOKENIZERS.items():
+        if tokenizer.looks_like_interchange(text):
+            return standard
+    return None
+
+
+def looks_like_interchange(text):
+    """True if `text` looks like a pasted EDIFACT or X12 interchange rather than a question."""
+    return detect_standard(text) is not None
+
+
+def segment_reader(standard="EDIFACT"):
+    """A push-style SegmentReader for interchanges of `standard`."""
+    return TOKENIZERS[standard].SegmentReader()
+
+
+def detect_edifact_spec(segment):
+    """
+    Reads (message_type, version) from a UNH segment, e.g.
+    UNH+1+DELFOR:D:04A:UN -> ('DELFOR', 'D04A'). Returns None for other segments.
+    """
+    if segment.tag != "UNH" or len(segment.elements) < 2:
+        return None
+    identifier = segment.elements[1]
+    message_type = identifier[0].upper()
+    version = "".join(identifier[1:3]).upper()
+    return (message_type, version) if message_type else None
+
+
+def detect_x12_spec(segment, version):
+    """
+    Reads (transaction set, version) from an ST segment, e.g. ST*856*0001 -> ('856', version),
+    where `version` comes from the enclosing GS segment, or from a GS segment whose functional
+    identifier names the transaction set, e.g. GS*SH*...*004010 -> ('856', '004010').
+    Returns None for other segments.
+    """
+    if not segment.elements or not segment.elements[0][0]:
+        return None
+    if segment.tag == "ST":
+        return (segment.elements[0][0].upper(), version)
+    if segment.tag == "GS" and segment.elements[0][0].upper() in FUNCTIONAL_GROUPS:
+        return (FUNCTIONAL_GROUPS[segment.elements[0][0].upper()], version)
+    return None
+
+
+class SegmentAnnotator:
+    """
+    Explains parsed segments one at a time, tracking which spec applies.
+
+    The spec is taken from each UNH segment (EDIFACT) or ST segment, with the
+    version of its GS group (X12), when it names a registered spec;
+    `message_type`/`version` are used until then, or when it does not.
+    Envelope segments the current spec cannot explain (e.g. a UNB before the
+    first UNH, an ISA, a GS before its ST) are explained from the fallback
+    spec or else the first registered spec of the standard that defines them.
+    """
+
+    def __init__(self, message_type=None, version=None, standard="EDIFACT"):
+        self.standard = standard
+        self.default_spec = (message_type.upper(), (version or "").upper()) if message_type else None
+        self.current_spec = self.default_spec
+        self.count = 0
+        self.found = 0
+        self._segment_qualifiers = TOKENIZERS[standard].segment_qualifiers
+        self._group_version = None  # X12: version (GS08) of the current functional group
+
+    def _detect_spec(self, segment):
+        if self.standard != "X12":
+            return detect_edifact_spec(segment)
+        if segment.tag == "GS" and len(segment.elements) >= 8:
+            self._group_version = segment.elements[7][0][:6].upper()  # e.g. '004010' of '004010VICS'
+        version = self._group_version or (self.default_spec[1] if self.default_spec else "")
+        return detect_x12_spec(segment, version)
+
+    def _envelope_specs(self):
+        """Specs tried for envelope segments: the fallback spec, then those of the current X12 group's version, then the rest."""
+        specs = [(message_type, version) for standard, message_type, version in SPEC_REGISTRY if standard == self.standard]
+        specs.sort(key=lambda spec: (spec != self.default_spec, spec[1] != self._group_version))
+        return specs
+
+    def _lookup(self, spec, segment):
+        key = resolve_segment_key(self.standard, spec[0], spec[1], segment.tag, self._segment_qualifiers(segment))
+        return key, SPEC_REGISTRY[spec_key(self.standard, *spec)][key] if key else None
+
+    def annotate(self, segment):
+        """Returns the annotation dict for the next segment of the interchange."""
+        detected = self._detect_spec(segment)
+        if detected:
+            self.current_spec = detected if spec_key(self.standard, *detected) in SPEC_REGISTRY else self.default_spec
+
+        spec = self.current_spec
+        key = None
+        segment_info = None
+        if spec:
+            key, segment_info = self._lookup(spec, segment)
+        if key is None and segment.tag in ENVELOPE_TAGS[self.standard]:
+            for envelope_spec in self._envelope_specs():
+                envelope_key, envelope_info = self._lookup(envelope_spec, segment)
+                if envelope_key:
+                    spec, key, segment_info = envelope_spec, envelope_key, envelope_info
+                    break
+
+        annotation = {
+            "index": self.count,
+            "segment": segment.raw,
+            "tag": segment.tag,
+            "key": key,
+            "spec": spec_display_name(self.standard, *spec) if spec else None,
+            "found": segment_info is not None,
+            "explanation": segment_info["explanation"] if segment_info else None,
+            "usage": segment_info["usage"] if segment_info else None,
+        }
+        self.count += 1
+        self.found += segment_info is not None
+        return annotation
+
+
+def annotate_interchange(source, message_type=None, version=None, standard=None, chunk_size=CHUNK_SIZE):
+    """
+    Lazily explains every segment of an EDIFACT or X12 interchange.
+
+    Args:
+        source: Interchange text, bytes, file-like object or iterable of chunks.
+        message_type (str): Fallback message type, e.g. 'DELFOR' or '830'.
+        version (str): Fallback version, e.g. 'D04A' or '004010'.
+        standard (str): EDI standard of the interchange; detected from text
+            input if not given, EDIFACT otherwise.
+        chunk_size (int): Read size passed on to the tokenizer.
+
+    Yields:
+        dict: index, segment (raw text), tag, key, spec, found, explanation and usage.
+    """
+    if standard is None:
+        standard = (detect_standard(source) if isinstance(source, str) else None) or "EDIFACT"
+    annotator = SegmentAnnotator(message_type, version, standard)
+    for segment in TOKENIZERS[standard].iter_segments(source, chunk_size=chunk_size):
+        yield annotator.annotate(segment)
+
+
+def format_annotation(annotation):
+    """One markdown line per annotated segment, as shown in the chat."""
+    if annotation["found"]:
+        return f"`{annotation['segment']}` → **{annotation['key']}**: {annotation['explanation']}"
+    return f"`{annotation['segment']}` → no explanation available."
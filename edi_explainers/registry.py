@@ -0,0 +1,322 @@
+# edi_explainers/registry.py
+"""
+Segment dispatch registry.
+
+Maps (standard, message_type, version) to the segment table of the matching
+explainer module. The registry is built once, when this module is first
+imported, so explaining a segment is a single dict lookup instead of an
+importlib call per request.
+
+If EDI_SPEC_STORE_PATH points to a compiled spec store (see spec_store.py),
+the tables are read lazily from it instead of importing every explainer module.
+A store compiled from other explainer module sources is rebuilt first.
+"""
+import os
+import sqlite3
+
+from . import edifact, x12
+from .edifact.tokenizer import parse_segment
+
+# (standard, message_type, version) -> {segment_code: {"explanation": ..., "usage": ...}}
+SPEC_REGISTRY = {}
+
+# (standard, message_type, version) -> {(tag, qualifier, ...): segment_code}
+KEY_INDEX = {}
+
+SUPPORTED_STANDARDS = ("EDIFACT", "X12")
+
+# (standard, message_type, version) -> {(tag, qualifier, ...) prefix: [segment_code, ...]}
+PREFIX_INDEX = {}
+
+# (standard, message_type) -> registered versions, to fill in a version a request leaves blank
+VERSIONS = {}
+
+# (standard, message_type, version) -> SHA-256 of the spec's segment table, computed on first use
+_CONTENT_HASHES = {}
+
+# Deepest table keys carry two qualifiers, e.g. 'MEA+WT+U'
+MAX_KEY_QUALIFIERS = 2
+
+
+def build_registry_from_modules():
+    """Collects the segment tables of every explainer package into one dict."""
+    registry = {}
+    for (message_type, version), table in edifact.load_segment_tables().items():
+        registry[("EDIFACT", message_type, version)] = table
+    for (transaction_set, version), table in x12.load_segment_tables().items():
+        registry[("X12", transaction_set, version)] = table
+    return registry
+
+
+def build_registry():
+    """Uses the compiled spec store when EDI_SPEC_STORE_PATH is set, the explainer modules otherwise."""
+    store_path = os.getenv("EDI_SPEC_STORE_PATH")
+    if store_path:
+        from .spec_store import SpecStore, compile_spec_store, explainer_sources_hash
+        try:
+            store = SpecStore(store_path)
+        except FileNotFoundError as e:
+            print(f"WARN: {e}. Loading the explainer modules instead.")
+            return build_registry_from_modules()
+        sources_hash = explainer_sources_hash()
+        if store.sources_hash() == sources_hash:
+            return store.tables()
+        print(f"WARN: Spec store {store_path} was compiled from other explainer modules than these. Rebuilding it.")
+        registry = build_registry_from_modules()
+        try:
+            compile_spec_store(store_path, registry, sources_hash)
+        except (OSError, sqlite3.Error) as e:
+            print(f"WARN: Could not rebuild spec store {store_path} ({e}). Using the explainer modules.")
+        return registry
+    return build_registry_from_modules()
+
+
+def table_items(table):
+    """(key, info) pairs of a segment table; a spec store table is read in one query without filling its cache."""
+    scan = getattr(table, "scan", None)
+    return scan() if scan is not None else table.items()
+
+
+def spec_key(standard, message_type, version=""):
+    """
+    Normalizes a spec identifier into the tuple used as registry key. A blank version
+    is filled in when exactly one version of the message type is registered, e.g.
+    ('X12', '830', '') -> ('X12', '830', '004010').
+    """
+    key = (standard.upper(), message_type.upper(), (version or "").upper())
+    if not key[2]:
+        versions = VERSIONS.get(key[:2], ())
+        if len(versions) == 1:
+            return key[:2] + (versions[0],)
+    return key
+
+
+def ambiguous_versions(standard, message_type, version=""):
+    """The registered versions of a message type if `version` is blank and there are several, else []."""
+    if (version or "").strip():
+        return []
+    versions = VERSIONS.get((standard.upper(), message_type.upper()), [])
+    return list(versions) if len(versions) > 1 else []
+
+
+def spec_display_name(standard, message_type, version=""):
+    """Human readable spec name, e.g. 'DELFOR D04A'."""
+    return f"{message_type} {version}".strip()
+
+
+def get_segment_table(standard, message_type, version=""):
+    """Returns the segment table for a spec, or None if the spec is unknown."""
+    return SPEC_REGISTRY.get(spec_key(standard, message_type, version))
+
+
+def format_explanation(segment_info):
+    """Renders a segment table entry the same way the explainer modules do."""
+    return f"**Explanation**\n{segment_info['explanation']}\n\n**Usage**\n{segment_info['usage']}"
+
+
+def explain(standard, message_type, version, segment_code):
+    """
+    Returns the formatted explanation for a segment, or None if either the
+    spec or the segment is unknown.
+    """
+    table = SPEC_REGISTRY.get(spec_key(standard, message_type, version))
+    if table is None:
+        return None
+    segment_info = table.get(segment_code.upper())
+    return format_explanation(segment_info) if segment_info else None
+
+
+def lookup_segment(standard, message_type, version, segment_code):
+    """
+    Looks up a segment of an upper-cased spec. Returns (found, explanation),
+    where explanation is a not-found message if found is False.
+    """
+    if standard not in SUPPORTED_STANDARDS:
+        return False, "Unsupported EDI standard."
+
+    table = SPEC_REGISTRY.get((standard, message_type, version))
+    if table is None:
+        return False, f"No EDI explainer available for {standard} {message_type} {version}."
+
+    return lookup_in_table(table, KEY_INDEX[(standard, message_type, version)], PREFIX_INDEX[(standard, message_type, version)],
+                           segment_code, f"{standard} {message_type} {version}")
+
+
+def lookup_in_table(table, key_index, prefix_index, segment_code, spec_label):
+    """
+    lookup_segment for a table that is not (or not only) in the registry, such as
+    one preloaded from the export endpoint; key_index/prefix_index are built with
+    build_key_index/build_prefix_index.
+    """
+    segment_info = table.get(segment_code)
+    if segment_info:
+        return True, format_explanation(segment_info)
+
+    key, variants = find_keys_in_table(table, key_index, prefix_index, segment_code)
+    if key:
+        return True, format_explanation(table[key])
+    if variants and segment_key_parts(segment_code) in prefix_index:
+        # A bare tag (or tag and first qualifier): explain every variant of it.
+        sections = [f"'{segment_code}' matches {len(variants)} segment(s) in {spec_label}:"]
+        sections.extend(f"### {variant}\n{format_explanation(table[variant])}" for variant in variants)
+        return True, "\n\n".join(sections)
+    not_found = f"No explanation found for segment '{segment_code}' in {spec_label}."
+    if variants:
+        not_found += f" Known variants: {', '.join(variants)}."
+    return False, not_found
+
+
+def explain_batch(pairs):
+    """
+    Explains many (standard, message_type, version, segment) tuples. Returns one
+    dict per tuple with the normalized spec, a found flag and the explanation.
+    """
+    results = []
+    for standard, message_type, version, segment in pairs:
+        standard, message_type, version = spec_key(standard, message_type, version)
+        found, explanation = lookup_segment(standard, message_type, version, segment.upper())
+        results.append({
+            "segment": segment,
+            "standard": standard,
+            "message_type": message_type,
+            "version": version,
+            "found": found,
+            "explanation": explanation,
+        })
+    return results
+
+
+def build_key_index(table):
+    """
+    Indexes the keys of a segment table by their (tag, qualifier, ...) parts.
+    Combined keys such as 'LOC+11/159' are indexed under each alternative.
+    """
+    index = {}
+    for key in table:
+        combos = [()]
+        for part in key.split("+"):
+            combos = [combo + (alternative,) for combo in combos for alternative in part.split("/")]
+        for combo in combos:
+            index.setdefault(combo, key)
+    return index
+
+
+def build_prefix_index(table):
+    """
+    Indexes the keys of a segment table under every (tag, qualifier, ...) prefix,
+    e.g. ('DTM',) -> ['DTM+137', 'DTM+157', ...] and ('MEA', 'WT') -> ['MEA+WT+U'].
+    """
+    index = {}
+    for parts, key in build_key_index(table).items():
+        for length in range(1, len(parts) + 1):
+            keys = index.setdefault(parts[:length], [])
+            if key not in keys:
+                keys.append(key)
+    return index
+
+
+def segment_key_parts(segment):
+    """
+    Normalizes a segment code or a full segment string to its (tag, qualifier, ...)
+    parts, e.g. 'dtm+137:202308030501:203\'' -> ('DTM', '137'). X12 notation with
+    '*' separators is accepted too, e.g. 'N1*ST*ACME~' -> ('N1', 'ST').
+    """
+    segment = segment.strip().rstrip("'~")
+    if "*" in segment and "+" not in segment:
+        segment = segment.replace("*", "+")
+    parsed = parse_segment(segment)
+    qualifiers = [element[0].upper() if element else "" for element in parsed.elements[:MAX_KEY_QUALIFIERS]]
+    while qualifiers and not qualifiers[-1]:
+        qualifiers.pop()
+    return (parsed.tag,) + tuple(qualifiers)
+
+
+def find_segment_keys(standard, message_type, version, segment):
+    """
+    Resolves a segment code or full segment string against a spec's table.
+    Returns (key, variants): the table key it normalizes to (or None), and
+    otherwise every key under the longest known prefix, e.g. all DTM
+    qualifiers for a bare 'DTM'. Lookups are dict hits on the key parts.
+    """
+    spec = spec_key(standard, message_type, version)
+    table = SPEC_REGISTRY.get(spec)
+    if table is None:
+        return None, []
+    return find_keys_in_table(table, KEY_INDEX[spec], PREFIX_INDEX[spec], segment)
+
+
+def find_keys_in_table(table, key_index, prefix_index, segment):
+    """find_segment_keys against the given table and its indexes."""
+    if segment.upper() in table:
+        return segment.upper(), []
+    parts = segment_key_parts(segment)
+    key = _resolve_in_index(key_index, parts)
+    if key is not None:
+        return key, []
+    for length in range(len(parts), 0, -1):
+        variants = prefix_index.get(parts[:length])
+        if variants:
+            return None, list(variants)
+    return None, []
+
+
+def _resolve_in_index(index, parts):
+    """Longest prefix of (tag, qualifier, ...) `parts` that is a key in `index`."""
+    for length in range(len(parts), 0, -1):
+        key = index.get(parts[:length])
+        if key is not None:
+            return key
+    return None
+
+
+def resolve_segment_key(standard, message_type, version, tag, qualifiers=()):
+    """
+    Resolves a parsed segment to its key in the spec's segment table, preferring
+    the most specific match, e.g. tag 'DTM' with qualifiers ['137', '...'] resolves
+    to 'DTM+137' and 'MEA' with ['WT', 'U'] to 'MEA+WT+U'. Returns None if nothing matches.
+    """
+    index = KEY_INDEX.get(spec_key(standard, message_type, version))
+    if index is None:
+        return None
+    parts = (tag.upper(),) + tuple(qualifier.upper() for qualifier in qualifiers[:MAX_KEY_QUALIFIERS])
+    return _resolve_in_index(index, parts)
+
+
+def spec_content_hash(standard, message_type, version=""):
+    """
+    SHA-256 of a spec's segment table (see spec_store.table_content_hash), or None
+    if the spec is unknown. Tables read from a compiled spec store carry it already.
+    """
+    key = spec_key(standard, message_type, version)
+    content_hash = _CONTENT_HASHES.get(key)
+    if content_hash is None:
+        table = SPEC_REGISTRY.get(key)
+        if table is None:
+            return None
+        content_hash = getattr(table, "content_hash", None)
+        if content_hash is None:
+            from .spec_store import table_content_hash
+            content_hash = table_content_hash(table)
+        _CONTENT_HASHES[key] = content_hash
+    return content_hash
+
+
+def list_specs():
+    """Lists every registered spec with its segment codes."""
+    return [
+        {
+            "standard": standard,
+            "message_type": message_type,
+            "version": version,
+            "display": spec_display_name(standard, message_type, version),
+            "segments": list(table.keys()),
+        }
+        for (standard, message_type, version), table in SPEC_REGISTRY.items()
+    ]
+
+
+SPEC_REGISTRY.update(build_registry())
+for _standard, _message_type, _version in SPEC_REGISTRY:
+    VERSIONS.setdefault((_standard, _message_type), []).append(_version)
+KEY_INDEX.update({key: build_key_index(table) for key, table in SPEC_REGISTRY.items()})
+PREFIX_INDEX.update({key: build_prefix_index(table) for key, table in SPEC_REGISTRY.items()})
@@ -0,0 +1,115 @@
+# edi_explainers/search.py
+"""
+Local BM25 search over the explainer texts.
+
+Answers free-text questions such as "which segment carries the ship-from
+location?" without an LLM call. Every segment table entry is one document
+(its key, explanation and usage). Postings are stored as NumPy arrays with
+precomputed BM25 weights, so a query is a handful of vectorized adds.
+"""
+import re
+
+import numpy as np
+
+from .registry import SPEC_REGISTRY, spec_key, table_items
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me of on or segment segments "
+    "tell the this to used what when where which who why with".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords, with a trailing plural 's' removed."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class SegmentSearchIndex:
+    """Inverted index with BM25 scoring over the segment tables of a spec registry."""
+
+    def __init__(self, registry=None):
+        registry = SPEC_REGISTRY if registry is None else registry
+        self.documents = []  # (standard, message_type, version, segment_key)
+        spec_ids = {}
+        doc_spec = []
+        doc_lengths = []
+        postings = {}  # term -> {doc_id: term frequency}
+
+        for spec, table in registry.items():
+            spec_id = spec_ids.setdefault(spec, len(spec_ids))
+            for key, info in table_items(table):
+                doc_id = len(self.documents)
+                self.documents.append(spec + (key,))
+                doc_spec.append(spec_id)
+                # The key is repeated so that e.g. 'NAD' or 'SF' in a question weighs in.
+                tokens = tokenize(f"{key} {key} {info.get('explanation', '')} {info.get('usage', '')}")
+                doc_lengths.append(len(tokens))
+                for token in tokens:
+                    frequencies = postings.setdefault(token, {})
+                    frequencies[doc_id] = frequencies.get(doc_id, 0) + 1
+
+        self._spec_ids = spec_ids
+        self._doc_spec = np.asarray(doc_spec, dtype=np.int32)
+        lengths = np.asarray(doc_lengths, dtype=np.float64)
+        average_length = lengths.mean() if len(lengths) else 0.0
+        doc_count = len(self.documents)
+
+        # term -> (doc ids, BM25 weight of the term in each of those documents)
+        self._postings = {}
+        for term, frequencies in postings.items():
+            doc_ids = np.fromiter(frequencies.keys(), dtype=np.int32, count=len(frequencies))
+            tf = np.fromiter(frequencies.values(), dtype=np.float64, count=len(frequencies))
+            idf = np.log(1.0 + (doc_count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[doc_ids] / average_length)
+            self._postings[term] = (doc_ids, idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+
+    def search(self, query, standard=None, message_type=None, version=None, top_k=3, min_score=0.0):
+        """
+        Returns up to `top_k` (score, standard, message_type, version, segment_key)
+        tuples, best first. If `standard`/`message_type` are given, only that
+        spec's segments are considered.
+        """
+        scores = np.zeros(len(self.documents), dtype=np.float64)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+
+        if standard and message_type:
+            spec_id = self._spec_ids.get(spec_key(standard, message_type, version))
+            if spec_id is None:
+                return []
+            scores[self._doc_spec != spec_id] = 0.0
+
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [
+            (float(scores[doc_id]),) + self.documents[doc_id]
+            for doc_id in candidates
+            if scores[doc_id] > min_score
+        ]
+
+
+_search_index = None
+
+
+def get_search_index():
+    """Process-wide index over SPEC_REGISTRY, built on first use."""
+    global _search_index
+    if _search_index is None:
+        _search_index = SegmentSearchIndex()
+    return _search_index
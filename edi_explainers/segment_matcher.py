@@ -0,0 +1,145 @@
+# edi_explainers/segment_matcher.py
+"""
+Finds every segment code mentioned in a free-text question.
+
+An Aho-Corasick automaton is built over the segment keys of all registered
+specs (bare tags such as 'BGM' or 'DTM', qualified keys such as 'QTY+52' or 'NAD+ST',
+and each alternative of combined keys such as 'LOC+11/159'; X12 keys also in
+their '*' notation, e.g. 'N1*ST'). A question is
+scanned once, case-insensitively, and only whole-word matches are kept, so
+'WHAT IS NAD+ST AND QTY+52?' yields NAD+ST and QTY+52 while 'WHAT' or the
+'NAD' inside 'NAD+ST' do not count.
+
+Bare X12 tags are often ordinary words ('per', 'ref', 'st', 'man'), so a tag
+only X12 specs define counts only where it is written in upper case or next
+to the word 'segment' ('the ref segment'); its qualified and '*' forms match
+in any case.
+"""
+import re
+from collections import deque, namedtuple
+
+from .registry import KEY_INDEX
+
+# parts is the (tag, qualifier, ...) tuple, as used by registry.KEY_INDEX
+SegmentMention = namedtuple("SegmentMention", "text parts start end")
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+_SEGMENT_WORD_AFTER_RE = re.compile(r"\s+segments?\b", re.IGNORECASE)
+_SEGMENT_WORD_BEFORE_RE = re.compile(r"\bsegments?\s+$", re.IGNORECASE)
+
+
+def _next_to_segment_word(text, start, end):
+    return bool(_SEGMENT_WORD_AFTER_RE.match(text, end) or _SEGMENT_WORD_BEFORE_RE.search(text[max(start - 16, 0):start]))
+
+
+class SegmentMatcher:
+    """Aho-Corasick automaton over segment keys; `find` runs in one pass over the text."""
+
+    def __init__(self, key_index=None):
+        key_index = KEY_INDEX if key_index is None else key_index
+        patterns = {}  # upper-cased pattern -> (tag, qualifier, ...)
+        x12_tags, other_tags = set(), set()
+        for spec, index in key_index.items():
+            for parts in index:
+                patterns.setdefault("+".join(parts), parts)
+                patterns.setdefault(parts[0], parts[:1])  # bare tags, e.g. 'DTM' for all DTM qualifiers
+                if spec[0] == "X12":
+                    patterns.setdefault("*".join(parts), parts)  # X12 notation, e.g. 'N1*ST'
+                    x12_tags.add(parts[0])
+                else:
+                    other_tags.add(parts[0])
+            for key in index.values():
+                patterns.setdefault(key, tuple(key.split("+")))
+        # Bare tags that must be written in upper case (or next to 'segment') to count.
+        strict = x12_tags - other_tags
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # state -> patterns ending here, longest first
+        for pattern, parts in patterns.items():
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(pattern), pattern, parts, pattern in strict))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+        self.pattern_count = len(patterns)
+
+    def find(self, text):
+        """
+        Returns every whole-word segment mention in `text` as SegmentMention
+        tuples, longest match wins where mentions overlap, in text order.
+        """
+        found = []
+        state = 0
+        for position, ch in enumerate(text):
+            upper = ch.upper()
+            if len(upper) == 1:
+                ch = upper
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, pattern, parts, strict in self._output[state]:
+                start = position - length + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if position + 1 < len(text) and _is_word_char(text[position + 1]):
+                    continue
+                if strict and not text[start:position + 1].isupper() and not _next_to_segment_word(text, start, position + 1):
+                    continue
+                found.append(SegmentMention(pattern, parts, start, position + 1))
+
+        # Keep the leftmost-longest mention of each overlapping group ('NAD+ST' over 'NAD').
+        found.sort(key=lambda mention: (mention.start, -(mention.end - mention.start)))
+        mentions = []
+        for mention in found:
+            if mentions and mention.start < mentions[-1].end:
+                continue
+            mentions.append(mention)
+        return mentions
+
+
+def rank_mentions(mentions, text):
+    """
+    Orders mentions by relevance: qualified codes before bare tags, codes
+    written in upper case before lower-case words, then by position.
+    Repeated mentions of the same code are dropped.
+    """
+    unique = {}
+    for mention in mentions:
+        unique.setdefault(mention.parts, mention)
+    return sorted(
+        unique.values(),
+        key=lambda mention: (-len(mention.parts), not text[mention.start:mention.end].isupper(), mention.start),
+    )
+
+
+_segment_matcher = None
+
+
+def get_segment_matcher():
+    """Process-wide matcher over the keys of every registered spec, built on first use."""
+    global _segment_matcher
+    if _segment_matcher is None:
+        _segment_matcher = SegmentMatcher()
+    return _segment_matcher
@@ -0,0 +1,219 @@
+# edi_explainers/spec_store.py
+"""
+Compiled spec store.
+
+`compile_spec_store` writes the segment tables of every explainer module into
+one indexed SQLite file. `SpecStore` reads it back lazily: a spec's table is a
+`LazySegmentTable` mapping that only fetches a segment's texts when it is
+looked up, so process memory and cold start no longer grow with the number
+of explainer modules.
+
+Build the store (from the repository root):
+    python -m edi_explainers.spec_store build [path]
+
+and point the registry at it with EDI_SPEC_STORE_PATH=<path>. The store
+records a hash of the explainer module sources it was compiled from; a store
+that no longer matches them (e.g. compiled before a spec was added) is
+rebuilt when the registry loads it.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec_store.sqlite")
+SCHEMA_VERSION = 1
+
+# Segments kept in memory per table after being read from disk; well below
+# the size of a table, so the store stays lazy after a warm-up.
+SEGMENT_CACHE_SIZE = 32
+
+
+def table_content_hash(table):
+    """SHA-256 over the canonical JSON of a segment table."""
+    canonical = json.dumps(table, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def explainer_sources_hash():
+    """SHA-256 over the source files of every explainer module, read without importing them."""
+    from . import edifact, x12
+    digest = hashlib.sha256()
+    for package in (edifact, x12):
+        for spec, (module_name, table_name) in sorted(package.EXPLAINER_MODULES.items()):
+            origin = importlib.util.find_spec(f"{package.__name__}.{module_name}").origin
+            digest.update(f"{package.__name__}.{module_name}:{table_name}\n".encode("utf-8"))
+            with open(origin, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def compile_spec_store(path, tables, sources_hash=None):
+    """
+    Writes `tables` ({(standard, message_type, version): segment table}) to a new
+    SQLite file at `path`, replacing it atomically. `sources_hash` (see
+    explainer_sources_hash) records which explainer modules the tables came from.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # per process, so concurrent rebuilds do not collide
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE specs (
+                id INTEGER PRIMARY KEY,
+                standard TEXT NOT NULL, message_type TEXT NOT NULL, version TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                UNIQUE (standard, message_type, version)
+            );
+            CREATE TABLE segments (
+                spec_id INTEGER NOT NULL REFERENCES specs (id),
+                position INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                usage TEXT NOT NULL,
+                PRIMARY KEY (spec_id, key)
+            ) WITHOUT ROWID;
+            """
+        )
+        for (standard, message_type, version), table in tables.items():
+            cursor = conn.execute(
+                "INSERT INTO specs (standard, message_type, version, content_hash) VALUES (?, ?, ?, ?)",
+                (standard, message_type, version, table_content_hash(table)),
+            )
+            conn.executemany(
+                "INSERT INTO segments (spec_id, position, key, explanation, usage) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, position, key, info.get("explanation", ""), info.get("usage", ""))
+                    for position, (key, info) in enumerate(table.items())
+                ],
+            )
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [("schema_version", str(SCHEMA_VERSION)), ("built_at", str(time.time())), ("sources_hash", sources_hash or "")],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+class LazySegmentTable(Mapping):
+    """
+    Read-only mapping {segment key: {"explanation", "usage"}} backed by the store.
+    Keys are loaded on first use; segment texts only when looked up, with a
+    small per-table LRU in front of SQLite.
+    """
+
+    def __init__(self, store, spec_id, content_hash):
+        self._store = store
+        self._spec_id = spec_id
+        self.content_hash = content_hash
+        self._keys = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key_set(self):
+        if self._keys is None:
+            keys = self._store._fetch_keys(self._spec_id)
+            self._keys = dict.fromkeys(keys)  # keeps table order, O(1) membership
+        return self._keys
+
+    def __getitem__(self, key):
+        with self._lock:
+            info = self._cache.get(key)
+            if info is not None:
+                self._cache.move_to_end(key)
+                return info
+        if key not in self._key_set():
+            raise KeyError(key)
+        info = self._store._fetch_segment(self._spec_id, key)
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > SEGMENT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return info
+
+    def __contains__(self, key):
+        return key in self._key_set()
+
+    def scan(self):
+        """Yields (key, info) for every segment in table order, in one query and without filling the cache."""
+        return self._store._fetch_segments(self._spec_id)
+
+    def __iter__(self):
+        return iter(self._key_set())
+
+    def __len__(self):
+        return len(self._key_set())
+
+
+class SpecStore:
+    """Read-only access to a compiled spec store; one SQLite connection per thread."""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Spec store not found: {path}")
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _fetch_keys(self, spec_id):
+        rows = self._connection().execute("SELECT key FROM segments WHERE spec_id = ? ORDER BY position", (spec_id,))
+        return [row[0] for row in rows]
+
+    def _fetch_segment(self, spec_id, key):
+        row = self._connection().execute(
+            "SELECT explanation, usage FROM segments WHERE spec_id = ? AND key = ?", (spec_id, key)
+        ).fetchone()
+        return {"explanation": row[0], "usage": row[1]}
+
+    def _fetch_segments(self, spec_id):
+        rows = self._connection().execute(
+            "SELECT key, explanation, usage FROM segments WHERE spec_id = ? ORDER BY position", (spec_id,)
+        )
+        for key, explanation, usage in rows:
+            yield key, {"explanation": explanation, "usage": usage}
+
+    def sources_hash(self):
+        """explainer_sources_hash of the modules the store was compiled from ('' if not recorded)."""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'sources_hash'").fetchone()
+        return row[0] if row else ""
+
+    def tables(self):
+        """{(standard, message_type, version): LazySegmentTable} for every spec in the store."""
+        rows = self._connection().execute("SELECT id, standard, message_type, version, content_hash FROM specs ORDER BY id")
+        return {
+            (standard, message_type, version): LazySegmentTable(self, spec_id, content_hash)
+            for spec_id, standard, message_type, version, content_hash in rows
+        }
+
+
+def main(argv):
+    if len(argv) < 1 or argv[0] != "build":
+        print("Usage: python -m edi_explainers.spec_store build [path]")
+        return 2
+    from .registry import build_registry_from_modules
+    path = argv[1] if len(argv) > 1 else DEFAULT_STORE_PATH
+    tables = build_registry_from_modules()
+    compile_spec_store(path, tables, explainer_sources_hash())
+    print(f"Compiled {len(tables)} specs ({sum(len(table) for table in tables.values())} segments) into {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
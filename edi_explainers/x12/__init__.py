@@ -0,0 +1,25 @@
+# edi_explainers/x12/__init__.py
+# ANSI ASC X12 explainer modules, one per (transaction set, version). Like the
+# EDIFACT package, the modules are loaded by name and only when their tables
+# are needed, so importing this package (e.g. for the tokenizer) stays cheap.
+import importlib
+
+# (transaction set, version) -> (explainer module, name of its segment table)
+EXPLAINER_MODULES = {
+    ("830", "004010"): ("x830_004010", "segment_explanations_830"),
+    ("856", "004010"): ("x856_004010", "segment_explanations_856"),
+}
+
+# GS01 functional identifier code -> the transaction set a functional group of that kind holds
+FUNCTIONAL_GROUPS = {
+    "PS": "830",
+    "SH": "856",
+}
+
+
+def load_segment_tables():
+    """Imports every explainer module and returns {(transaction set, version): segment table}."""
+    return {
+        spec: getattr(importlib.import_module(f"{__name__}.{module_name}"), table_name)
+        for spec, (module_name, table_name) in EXPLAINER_MODULES.items()
+    }
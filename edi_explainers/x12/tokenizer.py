@@ -0,0 +1,160 @@
+# edi_explainers/x12/tokenizer.py
+"""
+Streaming ANSI X12 tokenizer.
+
+X12 has no fixed service characters: the interchange header ISA declares
+them. Its element separator is the character right after 'ISA', the
+component (sub-element) separator is the value of ISA16 and the segment
+terminator is the character that follows it. `SegmentReader` reads them from
+the ISA and then splits the rest of the input as it is fed in; `iter_segments`
+does the same for a string, bytes, file or iterable of chunks. Like the
+EDIFACT tokenizer it yields edifact.tokenizer.Segment tuples one at a time and
+keeps only the unfinished segment between chunks, so large files are read in
+linear time and constant memory. X12 has no release character.
+"""
+import re
+from collections import namedtuple
+
+from ..edifact.tokenizer import CHUNK_SIZE, Segment, _iter_chunks
+
+Delimiters = namedtuple("Delimiters", "element component repetition segment")
+
+# Used for fragments pasted without an ISA header (e.g. starting at ST).
+DEFAULT_DELIMITERS = Delimiters("*", ">", None, "~")
+
+# ISA has 16 elements; a well-formed (fixed-width) ISA is 106 characters long.
+ISA_ELEMENT_COUNT = 16
+# Beyond this many characters without a complete ISA the input is read with DEFAULT_DELIMITERS.
+MAX_ISA_LENGTH = 512
+
+# Element positions (0-based, after the tag) that identify a segment's variant, where
+# they are not the first two elements, e.g. HL03 (hierarchical level code) for HL*1**S.
+QUALIFIER_ELEMENTS = {
+    "HL": (2,),
+    "FST": (1,),
+}
+
+_SEGMENT_START_RE = re.compile(r"^(ISA|GS|ST)[^A-Za-z0-9\s]")
+
+
+def looks_like_interchange(text):
+    """True if `text` looks like pasted X12 data rather than a question."""
+    stripped = text.lstrip()
+    match = _SEGMENT_START_RE.match(stripped)
+    return bool(match) and (stripped.startswith("ISA") or DEFAULT_DELIMITERS.segment in stripped)
+
+
+def segment_qualifiers(segment):
+    """First component of each identifying element, e.g. ['ST'] for N1*ST*ACME or ['S'] for HL*1**S."""
+    positions = QUALIFIER_ELEMENTS.get(segment.tag)
+    elements = segment.elements if positions is None else [segment.elements[i] if i < len(segment.elements) else [] for i in positions]
+    return [element[0] if element else "" for element in elements]
+
+
+def read_isa_delimiters(text):
+    """
+    Delimiters declared by the ISA segment at the start of `text`, or None if
+    `text` does not yet hold the complete ISA. Counts the element separators
+    rather than relying on the fixed ISA width, so unpadded headers work too.
+    """
+    if len(text) < 4:
+        return None
+    element = text[3]
+    positions = []
+    position = 3
+    while len(positions) < ISA_ELEMENT_COUNT:
+        positions.append(position)
+        position = text.find(element, position + 1)
+        if position == -1:
+            return None
+    isa16 = positions[-1] + 1
+    if isa16 + 1 >= len(text):
+        return None
+    isa11 = text[positions[10] + 1:positions[11]]
+    # ISA11 is the repetition separator from version 00402 on; before it, an identifier ('U').
+    repetition = isa11 if len(isa11) == 1 and not isa11.isalnum() else None
+    return Delimiters(element, text[isa16], repetition, text[isa16 + 1])
+
+
+def parse_segment(raw, delimiters=DEFAULT_DELIMITERS):
+    """Parses the text of one segment (without its terminator) into a `Segment`."""
+    elements = raw.split(delimiters.element)
+    tag = elements[0].strip().upper()
+    if tag == "ISA":
+        # ISA16 is the component separator itself; ISA elements have no components.
+        return Segment(tag, [[element] for element in elements[1:]], raw)
+    return Segment(tag, [element.split(delimiters.component) for element in elements[1:]], raw)
+
+
+class SegmentReader:
+    """
+    Push-style tokenizer with the same interface as edifact.tokenizer.SegmentReader:
+    `feed` it text as it arrives and it returns the segments completed so far.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._search_from = 0
+        self.delimiters = None
+
+    def feed(self, text):
+        """Adds `text` to the input and returns the list of completed segments."""
+        self._buffer += text
+        if self.delimiters is None:
+            stripped = self._buffer.lstrip()
+            if stripped.startswith("ISA"):
+                self.delimiters = read_isa_delimiters(stripped)
+                if self.delimiters is None:
+                    if len(stripped) < MAX_ISA_LENGTH:
+                        return []  # Wait for the rest of the ISA
+                    self.delimiters = DEFAULT_DELIMITERS
+            elif "ISA".startswith(stripped):
+                return []  # Too little input to tell whether it starts with an ISA
+            else:
+                self.delimiters = DEFAULT_DELIMITERS
+            self._buffer = stripped
+
+        buffer = self._buffer
+        terminator = self.delimiters.segment
+        segments = []
+        start = 0
+        while True:
+            end = buffer.find(terminator, self._search_from)
+            if end == -1:
+                break
+            raw = buffer[start:end].lstrip().rstrip("\r\n")
+            start = self._search_from = end + 1
+            if raw:
+                segments.append(parse_segment(raw, self.delimiters))
+        # Keep only the unfinished segment and remember how far it has been searched.
+        self._buffer = buffer[start:]
+        self._search_from = len(self._buffer)
+        return segments
+
+    def close(self):
+        """Returns the last segment if the input did not end with a terminator."""
+        raw = self._buffer.strip()
+        self._buffer = ""
+        self._search_from = 0
+        if not raw:
+            return []
+        return [parse_segment(raw, self.delimiters or DEFAULT_DELIMITERS)]
+
+
+def iter_segments(source, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+    """
+    Lazily tokenizes an X12 interchange.
+
+    Args:
+        source: The interchange as a string, bytes, a file-like object opened in
+            text or binary mode, or any iterable of str/bytes chunks.
+        chunk_size (int): Number of characters/bytes read per chunk.
+        encoding (str): Encoding used to decode byte input.
+
+    Yields:
+        Segment: One segment at a time, starting with the ISA if present.
+    """
+    reader = SegmentReader()
+    for chunk in _iter_chunks(source, chunk_size, encoding):
+        yield from reader.feed(chunk)
+    yield from reader.close()
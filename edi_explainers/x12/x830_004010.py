@@ -0,0 +1,137 @@
+segment_explanations_830 = {
+    "ISA": {
+        "explanation": "The Interchange Control Header (ISA) starts every X12 interchange. It is fixed-width (106 characters) and identifies the sender and receiver, the date and time of preparation and the interchange control number. It also declares the delimiters of the whole interchange: the character after 'ISA' is the element separator, ISA16 is the component (sub-element) separator and the character following ISA16 is the segment terminator.",
+        "usage": "Mandatory, once per interchange. Key elements:\n- ISA05/ISA06 and ISA07/ISA08: sender and receiver ID qualifiers and IDs (e.g. 01 = DUNS, ZZ = mutually defined), padded to 15 characters.\n- ISA09/ISA10: date (YYMMDD) and time (HHMM).\n- ISA12: interchange control version, 00401 for 004010.\n- ISA13: interchange control number, repeated in IEA02.\n- ISA15: P for production, T for test data.\nExample: ISA*00*          *00*          *01*123456789      *ZZ*SUPPLIER01     *240803*0501*U*00401*000000101*0*P*>~"
+    },
+    "GS": {
+        "explanation": "The Functional Group Header (GS) groups transaction sets of the same kind within an interchange. For planning schedules the functional identifier code is PS. GS08 names the X12 version the group is written in.",
+        "usage": "Mandatory, once per functional group. GS01 = PS (Planning Schedule with Release Capability), GS02/GS03 = application sender's and receiver's codes, GS04/GS05 = date (CCYYMMDD) and time, GS06 = group control number (repeated in GE02), GS07 = X (X12), GS08 = 004010.\nExample: GS*PS*123456789*SUPPLIER01*20240803*0501*101*X*004010~"
+    },
+    "ST": {
+        "explanation": "The Transaction Set Header (ST) starts one 830 Planning Schedule with Release Capability and gives it a control number that is repeated in the SE trailer.",
+        "usage": "Mandatory. ST01 = 830 (transaction set identifier), ST02 = transaction set control number, unique within the functional group.\nExample: ST*830*0001~"
+    },
+    "BFR": {
+        "explanation": "The Beginning Segment for Planning Schedule (BFR) identifies the schedule: whether it is new or replaces an earlier one, its reference number, whether quantities are cumulative or discrete, and the horizon the forecast covers.",
+        "usage": "Mandatory. Key elements:\n- BFR01: transaction set purpose code, 00 = original, 05 = replace.\n- BFR02/BFR03: forecast reference and release numbers.\n- BFR04: schedule type qualifier, e.g. DL = delivery based, SH = shipment based.\n- BFR05: schedule quantity qualifier, A = actual discrete quantities, C = cumulative quantities.\n- BFR06/BFR07: horizon start and end dates (CCYYMMDD).\n- BFR08: date the forecast was generated.\nExample: BFR*05*1000006440**DL*A*20240805*20250131*20240803~"
+    },
+    "N1+ST": {
+        "explanation": "The Name segment with entity identifier ST (Ship To) identifies the plant or location the scheduled parts are to be delivered to.",
+        "usage": "Conditional in the header or detail N1 loop; required by most trading partners. N103/N104 carry the identification code qualifier and code (e.g. 92 = assigned by buyer, 1 = DUNS).\nExample: N1*ST*TORSLANDA PLANT*92*BP2TD~"
+    },
+    "N1+SU": {
+        "explanation": "The Name segment with entity identifier SU (Supplier/Manufacturer) identifies the supplier the schedule is addressed to.",
+        "usage": "Conditional; usually sent in the header N1 loop. Example: N1*SU*ACME COMPONENTS*92*B1234~, where B1234 is the supplier code assigned by the buyer."
+    },
+    "N1+MI": {
+        "explanation": "The Name segment with entity identifier MI (Planning Schedule/Material Release Issuer) identifies the party that issued the schedule, typically the buyer's material planning department.",
+        "usage": "Conditional. Used when the issuer differs from the ship-to location or must be named explicitly. Example: N1*MI*MATERIAL PLANNING*92*MP01~"
+    },
+    "N1+SF": {
+        "explanation": "The Name segment with entity identifier SF (Ship From) identifies the location the parts are shipped from, when it differs from the supplier's main address.",
+        "usage": "Conditional. The ship-from code must match the one the supplier sends in the 856 ship notice. Example: N1*SF*ACME WAREHOUSE*92*B1234-01~"
+    },
+    "N3": {
+        "explanation": "The Address Information segment (N3) gives the street address of the party named in the preceding N1 segment.",
+        "usage": "Optional, up to twice per N1 loop. N301/N302 are free-text address lines. Example: N3*123 INDUSTRIAL AVE~"
+    },
+    "N4": {
+        "explanation": "The Geographic Location segment (N4) gives the city, state or province, postal code and country of the party named in the preceding N1 segment.",
+        "usage": "Optional, once per N1 loop. N401 = city, N402 = state/province code, N403 = postal code, N404 = country code.\nExample: N4*DETROIT*MI*48201*US~"
+    },
+    "PER": {
+        "explanation": "The Administrative Communications Contact segment (PER) names a person or department to contact about the schedule and how to reach them.",
+        "usage": "Optional. PER01 = contact function code (e.g. EX = expeditor, SC = schedule contact), PER02 = name, PER03/PER04 = communication number qualifier and number (TE = telephone, EM = e-mail).\nExample: PER*SC*JANE DOE*TE*3135550100*EM*JANE.DOE@EXAMPLE.COM~"
+    },
+    "TD5": {
+        "explanation": "The Carrier Details (Routing Sequence/Transit Time) segment (TD5) specifies the carrier, routing or transport mode the buyer wants the parts shipped with.",
+        "usage": "Optional. TD502/TD503 = identification code qualifier and carrier code (2 = SCAC), TD504 = transportation method (e.g. M = motor, A = air), TD505 = routing.\nExample: TD5*B*2*ABCD*M~"
+    },
+    "LIN": {
+        "explanation": "The Item Identification segment (LIN) starts the detail loop for one part and identifies it by product ID qualifier/value pairs, such as the buyer's part number, its engineering change level and the purchase order.",
+        "usage": "Mandatory per scheduled item. LIN02/LIN03 = BP (buyer's part number) and the part number; further pairs may carry EC (engineering change level), PO (purchase order number) or VP (vendor's part number).\nExample: LIN**BP*32131234*EC*A*PO*5500012345~"
+    },
+    "UIT": {
+        "explanation": "The Unit Detail segment (UIT) gives the unit of measure in which all quantities of the item's schedule are expressed.",
+        "usage": "Mandatory in most implementations, once per LIN loop. UIT01 = unit of measure code, e.g. EA = each, PC = piece, KG = kilogram.\nExample: UIT*EA~"
+    },
+    "PO4": {
+        "explanation": "The Item Physical Details segment (PO4) describes how the item is to be packed: the pack size and the packaging code the buyer expects.",
+        "usage": "Optional. PO401 = number of inner packs, PO402 = size (quantity per pack), PO403 = unit of measure, PO404 = packaging code (e.g. BOX, PLT).\nExample: PO4*1*200*EA*BOX~"
+    },
+    "REF+DK": {
+        "explanation": "The Reference Identification segment with qualifier DK (Dock Number) names the receiving dock at the ship-to location the item must be delivered to.",
+        "usage": "Optional, within the LIN loop. The dock code must be printed on shipping labels and returned in the 856. Example: REF*DK*D12~"
+    },
+    "REF": {
+        "explanation": "The Reference Identification segment (REF) carries an additional reference for the schedule or the item, identified by the qualifier in REF01.",
+        "usage": "Optional. REF01 = reference qualifier, REF02 = reference value. Common qualifiers in the 830 are DK (dock number), LF (assembly line feed location) and IA (internal vendor number).\nExample: REF*LF*L45~"
+    },
+    "ATH+FI": {
+        "explanation": "The Resource Authorization segment with code FI (Finished labor, material and overhead/burden) states the cumulative quantity up to a date for which the buyer accepts financial liability for finished goods.",
+        "usage": "Optional, within the LIN loop. ATH02 = end date of the authorization, ATH03 = cumulative authorized quantity, ATH05 = cumulative start date.\nExample: ATH*FI*20240901*4800**20240101~ authorizes finished goods up to a cumulative 4800 units from January 1 through September 1."
+    },
+    "ATH+MT": {
+        "explanation": "The Resource Authorization segment with code MT (Material) states the cumulative quantity up to a date for which the buyer accepts liability for raw material the supplier procures.",
+        "usage": "Optional, within the LIN loop. Same layout as ATH*FI. The raw material authorization usually reaches further into the future than the finished goods authorization.\nExample: ATH*MT*20241001*6000**20240101~"
+    },
+    "SDP": {
+        "explanation": "The Ship/Delivery Pattern segment (SDP) tells on which days and at which times the item should be shipped or delivered, and groups the FST segments that follow it.",
+        "usage": "Optional, starts the SDP loop. SDP01 = ship/delivery calendar code (e.g. A = Monday through Friday, N = as directed), SDP02 = ship/delivery time code (e.g. Y = none).\nExample: SDP*A*Y~"
+    },
+    "FST+C": {
+        "explanation": "The Forecast Schedule segment with forecast qualifier C (Firm) gives a quantity the supplier must ship or deliver on the given date; it works as a release.",
+        "usage": "Mandatory for firm periods. FST01 = quantity, FST02 = C, FST03 = timing qualifier (D = discrete day, W = weekly, F = flexible interval), FST04 = date, FST05 = period end date for interval buckets.\nExample: FST*400*C*D*20240805~"
+    },
+    "FST+D": {
+        "explanation": "The Forecast Schedule segment with forecast qualifier D (Planning) gives a forecast quantity for a future period that the supplier uses for capacity and material planning only; it is not an authorization to ship.",
+        "usage": "Used for the periods after the firm horizon. Layout as FST*C. Weekly or monthly buckets are common.\nExample: FST*2000*D*W*20240902~"
+    },
+    "SHP+01": {
+        "explanation": "The Shipped/Received Information segment with quantity qualifier 01 (Discrete quantity) reports the quantity of the last shipment(s) the buyer received, so the supplier can reconcile against its own records.",
+        "usage": "Optional, within the SHP loop. SHP02 = quantity, SHP03/SHP04 = date qualifier (050 = received, 011 = shipped) and date.\nExample: SHP*01*400*050*20240801~"
+    },
+    "SHP+02": {
+        "explanation": "The Shipped/Received Information segment with quantity qualifier 02 (Cumulative quantity) reports the cumulative quantity received since the cumulative start date. Suppliers compare it with their own cumulative shipped quantity to detect missing or duplicate ASNs.",
+        "usage": "Optional, within the SHP loop. SHP02 = cumulative quantity, SHP03/SHP04 = 051 (cumulative quantity start) and start date, SHP05/SHP06 = end of the cumulative period.\nExample: SHP*02*12400*051*20240101**20240801~"
+    },
+    "CTT": {
+        "explanation": "The Transaction Totals segment (CTT) gives control totals for the 830 so the receiver can check that no item loop was lost.",
+        "usage": "Mandatory in most implementations. CTT01 = number of LIN segments, CTT02 = hash total of the quantities in the FST segments.\nExample: CTT*2*9200~"
+    },
+    "SE": {
+        "explanation": "The Transaction Set Trailer (SE) ends the 830 and states how many segments it contains.",
+        "usage": "Mandatory. SE01 = number of segments including ST and SE, SE02 = control number, identical to ST02.\nExample: SE*24*0001~"
+    },
+    "GE": {
+        "explanation": "The Functional Group Trailer (GE) ends a functional group and states how many transaction sets it contains.",
+        "usage": "Mandatory. GE01 = number of transaction sets in the group, GE02 = group control number, identical to GS06.\nExample: GE*1*101~"
+    },
+    "IEA": {
+        "explanation": "The Interchange Control Trailer (IEA) ends the interchange and states how many functional groups it contains.",
+        "usage": "Mandatory. IEA01 = number of functional groups, IEA02 = interchange control number, identical to ISA13.\nExample: IEA*1*000000101~"
+    },
+}
+
+def explain_segment(segment):
+    segment_info = segment_explanations_830.get(segment.upper(), None)
+    if segment_info:
+        return f"**Explanation**\n{segment_info['explanation']}\n\n**Usage**\n{segment_info['usage']}"
+    return f"No explanation available for X12 830 004010 segment {segment}."
+
+def process(user_message):
+    """
+    Process a user message using X12 830 004010 specification.
+
+    Args:
+        user_message (str): The user's input message (e.g., 'BFR' or 'What is the BFR segment?').
+
+    Returns:
+        str: The formatted explanation of the segment.
+    """
+    # Parse the message to extract a segment code
+    words = user_message.upper().split()
+    segment = next((word for word in words if word in segment_explanations_830), None)
+    if segment:
+        return explain_segment(segment)
+    return f"Could not find a valid segment code in your message: {user_message}"
@@ -0,0 +1,153 @@
+segment_explanations_856 = {
+    "ISA": {
+        "explanation": "The Interchange Control Header (ISA) starts every X12 interchange. It is fixed-width (106 characters) and identifies the sender and receiver, the date and time of preparation and the interchange control number. It also declares the delimiters of the whole interchange: the character after 'ISA' is the element separator, ISA16 is the component (sub-element) separator and the character following ISA16 is the segment terminator.",
+        "usage": "Mandatory, once per interchange. Key elements:\n- ISA05/ISA06 and ISA07/ISA08: sender and receiver ID qualifiers and IDs (e.g. 01 = DUNS, ZZ = mutually defined), padded to 15 characters.\n- ISA09/ISA10: date (YYMMDD) and time (HHMM).\n- ISA12: interchange control version, 00401 for 004010.\n- ISA13: interchange control number, repeated in IEA02.\n- ISA15: P for production, T for test data.\nExample: ISA*00*          *00*          *ZZ*SUPPLIER01     *01*123456789      *240805*1412*U*00401*000000202*0*P*>~"
+    },
+    "GS": {
+        "explanation": "The Functional Group Header (GS) groups transaction sets of the same kind within an interchange. For ship notices the functional identifier code is SH. GS08 names the X12 version the group is written in.",
+        "usage": "Mandatory, once per functional group. GS01 = SH (Ship Notice/Manifest), GS02/GS03 = application sender's and receiver's codes, GS04/GS05 = date (CCYYMMDD) and time, GS06 = group control number (repeated in GE02), GS07 = X (X12), GS08 = 004010.\nExample: GS*SH*SUPPLIER01*123456789*20240805*1412*202*X*004010~"
+    },
+    "ST": {
+        "explanation": "The Transaction Set Header (ST) starts one 856 Ship Notice/Manifest (advance ship notice, ASN) and gives it a control number that is repeated in the SE trailer.",
+        "usage": "Mandatory. ST01 = 856 (transaction set identifier), ST02 = transaction set control number, unique within the functional group.\nExample: ST*856*0001~"
+    },
+    "BSN": {
+        "explanation": "The Beginning Segment for Ship Notice (BSN) identifies the ASN: whether it is new, replaces or cancels an earlier one, the supplier's shipment identification, and when the ASN was created.",
+        "usage": "Mandatory. BSN01 = transaction set purpose code (00 = original, 05 = replace, 01 = cancellation), BSN02 = shipment identification (ASN number, unique per shipment), BSN03/BSN04 = creation date (CCYYMMDD) and time, BSN05 = hierarchical structure code (e.g. 0001 = shipment, order, packaging, item).\nExample: BSN*00*ASN0004711*20240805*1412*0001~"
+    },
+    "DTM+011": {
+        "explanation": "The Date/Time Reference segment with qualifier 011 (Shipped) gives the date and time the goods left the ship-from location.",
+        "usage": "Mandatory in most implementations, at shipment level. DTM02 = date (CCYYMMDD), DTM03 = time (HHMM), DTM04 = time zone code (e.g. ET).\nExample: DTM*011*20240805*1400*ET~"
+    },
+    "DTM+017": {
+        "explanation": "The Date/Time Reference segment with qualifier 017 (Estimated Delivery) gives the date and time the shipment is expected to arrive at the ship-to location.",
+        "usage": "Optional, at shipment level. Layout as DTM*011. Example: DTM*017*20240807*0600*ET~"
+    },
+    "HL+S": {
+        "explanation": "The Hierarchical Level segment with level code S (Shipment) starts the shipment level of the ASN. Everything that applies to the whole shipment (weights, carrier, references, parties) follows it.",
+        "usage": "Mandatory, exactly one per ASN and always the first HL. HL01 = hierarchical ID number (1), HL02 = parent ID (empty for the shipment), HL03 = S.\nExample: HL*1**S~"
+    },
+    "HL+O": {
+        "explanation": "The Hierarchical Level segment with level code O (Order) starts an order level below the shipment; it groups the packs or items shipped against one purchase order.",
+        "usage": "Used when a shipment covers several purchase orders. HL02 = ID of the parent shipment level, HL03 = O. The order is identified by the PRF segment that follows.\nExample: HL*2*1*O~"
+    },
+    "HL+T": {
+        "explanation": "The Hierarchical Level segment with level code T (Shipping Tare) starts a tare level, e.g. a pallet that holds several cartons. The pallet's label serial number follows in a MAN segment.",
+        "usage": "Optional; used for mixed or master-labelled pallets. HL02 = ID of the parent level, HL03 = T.\nExample: HL*3*2*T~"
+    },
+    "HL+P": {
+        "explanation": "The Hierarchical Level segment with level code P (Pack) starts a pack level: one carton or container with its own label.",
+        "usage": "Optional; used when the receiver scans individual cartons. HL02 = ID of the parent (order or tare) level, HL03 = P.\nExample: HL*4*3*P~"
+    },
+    "HL+I": {
+        "explanation": "The Hierarchical Level segment with level code I (Item) starts an item level: one part and the quantity of it shipped in the parent level.",
+        "usage": "Mandatory, at least one per ASN. HL02 = ID of the parent level, HL03 = I. The LIN and SN1 segments that follow identify the part and the quantity.\nExample: HL*5*4*I~"
+    },
+    "HL": {
+        "explanation": "The Hierarchical Level segment (HL) structures the ASN as a tree: shipment, then optionally order, tare and pack levels, then items. Each HL has an ID (HL01), refers to its parent's ID (HL02) and states its level (HL03).",
+        "usage": "Mandatory. HL03 level codes: S = shipment, O = order, T = shipping tare, P = pack, I = item. IDs are numbered sequentially through the ASN.\nExample: HL*1**S~ HL*2*1*O~ HL*3*2*I~"
+    },
+    "TD1": {
+        "explanation": "The Carrier Details (Quantity and Weight) segment (TD1) gives the packaging, the number of packages and the weight of the shipment.",
+        "usage": "Mandatory in most implementations, at shipment level. TD101 = packaging code (e.g. CTN25 = corrugated carton, PLT90 = pallet), TD102 = lading quantity, TD106/TD107/TD108 = weight qualifier (G = gross), weight and unit (LB or KG).\nExample: TD1*CTN25*12****G*480*LB~"
+    },
+    "TD5": {
+        "explanation": "The Carrier Details (Routing Sequence/Transit Time) segment (TD5) identifies the carrier and the transportation method of the shipment.",
+        "usage": "Mandatory in most implementations, at shipment level. TD501 = routing sequence code (B = origin/delivery carrier), TD502/TD503 = identification code qualifier and carrier code (2 = SCAC), TD504 = transportation method (M = motor, A = air, E = expedited truck).\nExample: TD5*B*2*ABCD*M~"
+    },
+    "TD3": {
+        "explanation": "The Carrier Details (Equipment) segment (TD3) identifies the trailer or container the goods are loaded in.",
+        "usage": "Optional, at shipment level. TD301 = equipment description code (e.g. TL = trailer), TD302/TD303 = equipment initial and number.\nExample: TD3*TL*ABCD*4711~"
+    },
+    "REF+BM": {
+        "explanation": "The Reference Identification segment with qualifier BM (Bill of Lading Number) gives the bill of lading the shipment travels under.",
+        "usage": "Mandatory in most implementations, at shipment level. Example: REF*BM*BOL123456~"
+    },
+    "REF+PK": {
+        "explanation": "The Reference Identification segment with qualifier PK (Packing List Number) gives the packing list number printed on the shipment's paperwork.",
+        "usage": "Optional, at shipment level. Example: REF*PK*PL98765~"
+    },
+    "REF+CN": {
+        "explanation": "The Reference Identification segment with qualifier CN (Carrier's Reference Number, PRO) gives the carrier's tracking (PRO) number of the shipment.",
+        "usage": "Optional, at shipment level. Example: REF*CN*1234567890~"
+    },
+    "N1+ST": {
+        "explanation": "The Name segment with entity identifier ST (Ship To) identifies the plant or location the shipment is delivered to.",
+        "usage": "Mandatory, at shipment level. N103/N104 carry the identification code qualifier and code; it must match the ship-to code of the 830 or purchase order.\nExample: N1*ST*TORSLANDA PLANT*92*BP2TD~"
+    },
+    "N1+SF": {
+        "explanation": "The Name segment with entity identifier SF (Ship From) identifies the location the shipment leaves from.",
+        "usage": "Mandatory in most implementations, at shipment level. Example: N1*SF*ACME WAREHOUSE*92*B1234-01~"
+    },
+    "N1+SU": {
+        "explanation": "The Name segment with entity identifier SU (Supplier/Manufacturer) identifies the supplier sending the ASN.",
+        "usage": "Conditional, at shipment level. Example: N1*SU*ACME COMPONENTS*92*B1234~"
+    },
+    "N3": {
+        "explanation": "The Address Information segment (N3) gives the street address of the party named in the preceding N1 segment.",
+        "usage": "Optional, up to twice per N1 loop. Example: N3*123 INDUSTRIAL AVE~"
+    },
+    "N4": {
+        "explanation": "The Geographic Location segment (N4) gives the city, state or province, postal code and country of the party named in the preceding N1 segment.",
+        "usage": "Optional, once per N1 loop. Example: N4*DETROIT*MI*48201*US~"
+    },
+    "PRF": {
+        "explanation": "The Purchase Order Reference segment (PRF) identifies the purchase order the goods at this (order) level are shipped against.",
+        "usage": "Mandatory at order level. PRF01 = purchase order number, PRF04 = purchase order date (CCYYMMDD).\nExample: PRF*5500012345***20240115~"
+    },
+    "LIN": {
+        "explanation": "The Item Identification segment (LIN) identifies the part shipped at this item level by product ID qualifier/value pairs.",
+        "usage": "Mandatory at item level. LIN02/LIN03 = BP (buyer's part number) and the part number; further pairs may carry EC (engineering change level), VP (vendor's part number) or PO (purchase order number). The part number must match the one in the 830 or purchase order.\nExample: LIN**BP*32131234*EC*A~"
+    },
+    "SN1": {
+        "explanation": "The Item Detail (Shipment) segment (SN1) gives the quantity of the item shipped and, in many automotive implementations, the cumulative quantity shipped to date.",
+        "usage": "Mandatory at item level. SN102 = number of units shipped, SN103 = unit of measure (e.g. EA), SN104 = cumulative quantity shipped since the cumulative start date.\nExample: SN1**400*EA*12800~"
+    },
+    "MAN+GM": {
+        "explanation": "The Marks and Numbers segment with qualifier GM (SSCC-18 and application identifier) gives the serial shipping container code printed on the label of the pallet or carton at this level.",
+        "usage": "Mandatory at tare or pack level when labels are scanned at receiving. MAN02 = the 18-digit SSCC.\nExample: MAN*GM*001234567890123456~"
+    },
+    "MAN": {
+        "explanation": "The Marks and Numbers segment (MAN) gives the label or serial number of the container at this level, identified by the qualifier in MAN01.",
+        "usage": "Optional. MAN01 = marks and numbers qualifier (e.g. GM = SSCC-18, AA = supplier-assigned serial number, CP = carrier-assigned package ID), MAN02 = the number.\nExample: MAN*AA*S0000471101~"
+    },
+    "CTT": {
+        "explanation": "The Transaction Totals segment (CTT) gives control totals for the ASN so the receiver can check that no hierarchical level was lost.",
+        "usage": "Optional in 004010 but required by many trading partners. CTT01 = number of HL segments, CTT02 = hash total of the SN102 quantities.\nExample: CTT*5*400~"
+    },
+    "SE": {
+        "explanation": "The Transaction Set Trailer (SE) ends the 856 and states how many segments it contains.",
+        "usage": "Mandatory. SE01 = number of segments including ST and SE, SE02 = control number, identical to ST02.\nExample: SE*28*0001~"
+    },
+    "GE": {
+        "explanation": "The Functional Group Trailer (GE) ends a functional group and states how many transaction sets it contains.",
+        "usage": "Mandatory. GE01 = number of transaction sets in the group, GE02 = group control number, identical to GS06.\nExample: GE*1*202~"
+    },
+    "IEA": {
+        "explanation": "The Interchange Control Trailer (IEA) ends the interchange and states how many functional groups it contains.",
+        "usage": "Mandatory. IEA01 = number of functional groups, IEA02 = interchange control number, identical to ISA13.\nExample: IEA*1*000000202~"
+    },
+}
+
+def explain_segment(segment):
+    segment_info = segment_explanations_856.get(segment.upper(), None)
+    if segment_info:
+        return f"**Explanation**\n{segment_info['explanation']}\n\n**Usage**\n{segment_info['usage']}"
+    return f"No explanation available for X12 856 004010 segment {segment}."
+
+def process(user_message):
+    """
+    Process a user message using X12 856 004010 specification.
+
+    Args:
+        user_message (str): The user's input message (e.g., 'BSN' or 'What is the BSN segment?').
+
+    Returns:
+        str: The formatted explanation of the segment.
+    """
+    # Parse the message to extract a segment code
+    words = user_message.upper().split()
+    segment = next((word for word in words if word in segment_explanations_856), None)
+    if segment:
+        return explain_segment(segment)
+    return f"Could not find a valid segment code in your message: {user_message}"
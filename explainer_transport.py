@@ -0,0 +1,224 @@
+# explainer_transport.py
+"""
+Transports between the chat handler and the segment explainer.
+
+- InProcessTransport calls the explainer registry directly (no socket, no JSON)
+  when the edi_explainers package is importable.
+- HttpTransport talks to the FastAPI service over a pooled keep-alive
+  requests.Session with retries and exponential backoff. A spec preloaded
+  with `preload_spec` (one compressed download of its whole segment table)
+  is answered in-process from then on. The copy is revalidated against the
+  export's ETag (the table's content hash) whenever the spec is selected
+  again and at most preload_ttl seconds after the last check, so tables the
+  service deploys later replace it; an unchanged table costs a 304.
+
+Preloading only has an effect with the HTTP transport, i.e. when the chat
+handler runs with EXPLAINER_TRANSPORT=http: with 'auto' it finds
+edi_explainers importable and uses InProcessTransport.
+
+Both return the same response dicts as the FastAPI endpoints, so callers do
+not care which one is in use. `create_transport` picks one from settings.
+"""
+import json
+import sys
+import threading
+import time
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_SECONDS = 0.2
+DEFAULT_TIMEOUT_SECONDS = 15
+DEFAULT_PRELOAD_TTL_SECONDS = 300
+
+
+def _spec_tuple(payload):
+    return (payload["standard"].upper(), payload["message_type"].upper(), (payload.get("version") or "").upper())
+
+
+class PreloadedSpec:
+    """A spec's segment table downloaded from /specs/.../export, with the registry's lookup indexes."""
+
+    def __init__(self, export):
+        from edi_explainers import registry
+        self._registry = registry
+        self.content_hash = export["content_hash"]
+        self.label = f"{export['standard']} {export['message_type']} {export['version']}"
+        self.table = export["segments"]
+        self.key_index = registry.build_key_index(self.table)
+        self.prefix_index = registry.build_prefix_index(self.table)
+        self.checked_at = time.monotonic()  # when the service last confirmed this copy
+
+    def lookup(self, segment_code):
+        """(found, explanation), like registry.lookup_segment."""
+        return self._registry.lookup_in_table(self.table, self.key_index, self.prefix_index, segment_code.upper(), self.label)
+
+
+class InProcessTransport:
+    """Calls the explainer registry in this process."""
+    name = "inprocess"
+
+    def __init__(self):
+        from edi_explainers import registry
+        self._registry = registry
+
+    def preload_spec(self, standard, message_type, version=""):
+        """Nothing to download: every spec is already in this process."""
+        return True
+
+    def explain_segment(self, payload):
+        standard, message_type, version = self._registry.spec_key(payload["standard"], payload["message_type"], payload.get("version", ""))
+        _, explanation = self._registry.lookup_segment(standard, message_type, version, payload["segment"].upper())
+        return {"segment": payload["segment"], "explanation": explanation}
+
+    def explain_segments(self, payload):
+        pairs = [(item["standard"], item["message_type"], item.get("version", ""), item["segment"]) for item in payload.get("items", [])]
+        pairs.extend((payload["standard"], payload["message_type"], payload.get("version", ""), segment) for segment in payload.get("segments", []))
+        results = self._registry.explain_batch(pairs)
+        found_count = sum(result["found"] for result in results)
+        return {"results": results, "found": found_count, "not_found": len(results) - found_count}
+
+    def stream_interchange(self, text, message_type=None, version=None, standard=None):
+        from edi_explainers.interchange import annotate_interchange
+        return annotate_interchange(text, message_type=message_type, version=version, standard=standard)
+
+
+class HttpTransport:
+    """
+    Calls the FastAPI service through one pooled session, so connections are
+    kept alive and reused instead of paying TCP setup on every question.
+    Connection errors and 502/503/504 responses are retried with backoff.
+    """
+    name = "http"
+
+    def __init__(self, base_url, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 backoff_seconds=DEFAULT_BACKOFF_SECONDS, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 preload_ttl=DEFAULT_PRELOAD_TTL_SECONDS):
+        # requests is only imported when the HTTP transport is actually used.
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.preload_ttl = preload_ttl
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_seconds,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),  # the explain endpoints are read-only
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._preloaded = {}  # (standard, message_type, version) -> PreloadedSpec, shared by all sessions of the process
+        self._preload_lock = threading.Lock()
+
+    def preload_spec(self, standard, message_type, version=""):
+        """
+        Downloads a spec's whole segment table (gzip, versioned by content hash) so
+        lookups for it are answered locally. If it is already preloaded, revalidates
+        it with If-None-Match and downloads it again only if the service's table
+        changed. Returns True once it is preloaded.
+        """
+        spec = (standard.upper(), message_type.upper(), (version or "").upper())
+        with self._preload_lock:
+            self._fetch_export(spec)
+        return True
+
+    def _fetch_export(self, spec):
+        current = self._preloaded.get(spec)
+        headers = {"If-None-Match": f'"{current.content_hash}"'} if current is not None else {}
+        response = self.session.get(f"{self.base_url}/specs/{spec[0]}/{spec[1]}/{spec[2]}/export", headers=headers, timeout=self.timeout)
+        if current is not None and response.status_code == 304:
+            current.checked_at = time.monotonic()
+            return
+        if response.status_code == 404:
+            self._preloaded.pop(spec, None)  # No longer served: ask the service per segment
+        response.raise_for_status()
+        self._preloaded[spec] = PreloadedSpec(response.json())
+
+    def _preloaded_spec(self, spec):
+        """The preloaded copy of `spec`, revalidated first if it was last checked preload_ttl ago; None if not preloaded."""
+        preloaded = self._preloaded.get(spec)
+        if preloaded is None or time.monotonic() - preloaded.checked_at < self.preload_ttl:
+            return preloaded
+        with self._preload_lock:
+            preloaded = self._preloaded.get(spec)
+            if preloaded is not None and time.monotonic() - preloaded.checked_at >= self.preload_ttl:
+                try:
+                    self._fetch_export(spec)
+                except Exception as e:
+                    if not is_transport_error(e): raise
+                    print(f"WARN: Could not revalidate preloaded {' '.join(spec).strip()} ({e}); keeping the current copy.")
+                    preloaded.checked_at = time.monotonic()
+        return self._preloaded.get(spec)
+
+    def _post(self, path, payload):
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def explain_segment(self, payload):
+        preloaded = self._preloaded_spec(_spec_tuple(payload))
+        if preloaded is not None:
+            return {"segment": payload["segment"], "explanation": preloaded.lookup(payload["segment"])[1]}
+        return self._post("/explain_segment/", payload)
+
+    def explain_segments(self, payload):
+        items = [dict(item) for item in payload.get("items", [])]
+        items.extend({"standard": payload["standard"], "message_type": payload["message_type"], "version": payload.get("version", ""), "segment": segment}
+                     for segment in payload.get("segments", []))
+        preloaded = {spec: self._preloaded_spec(spec) for spec in {_spec_tuple(item) for item in items}}
+        if not all(preloaded.values()):
+            return self._post("/explain_segments/", payload)
+        results = []
+        for item in items:
+            standard, message_type, version = _spec_tuple(item)
+            found, explanation = preloaded[(standard, message_type, version)].lookup(item["segment"])
+            results.append({"segment": item["segment"], "standard": standard, "message_type": message_type,
+                            "version": version, "found": found, "explanation": explanation})
+        found_count = sum(result["found"] for result in results)
+        return {"results": results, "found": found_count, "not_found": len(results) - found_count}
+
+    def stream_interchange(self, text, message_type=None, version=None, standard=None, chunk_size=64 * 1024):
+        """Yields annotation dicts from the NDJSON stream of /explain_interchange/stream."""
+        params = {"format": "ndjson"}
+        if standard:
+            params["standard"] = standard
+        if message_type:
+            params.update({"message_type": message_type, "version": version or ""})
+        body = (text[i:i + chunk_size].encode("utf-8") for i in range(0, len(text), chunk_size))
+        with self.session.post(f"{self.base_url}/explain_interchange/stream", params=params, data=body, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+
+def is_transport_error(exc):
+    """True for errors raised by HttpTransport: requests errors or an undecodable JSON body."""
+    if isinstance(exc, json.JSONDecodeError):
+        return True
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(exc, requests.exceptions.RequestException)
+
+
+def create_transport(mode, base_url, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+                     preload_ttl=DEFAULT_PRELOAD_TTL_SECONDS):
+    """
+    Builds the transport for `mode`: 'inprocess', 'http', or 'auto'
+    (in-process if the explainer package can be imported, HTTP otherwise).
+    """
+    mode = (mode or "auto").lower()
+    if mode in ("auto", "inprocess"):
+        try:
+            return InProcessTransport()
+        except ImportError as e:
+            if mode == "inprocess":
+                raise
+            print(f"WARN: Explainer package not importable ({e}); using HTTP transport.")
+    elif mode != "http":
+        raise ValueError(f"Unknown explainer transport mode: '{mode}'")
+    return HttpTransport(base_url, pool_size=pool_size, retries=retries, backoff_seconds=backoff_seconds, preload_ttl=preload_ttl)
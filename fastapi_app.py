@@ -1,8 +1,27 @@
 # fastapi_app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from starlette.requests import ClientDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import importlib # To dynamically import modules
-import traceback # For detailed error logging
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import threading
+from edi_explainers.interchange import TOKENIZERS, SegmentAnnotator, segment_reader
+from edi_explainers.registry import SPEC_REGISTRY, ambiguous_versions, explain_batch, find_segment_keys, format_explanation, list_specs, lookup_segment, spec_content_hash, spec_display_name, spec_key, table_items
+from edi_explainers.search import get_search_index
+from gemini_handler import get_gemini_response, stream_gemini_response
+from metrics import METRICS, count_event, timed
+import time
+
+# Built at startup so the first search request does not pay for it.
+get_search_index()
 
 app = FastAPI(
     title="EDI Segment Explanation API",
@@ -10,71 +29,110 @@ app = FastAPI(
     version="1.0.0"
 )
 
+REQUEST_SECONDS = METRICS.histogram("edi_http_request_duration_seconds", "Latency of API requests by route.", ("method", "route", "status"))
+
+
+class RequestLatencyMiddleware:
+    """Plain ASGI middleware (no per-request task or body buffering) timing every HTTP request."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route.path if route else "unmatched", status=status[0])
+
+
+app.add_middleware(RequestLatencyMiddleware)
+
+
 # --- Pydantic Model for Request Body ---
 class SegmentRequest(BaseModel):
     segment: str      # e.g., "BGM", "NAD+SE"
     standard: str     # e.g., "EDIFACT", "X12"
-    message_type: str # e.g., "DELFOR", "830"
-    version: str      # e.g., "D04A", "" (can be empty for X12)
+    message_type: str # e.g., "DELFOR", "830" (X12 transaction set)
+    version: str = "" # e.g., "D04A", "004010"; may be blank if only one version of message_type is registered
 
-# --- Helper function to get the correct module and call explain_segment ---
-def get_explanation_from_module(standard: str, message_type: str, version: str, segment_code: str) -> str:
+class BatchSegmentRequest(BaseModel):
+    # Either a list of segment codes for one spec ...
+    segments: List[str] = []
+    standard: Optional[str] = None
+    message_type: Optional[str] = None
+    version: Optional[str] = ""
+    # ... and/or explicit (spec, segment) pairs, possibly across several specs
+    items: List[SegmentRequest] = []
+
+class ChatRequest(BaseModel):
+    message: str
+    # Spec the question is asked in the context of (optional)
+    standard: Optional[str] = None
+    message_type: Optional[str] = None
+    version: Optional[str] = ""
+    display: Optional[str] = None
+    bypass_cache: bool = False
+    stream: bool = False # Plain-text chunks as the model produces them, instead of one JSON answer
+
+MAX_BATCH_SIZE = 500
+
+# Lifetime of cacheable GET responses. Explainer content only changes with a deployment, and
+# ETags let caches revalidate cheaply after that.
+SEGMENT_CACHE_CONTROL = f"public, max-age={int(os.getenv('SEGMENT_CACHE_MAX_AGE', 86400))}, stale-while-revalidate=604800"
+
+# spec -> (etag, JSON body, gzip-compressed body) of /specs/.../export, built on first request
+_SPEC_EXPORTS = {}
+
+# --- Streaming response that is produced while the request body is still being read ---
+class RequestBodyStreamingResponse(Response):
     """
-    Dynamically loads the appropriate EDI explainer module and calls its
-    explain_segment function.
+    Plain ASGI response that sends the chunks of `content`, an async iterator that
+    reads the request body itself while the response is being sent. Starlette's
+    StreamingResponse may listen for client disconnects by reading from `receive`,
+    which would swallow the request body chunks the iterator still needs; this
+    response never reads `receive`. A client that goes away is noticed by the
+    iterator (request.stream() raises ClientDisconnect) or by a failing send.
     """
-    module_name_base = ""
-    explanation_not_found_message = f"No explanation found for segment '{segment_code}' in {standard} {message_type} {version}."
+    def __init__(self, content, status_code=200, headers=None, media_type=None):
+        self.body_iterator = content
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
 
-    # Construct module name based on standard, message_type, and version
-    if standard == "EDIFACT":
-        # Assuming filenames like: delfor_d04a.py, desadv_d96a.py
-        module_name_base = f"{message_type.lower()}_{version.lower()}" if version else message_type.lower()
-    elif standard == "X12":
-        # Assuming filenames like: 830.py (or _830.py if that's your convention)
-        module_name_base = f"{message_type.lower()}" 
-        # If your X12 files are named like _830.py, adjust here:
-        # module_name_base = f"_{message_type.lower()}" 
-    else:
-        return "Unsupported EDI standard."
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for chunk in self.body_iterator:
+                if not isinstance(chunk, (bytes, memoryview)):
+                    chunk = chunk.encode(self.charset)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            raise ClientDisconnect()
 
-    if not module_name_base:
-        return "Could not determine module name base from input."
+# --- Helper function to look up a segment in the startup-built registry ---
+def _require_version(standard, message_type, version):
+    """422 if `version` is blank and several versions of the message type are registered."""
+    versions = ambiguous_versions(standard, message_type, version)
+    if versions:
+        raise HTTPException(status_code=422, detail=f"'version' is required for {standard.upper()} {message_type.upper()}: one of {', '.join(versions)}.")
 
-    try:
-        # Ensure this path matches your directory structure: edi_explainers/edifacts/your_module.py
-        module_path = f"edi_explainers.edifact.{module_name_base}"
-        
-        # --- DEBUGGING PRINTS ---
-        print(f"DEBUG: Standard='{standard}', MessageType='{message_type}', Version='{version}'")
-        print(f"DEBUG: Constructed module_name_base: '{module_name_base}'")
-        print(f"DEBUG: Attempting to import module_path: '{module_path}'")
-        # --- END DEBUGGING PRINTS ---
-
-        edi_module = importlib.import_module(module_path)
-
-        if hasattr(edi_module, 'explain_segment') and callable(getattr(edi_module, 'explain_segment')):
-            print(f"Calling explain_segment in {module_path} for segment '{segment_code}'")
-            explanation = edi_module.explain_segment(segment_code)
-            return explanation if explanation else explanation_not_found_message
-        else:
-            error_msg = f"Module '{module_path}' does not have a callable 'explain_segment' function."
-            print(error_msg)
-            return error_msg
-
-    except ImportError as e:
-        error_msg = (f"Could not import EDI explainer module: '{module_path}'. "
-                     f"Ensure the file exists and is correctly named (e.g., '{module_name_base}.py'). "
-                     f"Also check that 'edi_explainers' and 'edifacts' are valid packages "
-                     f"(i.e., they contain an __init__.py file). Import error: {e}")
-        print(error_msg)
-        traceback.print_exc() # Print full traceback for ImportError
-        return error_msg
-    except Exception as e:
-        error_msg = f"An error occurred while processing segment '{segment_code}' with module '{module_path}': {e}"
-        print(error_msg)
-        traceback.print_exc()
-        return "An internal error occurred while fetching the explanation."
+
+def get_explanation_from_module(standard: str, message_type: str, version: str, segment_code: str) -> str:
+    """Returns the explanation for a segment, or a not-found message."""
+    with timed("api", "segment_lookup"):
+        return lookup_segment(standard, message_type, version, segment_code)[1]
 
 
 # --- API Endpoint ---
@@ -86,15 +144,322 @@ async def explain_edi_segment(request: SegmentRequest):
     """
     print(f"Received request: {request.dict()}")
     segment_code = request.segment.upper() 
-    standard = request.standard.upper()
-    message_type = request.message_type.upper()
-    version = request.version.upper() if request.version else ""
+    _require_version(request.standard, request.message_type, request.version)
+    standard, message_type, version = spec_key(request.standard, request.message_type, request.version)
 
     explanation = get_explanation_from_module(standard, message_type, version, segment_code)
 
     return {"segment": request.segment, "explanation": explanation}
 
 
+@app.post("/explain_segments/", summary="Explain many EDI Segments in one request")
+async def explain_edi_segments(request: BatchSegmentRequest):
+    """
+    Batch variant of /explain_segment/. Accepts a list of segment codes for a
+    single spec (standard/message_type/version), a list of explicit
+    (spec, segment) items, or both, and returns one result per requested
+    segment with a found/not-found flag.
+    """
+    pairs = [(item.standard, item.message_type, item.version, item.segment) for item in request.items]
+    if request.segments:
+        if not request.standard or not request.message_type:
+            raise HTTPException(status_code=422, detail="'standard' and 'message_type' are required when 'segments' is given.")
+        pairs.extend((request.standard, request.message_type, request.version, segment) for segment in request.segments)
+
+    if len(pairs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(pairs)} segments (max {MAX_BATCH_SIZE}).")
+    for spec in {(standard, message_type, version) for standard, message_type, version, _ in pairs}:
+        _require_version(*spec)
+    print(f"Received batch request: {len(pairs)} segments")
+
+    with timed("api", "batch_lookup"):
+        results = explain_batch(pairs)
+    found_count = sum(result["found"] for result in results)
+    return {"results": results, "found": found_count, "not_found": len(results) - found_count}
+
+
+@app.post("/explain_interchange/stream", summary="Stream explanations for every segment of an interchange")
+async def stream_interchange_explanations(request: Request, message_type: Optional[str] = None, version: Optional[str] = None, format: str = "ndjson", standard: str = "EDIFACT"):
+    """
+    Receives a whole EDIFACT or X12 interchange (`standard`) as the raw request
+    body and streams back one explanation per segment while the body is still
+    being read. The spec is taken from the UNH segments (EDIFACT) or the ST and
+    GS segments (X12); `message_type`/`version` are the fallback. `format` is
+    either 'ndjson' (one JSON object per line) or 'sse' (server-sent events,
+    terminated by a 'done' event).
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=422, detail="'format' must be 'ndjson' or 'sse'.")
+    standard = standard.upper()
+    if standard not in TOKENIZERS:
+        raise HTTPException(status_code=422, detail=f"'standard' must be one of {', '.join(TOKENIZERS)}.")
+
+    def encode(annotations):
+        if format == "sse":
+            return "".join(f"data: {json.dumps(annotation)}\n\n" for annotation in annotations)
+        return "".join(json.dumps(annotation) + "\n" for annotation in annotations)
+
+    async def generate():
+        reader = segment_reader(standard)
+        annotator = SegmentAnnotator(message_type, version, standard)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for chunk in request.stream():
+            segments = reader.feed(decoder.decode(chunk))
+            if segments:
+                yield encode(annotator.annotate(segment) for segment in segments)
+        segments = reader.feed(decoder.decode(b"", final=True)) + reader.close()
+        if segments:
+            yield encode(annotator.annotate(segment) for segment in segments)
+        print(f"Streamed interchange explanations: {annotator.count} segments, {annotator.found} explained")
+        if format == "sse":
+            yield f"event: done\ndata: {json.dumps({'segments': annotator.count, 'found': annotator.found})}\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return RequestBodyStreamingResponse(generate(), media_type=media_type)
+
+
+# --- Chat (Gemini) ---
+# Model calls are blocking SDK calls; they run on a bounded thread pool (CHAT_MAX_WORKERS) so the
+# event loop keeps serving every other request while they wait on Gemini. Each /chat request has a
+# deadline of CHAT_TIMEOUT_SECONDS: work still queued for a worker when it passes is skipped, and
+# the client gets CHAT_TIMEOUT_MESSAGE (a 504, or the last chunk of a stream). Calls already running
+# cannot be interrupted; an abandoned stream stops at its next chunk. Upstream concurrency, the answer cache, coalescing of
+# identical questions and the circuit breaker are those of gemini_handler, shared by all chats.
+CHAT_MAX_WORKERS = int(os.getenv("CHAT_MAX_WORKERS", 32))
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", 60))
+CHAT_TIMEOUT_MESSAGE = "The AI service did not answer in time. Please try again in a moment."
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_MAX_WORKERS, thread_name_prefix="chat")
+_END_OF_STREAM = object()
+
+
+def _before_deadline(deadline, fn):
+    """Runs fn() on a chat worker unless the request's deadline passed while it was queued."""
+    if time.monotonic() >= deadline:
+        count_event("api", "chat_expired_in_queue")
+        raise TimeoutError("chat request expired before a worker was free")
+    return fn()
+
+
+async def _run_chat_call(deadline, fn):
+    """Awaits fn() on the chat executor until `deadline`; raises asyncio.TimeoutError after it."""
+    result = asyncio.wrap_future(chat_executor.submit(_before_deadline, deadline, fn))
+    try:
+        # shield: on timeout only the wait is cancelled; the worker finishes (or skips) the call on its own.
+        return await asyncio.wait_for(asyncio.shield(result), max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        result.add_done_callback(lambda late: late.exception()) # Nobody waits for it any more
+        raise
+
+
+async def _stream_chat(make_chunks, deadline):
+    """
+    Relays the chunks of make_chunks() (a blocking generator) while one chat worker
+    produces them. The worker keeps the generator for its whole run, so a stream that
+    holds a Gemini call slot never waits for a free worker to continue.
+    """
+    loop = asyncio.get_running_loop()
+    received = asyncio.Queue()
+    abandoned = threading.Event()
+
+    def publish(item):
+        try:
+            loop.call_soon_threadsafe(received.put_nowait, item)
+        except RuntimeError: # Event loop already closed (shutdown)
+            pass
+
+    def produce():
+        chunks = make_chunks()
+        try:
+            for chunk in chunks:
+                if abandoned.is_set(): # Client gone or deadline passed: stop (and release the call slot) early
+                    break
+                publish(chunk)
+        except Exception as e:
+            publish(e) # Instead of the end marker, so a failed answer is not sent as a complete one
+        else:
+            publish(_END_OF_STREAM)
+        finally:
+            chunks.close()
+
+    def on_done(future):
+        if future.exception() is not None: # Expired in the queue, or failed before producing
+            publish(future.exception())
+
+    chat_executor.submit(_before_deadline, deadline, produce).add_done_callback(on_done)
+    try:
+        while True:
+            chunk = await asyncio.wait_for(received.get(), max(deadline - time.monotonic(), 0))
+            if chunk is _END_OF_STREAM:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    except (asyncio.TimeoutError, TimeoutError):
+        count_event("api", "chat_timeout")
+        yield "\n\n" + CHAT_TIMEOUT_MESSAGE
+    finally:
+        abandoned.set()
+
+
+@app.post("/chat", summary="Answer a chat question with the AI model")
+async def chat(request: ChatRequest):
+    """
+    Answers a free-text question with Gemini (prompt assembly, answer cache,
+    call limits and local fallback of gemini_handler). Returns {"answer": ...},
+    or with `stream` the answer as plain-text chunks while it is generated.
+    """
+    spec_details = None
+    if request.standard and request.message_type:
+        standard, message_type, version = spec_key(request.standard, request.message_type, request.version or "")
+        spec_details = {"display": request.display or spec_display_name(standard, message_type, version),
+                        "standard": standard, "message_type": message_type, "version": version}
+    deadline = time.monotonic() + CHAT_TIMEOUT_SECONDS
+    if request.stream:
+        chunks = partial(stream_gemini_response, request.message, spec_details=spec_details, bypass_cache=request.bypass_cache)
+        return StreamingResponse(_stream_chat(chunks, deadline), media_type="text/plain; charset=utf-8")
+    try:
+        answer = await _run_chat_call(deadline, partial(get_gemini_response, request.message, use_gemini_model=True, spec_details=spec_details, bypass_cache=request.bypass_cache))
+    except (asyncio.TimeoutError, TimeoutError):
+        count_event("api", "chat_timeout")
+        raise HTTPException(status_code=504, detail=CHAT_TIMEOUT_MESSAGE)
+    return {"answer": answer}
+
+
+@app.get("/search", summary="Free-text search over segment explanations")
+async def search_segments(q: str, standard: Optional[str] = None, message_type: Optional[str] = None, version: Optional[str] = None, top_k: int = 5):
+    """
+    Ranks segments by BM25 relevance of their explanation and usage texts to
+    the query `q`. Restricted to one spec if standard and message_type are given.
+    """
+    with timed("api", "search"):
+        hits = get_search_index().search(q, standard, message_type, version, top_k=min(max(top_k, 1), 50))
+    results = []
+    for score, hit_standard, hit_message_type, hit_version, segment in hits:
+        segment_info = SPEC_REGISTRY[(hit_standard, hit_message_type, hit_version)][segment]
+        results.append({
+            "segment": segment,
+            "standard": hit_standard,
+            "message_type": hit_message_type,
+            "version": hit_version,
+            "score": round(score, 4),
+            "explanation": segment_info["explanation"],
+        })
+    return {"query": q, "results": results}
+
+
+@app.get("/resolve_segment", summary="Resolve a segment code or full segment to its table keys")
+async def resolve_segment(segment: str, standard: str, message_type: str, version: str = ""):
+    """
+    Normalizes `segment` (a code such as 'DTM' or 'NAD+ST', or a whole segment
+    such as 'DTM+137:202308030501:203') to its key in the spec's segment table.
+    For a bare tag, or a qualifier the spec does not define, `variants` lists
+    the qualified keys of that tag instead.
+    """
+    spec = spec_key(standard, message_type, version)
+    if spec not in SPEC_REGISTRY:
+        raise HTTPException(status_code=404, detail=f"No EDI explainer available for {' '.join(spec).strip()}.")
+    with timed("api", "resolve_segment"):
+        key, variants = find_segment_keys(*spec, segment)
+    table = SPEC_REGISTRY[spec]
+    return {
+        "segment": segment,
+        "standard": spec[0],
+        "message_type": spec[1],
+        "version": spec[2],
+        "key": key,
+        "variants": [{"segment": variant, "explanation": table[variant]["explanation"]} for variant in variants],
+    }
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request and stage latency histograms and event counters in Prometheus text format."""
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/specs", summary="List available EDI specifications")
+async def list_edi_specs():
+    """
+    Lists every specification in the segment registry together with the
+    segment codes it can explain.
+    """
+    return {"specs": list_specs()}
+
+
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison: W/ prefixes are ignored, '*' matches anything."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+@app.get("/specs/{standard}/{message_type}/{version}/segments/{segment:path}", summary="Cacheable explanation of one segment")
+async def get_segment_resource(standard: str, message_type: str, version: str, segment: str, request: Request):
+    """
+    GET variant of /explain_segment/ that HTTP caches, proxies and browsers can
+    store. `segment` is resolved like /resolve_segment (a bare tag returns all
+    its variants). The strong ETag is derived from the content hash of the
+    spec's segment table, so it only changes when the table does; a matching
+    If-None-Match is answered with 304 Not Modified.
+    """
+    spec = spec_key(standard, message_type, version)
+    if spec not in SPEC_REGISTRY:
+        raise HTTPException(status_code=404, detail=f"No EDI explainer available for {' '.join(spec).strip()}.")
+    with timed("api", "segment_resource"):
+        key, variants = find_segment_keys(*spec, segment)
+        if key is None and not variants:
+            raise HTTPException(status_code=404, detail=f"No explanation found for segment '{segment}' in {' '.join(spec).strip()}.")
+        # Over the segment exactly as requested: the body echoes it, so 'dtm' and 'DTM' differ in bytes.
+        etag = '"' + hashlib.sha256(f"{spec_content_hash(*spec)}:{segment}".encode("utf-8")).hexdigest()[:32] + '"'
+        headers = {"ETag": etag, "Cache-Control": SEGMENT_CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        table = SPEC_REGISTRY[spec]
+        body = {"segment": segment, "standard": spec[0], "message_type": spec[1], "version": spec[2], "key": key}
+        if key is not None:
+            body.update({"explanation": format_explanation(table[key]), "usage": table[key]["usage"]})
+        else:
+            body["variants"] = [{"segment": variant, "explanation": format_explanation(table[variant]), "usage": table[variant]["usage"]} for variant in variants]
+        return JSONResponse(body, headers=headers)
+
+
+def _spec_export(spec):
+    export = _SPEC_EXPORTS.get(spec)
+    if export is None:
+        content_hash = spec_content_hash(*spec)
+        body = json.dumps({
+            "standard": spec[0],
+            "message_type": spec[1],
+            "version": spec[2],
+            "content_hash": content_hash,
+            "segments": {key: dict(info) for key, info in table_items(SPEC_REGISTRY[spec])},
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        export = _SPEC_EXPORTS[spec] = (f'"{content_hash}"', body, gzip.compress(body, compresslevel=9))
+    return export
+
+
+@app.get("/specs/{standard}/{message_type}/{version}/export", summary="Whole segment table of a spec, for preloading")
+async def export_spec(standard: str, message_type: str, version: str, request: Request):
+    """
+    Returns every segment of a spec in one response, versioned by the content hash
+    of its table (in the body and as ETag), gzip-compressed when the client
+    accepts it. Clients preload it once and answer lookups for that spec locally.
+    """
+    spec = spec_key(standard, message_type, version)
+    if spec not in SPEC_REGISTRY:
+        raise HTTPException(status_code=404, detail=f"No EDI explainer available for {' '.join(spec).strip()}.")
+    with timed("api", "spec_export"):
+        etag, body, compressed = _spec_export(spec)
+    headers = {"ETag": etag, "Cache-Control": SEGMENT_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(compressed, media_type="application/json", headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     # This allows running the FastAPI app directly for testing:
@@ -1,139 +1,333 @@
 # gemini_handler.py
-import google.generativeai as genai
+# Heavy dependencies (google.generativeai, requests, streamlit) are not imported here:
+# the Gemini model and the explainer transport are created lazily on first use,
+# once per process, so Local Data paths never load the Gemini SDK.
 import os
 # from dotenv import load_dotenv # Not needed for Streamlit Cloud deployment if secrets are used
+import sys
+import threading
 import traceback
-import requests 
-import re 
 import html
-import streamlit as st # Import Streamlit to access st.secrets
+import re
 import json # MODIFICATION: Added import for json module
+import time
+import atexit
+from itertools import islice
+from answer_cache import answer_cache_from_env, make_cache_key
+from call_limits import CallQueueTimeout, CircuitBreaker, ConcurrencyLimiter, SharedCallAbandoned, SingleFlight
+from explainer_transport import DEFAULT_POOL_SIZE, DEFAULT_PRELOAD_TTL_SECONDS, DEFAULT_RETRIES, create_transport, is_transport_error
+from metrics import METRICS, STAGE_SECONDS, count_event, timed, timed_function
+from edi_explainers.interchange import annotate_interchange, detect_standard, format_annotation, looks_like_interchange
+from edi_explainers.registry import SPEC_REGISTRY, find_segment_keys, get_segment_table, spec_display_name
+from edi_explainers.segment_matcher import get_segment_matcher, rank_mentions
 
-# --- Load Environment Variables & Configure Gemini ---
+# --- Settings ---
 # For Streamlit Cloud deployment, secrets are set via st.secrets or as environment variables
 # load_dotenv() # Keep for local testing if you use a .env file
+def _setting(name, default=None):
+    # st.secrets is only consulted when running inside Streamlit; other callers (FastAPI,
+    # tooling, benchmarks) use environment variables and do not pay for importing Streamlit.
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        try:
+            if name in st.secrets: return st.secrets[name]
+        except Exception: # No secrets.toml
+            pass
+    return os.getenv(name, default)
 
-GOOGLE_API_KEY = None
-# 1. Try to get from Streamlit secrets (preferred for Streamlit Cloud)
-if "GOOGLE_API_KEY" in st.secrets:
-    GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
-    print("INFO: Loaded GOOGLE_API_KEY from Streamlit secrets.")
-# 2. Fallback to environment variable (useful for other deployment platforms or local if .env is not used)
-elif os.getenv("GOOGLE_API_KEY"):
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    print("INFO: Loaded GOOGLE_API_KEY from environment variable.")
-
-if not GOOGLE_API_KEY:
-    print("WARN: GOOGLE_API_KEY not found in Streamlit secrets or environment variables. AI features may fail.")
-    model = None
-else:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        print("SUCCESS: Gemini API configured.")
-    except Exception as e:
-        print(f"ERROR: Failed to configure Gemini API with key: {e}")
-        model = None
+GEMINI_MODEL_NAME = 'stub' if os.getenv("GEMINI_STUB_MODEL") else 'gemini-1.5-flash-latest'
+
+_init_lock = threading.Lock()
+_model = None
+_model_initialized = False
+
+def get_model():
+    """Configures the Gemini model on first use (once per process). Returns None if unavailable."""
+    global _model, _model_initialized
+    if _model_initialized:
+        return _model
+    with _init_lock:
+        if _model_initialized:
+            return _model
+        if os.getenv("GEMINI_STUB_MODEL"):
+            # Offline stub for tests and benchmarks; never set in a deployment.
+            # GEMINI_STUB_LATENCY_SECONDS / GEMINI_STUB_CHUNK_DELAY_SECONDS simulate Gemini's response time (load tests).
+            from gemini_stub import StubGenerativeModel
+            _model = StubGenerativeModel(latency=float(os.getenv("GEMINI_STUB_LATENCY_SECONDS", 0)),
+                                         chunk_delay=float(os.getenv("GEMINI_STUB_CHUNK_DELAY_SECONDS", 0)))
+            print("INFO: Using offline stub Gemini model (GEMINI_STUB_MODEL is set).")
+        else:
+            # 1. Streamlit secrets (preferred for Streamlit Cloud), 2. environment variable
+            google_api_key = _setting("GOOGLE_API_KEY")
+            if not google_api_key:
+                print("WARN: GOOGLE_API_KEY not found in Streamlit secrets or environment variables. AI features may fail.")
+            else:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=google_api_key)
+                    _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                    print("SUCCESS: Gemini API configured.")
+                except Exception as e:
+                    print(f"ERROR: Failed to configure Gemini API with key: {e}")
+                    _model = None
+        _model_initialized = True
+        return _model
+
+def reset_model():
+    """Drops the configured model; the next get_model() configures it again (e.g. after changing GOOGLE_API_KEY)."""
+    global _model, _model_initialized
+    with _init_lock:
+        _model = None
+        _model_initialized = False
 
 
 # --- FastAPI Endpoint ---
 # This should be your live Render URL (or other deployed FastAPI backend URL)
 # For Streamlit Cloud, set this as a secret: FASTAPI_BASE_URL
-fastapi_url_from_secrets = st.secrets.get("FASTAPI_BASE_URL") if "FASTAPI_BASE_URL" in st.secrets else None
-FASTAPI_BASE_URL = fastapi_url_from_secrets or os.getenv("FASTAPI_BASE_URL", "http://127.0.0.1:8000") # Default for local
+FASTAPI_BASE_URL = _setting("FASTAPI_BASE_URL", "http://127.0.0.1:8000") # Default for local
 
-if FASTAPI_BASE_URL == "http://127.0.0.1:8000" and not fastapi_url_from_secrets and not os.getenv("FASTAPI_BASE_URL"):
+if FASTAPI_BASE_URL == "http://127.0.0.1:8000":
     print("WARN: FASTAPI_BASE_URL is using default localhost. For deployed version, set this secret in Streamlit Cloud or as an env var.")
-elif fastapi_url_from_secrets:
-    print(f"INFO: Loaded FASTAPI_BASE_URL from Streamlit secrets: {FASTAPI_BASE_URL}")
-elif os.getenv("FASTAPI_BASE_URL"):
-     print(f"INFO: Loaded FASTAPI_BASE_URL from environment variable: {FASTAPI_BASE_URL}")
-
-
-def extract_segment_from_query(user_input):
-    cleaned_input = user_input.upper()
-    phrases_to_remove = ["EXPLAIN ME ABOUT", "WHAT IS", "TELL ME ABOUT", "EXPLAIN"]
-    for phrase in phrases_to_remove:
-        if cleaned_input.startswith(phrase):
-            cleaned_input = cleaned_input[len(phrase):].strip()
-    if cleaned_input.endswith(" SEGMENT"):
-        cleaned_input = cleaned_input[:-len(" SEGMENT")].strip()
-    
-    match_plus = re.search(r"([A-Z0-9]{2,6}\+[A-Z0-9]{1,3})", cleaned_input)
-    if match_plus: return match_plus.group(1)
-    words = cleaned_input.split()
-    for word in words:
-        if word.isupper() and 2 <= len(word) <= 6 and word not in ["IS", "A", "THE", "AN", "FOR", "EDI", "ME", "ABOUT"]:
-            return word
-    return None
 
-def get_gemini_response(user_input, spec_option=None, use_gemini_model=True, spec_details=None):
-    print(f"\nGEMINI_HANDLER: Input='{user_input}', SpecOpt='{spec_option}', UseAI={use_gemini_model}, SpecDetails={spec_details}")
 
-    normalized_input = user_input.lower()
-    url_keywords = ["specification url", "specs url", "guidelines url", "documentation url", "link for edi specs"]
-    for keyword in url_keywords:
-        if keyword in normalized_input:
-            return "You can find the Volvo Cars EDI specifications at: https://explore.hcltech.com/EDI/cars/specifications.html"
+# --- Explainer Transport ---
+# EXPLAINER_TRANSPORT: 'auto' (default; in-process if edi_explainers is importable), 'inprocess' or 'http'.
+# EXPLAINER_HTTP_POOL_SIZE / EXPLAINER_HTTP_RETRIES tune the pooled HTTP session. Specs are only
+# preloaded (and revalidated every EXPLAINER_PRELOAD_TTL_SECONDS) with 'http': this module imports
+# edi_explainers itself, so 'auto' always resolves to the in-process transport here.
+_explainer_transport = None
+
+def get_explainer_transport():
+    """Creates the explainer transport on first use (once per process)."""
+    global _explainer_transport
+    if _explainer_transport is None:
+        with _init_lock:
+            if _explainer_transport is None:
+                _explainer_transport = create_transport(
+                    _setting("EXPLAINER_TRANSPORT", "auto"),
+                    FASTAPI_BASE_URL,
+                    pool_size=int(_setting("EXPLAINER_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                    retries=int(_setting("EXPLAINER_HTTP_RETRIES", DEFAULT_RETRIES)),
+                    preload_ttl=float(_setting("EXPLAINER_PRELOAD_TTL_SECONDS", DEFAULT_PRELOAD_TTL_SECONDS)),
+                )
+                print(f"INFO: Explainer transport: {_explainer_transport.name}")
+    return _explainer_transport
+
+
+# --- Chat Backend ---
+# CHAT_TRANSPORT: 'inprocess' (default; the app calls Gemini through this module) or 'http'
+# (AI questions are posted to the FastAPI /chat endpoint at FASTAPI_BASE_URL, see chat_client.py).
+# 'http' is opt-in: it makes the Streamlit app a thin client, but needs the FastAPI service running.
+_chat_client = None
+
+def get_chat_client():
+    """The /chat client if CHAT_TRANSPORT is 'http', created on first use (once per process); else None."""
+    global _chat_client
+    mode = (_setting("CHAT_TRANSPORT", "inprocess") or "inprocess").lower()
+    if mode == "inprocess":
+        return None
+    if mode != "http":
+        raise ValueError(f"Unknown chat transport mode: '{mode}'")
+    if _chat_client is None:
+        with _init_lock:
+            if _chat_client is None:
+                from chat_client import DEFAULT_POOL_SIZE as CHAT_POOL_SIZE, ChatClient
+                _chat_client = ChatClient(FASTAPI_BASE_URL, pool_size=int(_setting("CHAT_HTTP_POOL_SIZE", CHAT_POOL_SIZE)))
+                print(f"INFO: Chat backend: {_chat_client.url}")
+    return _chat_client
+
+
+# --- Metrics ---
+# Stage latencies and events of this process are kept in metrics.METRICS. Set
+# EDI_METRICS_DUMP_PATH to have them written there (Prometheus text format) on exit.
+def dump_metrics(path=None):
+    """Writes this process's metrics to `path` (or EDI_METRICS_DUMP_PATH) and returns the Prometheus text."""
+    path = path or os.getenv("EDI_METRICS_DUMP_PATH")
+    if path: METRICS.dump(path)
+    return METRICS.render_prometheus()
+
+if os.getenv("EDI_METRICS_DUMP_PATH"):
+    atexit.register(dump_metrics)
+
+
+# --- AI Answer Cache ---
+# Configured via GEMINI_CACHE_MAX_ENTRIES, GEMINI_CACHE_TTL_SECONDS and GEMINI_CACHE_DB_PATH (SQLite file, optional).
+answer_cache = answer_cache_from_env()
+print(f"INFO: AI answer cache backend: {answer_cache.stats()['backend']}")
+
+
+# --- Gemini Call Limits ---
+# Identical questions asked at the same time share one Gemini call (keyed like the answer cache).
+# At most GEMINI_MAX_CONCURRENT_CALLS calls run at once per process; the rest queue for up to
+# GEMINI_QUEUE_TIMEOUT_SECONDS. Queue depth and wait time are in the edi_call_* metrics.
+gemini_limiter = ConcurrencyLimiter(
+    "gemini",
+    max_concurrent=int(_setting("GEMINI_MAX_CONCURRENT_CALLS", 4)),
+    queue_timeout=float(_setting("GEMINI_QUEUE_TIMEOUT_SECONDS", 30)),
+)
+gemini_calls = SingleFlight("gemini")
+# Followers of a shared call wait at most this long for its answer.
+SHARED_CALL_TIMEOUT_SECONDS = 120
+GEMINI_BUSY_MESSAGE = "The AI service is busy right now. Please try again in a moment."
+
+
+# --- Gemini Circuit Breaker ---
+# Opens when GEMINI_BREAKER_FAILURE_RATE of the last GEMINI_BREAKER_WINDOW calls (at least
+# GEMINI_BREAKER_MIN_CALLS) failed or were slower than GEMINI_BREAKER_SLOW_CALL_SECONDS. While it is
+# open, AI questions are answered from the local explainer tables where a segment or spec can be
+# identified; after GEMINI_BREAKER_OPEN_SECONDS a single probe call tests whether Gemini recovered.
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_rate=float(_setting("GEMINI_BREAKER_FAILURE_RATE", 0.5)),
+    min_calls=int(_setting("GEMINI_BREAKER_MIN_CALLS", 5)),
+    window=int(_setting("GEMINI_BREAKER_WINDOW", 20)),
+    slow_call_seconds=float(_setting("GEMINI_BREAKER_SLOW_CALL_SECONDS", 15)),
+    open_seconds=float(_setting("GEMINI_BREAKER_OPEN_SECONDS", 30)),
+)
+AI_UNAVAILABLE_MESSAGE = "The AI service is temporarily unavailable. Please try again shortly, or switch off 'Use AI Model' and select a specification to look it up in the local data."
+AI_FALLBACK_PREFIX = "The AI service is temporarily unavailable, so this answer comes from the local {spec} specification data:\n\n"
+
+
+@timed_function("handler", "extract_segment")
+def extract_segments_from_query(user_input):
+    """
+    Returns every segment code mentioned in the question (e.g. 'BGM', 'NAD+ST',
+    'QTY+52'), most specific first, found in one pass by the segment matcher.
+    """
+    mentions = get_segment_matcher().find(user_input)
+    return [mention.text for mention in rank_mentions(mentions, user_input)]
 
+def resolve_query_segments(segments, spec_details):
+    """
+    Maps mentioned segment codes to keys of the selected spec's table. A bare tag
+    such as 'DTM', or a qualifier the spec does not define, expands to the
+    qualified keys of that tag; unknown tags are dropped.
+    """
+    resolved = []
+    for segment in segments:
+        key, variants = find_segment_keys(spec_details["standard"], spec_details["message_type"], spec_details.get("version", ""), segment)
+        for candidate in ([key] if key else variants):
+            if candidate not in resolved:
+                resolved.append(candidate)
+    return resolved
+
+# A question naming more segments than this is answered for the most specific ones only.
+MAX_SEGMENTS_PER_QUESTION = 10
+
+# Search hits scoring below this are too weak to be offered as an answer.
+MIN_SEARCH_SCORE = 1.0
+
+def answer_from_search(user_input, spec_details):
+    """
+    Answers a free-text question from the local BM25 index over the explainer
+    texts of the selected spec. Returns None if nothing matches well enough.
+    """
+    from edi_explainers.search import get_search_index # NumPy is only loaded once a question needs the search index
+    hits = get_search_index().search(user_input, spec_details["standard"], spec_details["message_type"], spec_details.get("version", ""), top_k=3, min_score=MIN_SEARCH_SCORE)
+    if not hits:
+        return None
+    print(f"    Local Mode: Search hits {[(hit[4], round(hit[0], 2)) for hit in hits]}")
+    table = get_segment_table(spec_details["standard"], spec_details["message_type"], spec_details.get("version", ""))
+    lines = [f"Closest matching segments in {spec_details.get('display', 'the selected specification')}:"]
+    lines.extend(f"**{hit[4]}**: {table[hit[4]]['explanation']}" for hit in hits)
+    return "\n\n".join(lines)
+
+# Pasted interchanges can hold thousands of segments; only this many are written into a chat answer.
+MAX_CHAT_ANNOTATED_SEGMENTS = 200
+
+def _interchange_spec(user_input, spec_details):
+    """
+    (standard, fallback message type, fallback version) of a pasted interchange. The
+    selected spec is only a fallback for interchanges of its own standard.
+    """
+    standard = detect_standard(user_input) or "EDIFACT"
+    if not spec_details or spec_details.get("standard", "EDIFACT") != standard:
+        return standard, None, None
+    return standard, spec_details.get("message_type"), spec_details.get("version", "")
+
+def explain_interchange(user_input, spec_details=None):
+    """
+    Explains every segment of a pasted EDIFACT or X12 interchange, one line per
+    segment. The spec is read from the UNH (EDIFACT) or ST/GS (X12) segments,
+    falling back to the selected spec.
+    """
+    standard, message_type, version = _interchange_spec(user_input, spec_details)
+    annotations = annotate_interchange(user_input, message_type=message_type, version=version, standard=standard)
+
+    lines = [format_annotation(annotation) for annotation in islice(annotations, MAX_CHAT_ANNOTATED_SEGMENTS)]
+    if not lines:
+        return f"Could not find any {standard} segments in the pasted message."
+    remaining = sum(1 for _ in annotations)
+    if remaining:
+        lines.append(f"... {remaining} more segments not shown.")
+    return "\n\n".join(lines)
+
+def stream_interchange_explanations(user_input, spec_details=None):
+    """
+    Yields one annotation dict per segment of a pasted interchange as soon as
+    it is available, via the explainer transport (in-process, or the FastAPI
+    /explain_interchange/stream NDJSON endpoint). Yields nothing on errors.
+    """
+    standard, message_type, version = _interchange_spec(user_input, spec_details)
+    explainer_transport = get_explainer_transport()
+    print(f"    Explainer Request ({explainer_transport.name}): stream {standard} interchange ({len(user_input)} chars)")
     try:
-        if not use_gemini_model: # LOCAL DATA ONLY MODE (via FastAPI)
-            print("    MODE: Local Data via FastAPI")
-            
-            if not spec_details:
-                print("    Local Mode: No specific spec_details provided from UI. Asking user to select from dropdown.")
-                return "In Local Data mode, please select a specific EDI specification from the dropdown to query its details."
-
-            if user_input.startswith(f"Show information for {spec_details.get('display','the selected specification')}"):
-                return f"You've selected {spec_details.get('display','the specification')}. Please ask about a specific segment (e.g., 'What is UNH?')."
-
-            segment_to_explain = extract_segment_from_query(user_input)
-            if not segment_to_explain:
-                return f"Could not identify a specific segment in your query '{user_input}' for {spec_details.get('display','the selected specification')}. Please ask about a specific segment (e.g., 'BGM', 'NAD+SE')."
-
-            print(f"    Local Mode: Extracted segment '{segment_to_explain}' for spec '{spec_details.get('display', 'Unknown Spec')}'")
-            
-            payload = {
-                "segment": segment_to_explain, 
+        yield from explainer_transport.stream_interchange(user_input, message_type=message_type, version=version, standard=standard)
+    except Exception as e:
+        if not is_transport_error(e): raise
+        print(f"    ERROR: FastAPI interchange stream failed: {e}")
+
+def get_batch_explanations(segments=None, spec_details=None, items=None):
+    """
+    Fetches explanations for many segments in a single round trip to the
+    FastAPI /explain_segments/ endpoint.
+
+    Args:
+        segments (list[str]): Segment codes to explain within `spec_details`.
+        spec_details (dict): Spec the `segments` belong to (standard, message_type, version).
+        items (list[dict]): Explicit (spec, segment) pairs, each a dict with
+            segment, standard, message_type and version keys.
+
+    Returns:
+        list[dict]: One result per requested segment with `found` and `explanation`
+        keys, or an empty list if the service could not be reached.
+    """
+    payload = {"items": list(items or [])}
+    if segments:
+        if not spec_details:
+            print("    Batch: segments given without spec_details; ignoring them.")
+        else:
+            payload.update({
+                "segments": list(segments),
                 "standard": spec_details["standard"],
-                "message_type": spec_details["message_type"], 
-                "version": spec_details.get("version", "")
-            }
-            print(f"    FastAPI Request: POST to {FASTAPI_BASE_URL}/explain_segment/ with payload: {payload}")
-            
-            api_response = None # Initialize api_response
-            try:
-                api_response = requests.post(f"{FASTAPI_BASE_URL}/explain_segment/", json=payload, timeout=15)
-                print(f"    FastAPI Status Code: {api_response.status_code}")
-                api_response.raise_for_status() 
-                data = api_response.json() # This line can raise json.JSONDecodeError
-                print(f"    FastAPI Response Data: {data}")
-                return data.get("explanation", f"No explanation found via API for segment '{segment_to_explain}' in {spec_details.get('display', 'the selected specification')}.")
-            except requests.exceptions.ConnectionError:
-                print(f"    ERROR: FastAPI Connection Error to {FASTAPI_BASE_URL}.")
-                return "Error: Could not connect to the local data service. Please ensure it's running and the URL is correct."
-            except requests.exceptions.HTTPError as http_err:
-                print(f"    ERROR: FastAPI HTTP Error: {http_err}. Response: {api_response.text if api_response else 'N/A'}")
-                return f"Error communicating with local data service (HTTP {api_response.status_code if api_response else 'N/A'}). Please check service logs."
-            except requests.exceptions.RequestException as e:
-                print(f"    ERROR: FastAPI Request Error: {e}")
-                return f"Error communicating with local data service: {e}"
-            except json.JSONDecodeError as e: # Catch error if response is not valid JSON
-                print(f"    ERROR: Could not decode JSON response from FastAPI: {e}. Response text: {api_response.text if api_response is not None else 'N/A'}")
-                return "Error: Received an invalid response from the local data service."
-
-
-        # --- AI Model Mode ---
-        # ... (rest of AI mode logic remains the same) ...
-        print("    MODE: AI Model (Gemini)")
-        if not model: 
-            return "AI model is currently unavailable. API key might be missing or invalid."
+                "message_type": spec_details["message_type"],
+                "version": spec_details.get("version", ""),
+            })
+    if not payload["items"] and not payload.get("segments"):
+        return []
+
+    explainer_transport = get_explainer_transport()
+    print(f"    Explainer Request ({explainer_transport.name}): explain {len(payload['items']) + len(payload.get('segments', []))} segments")
+    try:
+        return explainer_transport.explain_segments(payload).get("results", [])
+    except Exception as e:
+        if not is_transport_error(e): raise
+        print(f"    ERROR: FastAPI batch request failed: {e}")
+    return []
 
-        prompt_context = ""
-        if spec_details: 
-            prompt_context = f"The user might be asking in the context of {spec_details.get('display','')} ({spec_details.get('standard','')}-{spec_details.get('message_type','')} {spec_details.get('version','')})."
+SPECIFICATION_URL_ANSWER = "You can find the Volvo Cars EDI specifications at: https://explore.hcltech.com/EDI/cars/specifications.html"
 
-        prompt = f"""You are an expert AI assistant for Volvo Cars EDI (Electronic Data Interchange).
+def _asks_for_specification_url(user_input):
+    normalized_input = user_input.lower()
+    url_keywords = ["specification url", "specs url", "guidelines url", "documentation url", "link for edi specs"]
+    return any(keyword in normalized_input for keyword in url_keywords)
+
+def build_prompt(user_input, spec_details=None):
+    prompt_context = ""
+    if spec_details: 
+        prompt_context = f"The user might be asking in the context of {spec_details.get('display','')} ({spec_details.get('standard','')}-{spec_details.get('message_type','')} {spec_details.get('version','')})."
+
+    return f"""You are an expert AI assistant for Volvo Cars EDI (Electronic Data Interchange).
 Your primary goal is to provide accurate and helpful information regarding EDI standards and practices relevant to Volvo Cars suppliers.
 {prompt_context}
 Be concise, clear, and directly answer the user's question.
@@ -141,31 +335,352 @@ Be concise, clear, and directly answer the user's question.
 User's question: "{html.escape(user_input)}"
 
 Answer:"""
-        
-        print("\n    --- Sending Prompt to Gemini ---")
-        print("    Prompt length:", len(prompt))
-        print("    --------------------------------\n")
-
-        gen_response = model.generate_content(prompt)
-        print("    --- Received Response from Gemini ---")
-        response_text = ""
-        if gen_response.candidates:
+
+def _is_safety_block(candidate):
+    # The SDK reports finish_reason as an enum; the stub model uses plain strings.
+    finish_reason = candidate.finish_reason
+    return getattr(finish_reason, "name", finish_reason) == 'SAFETY'
+
+def _candidate_text(candidate):
+    if candidate.content and candidate.content.parts:
+        return "".join(part.text for part in candidate.content.parts)
+    return ""
+
+def _no_candidates_message(gen_response):
+    response_text = "AI returned no candidates."
+    if hasattr(gen_response, 'prompt_feedback') and gen_response.prompt_feedback and gen_response.prompt_feedback.block_reason:
+         response_text += f" Reason: {gen_response.prompt_feedback.block_reason}"
+    return response_text
+
+def stream_gemini_response(user_input, spec_details=None, bypass_cache=False):
+    """
+    Streaming variant of the AI mode of get_gemini_response. Yields text chunks
+    as the model produces them; safety blocks, empty answers and errors are
+    yielded as the same messages get_gemini_response returns. Complete answers
+    are stored in the answer cache, and a cache hit is yielded as one chunk.
+    A caller asking while the same question is already being answered gets
+    that answer as one chunk when it is complete.
+    """
+    print(f"\nGEMINI_HANDLER (stream): Input='{user_input}', SpecDetails={spec_details}, BypassCache={bypass_cache}")
+    if _asks_for_specification_url(user_input):
+        yield SPECIFICATION_URL_ANSWER
+        return
+    model = get_model()
+    if not model:
+        yield "AI model is currently unavailable. API key might be missing or invalid."
+        return
+
+    cache_key = make_cache_key(user_input, spec_details, GEMINI_MODEL_NAME)
+    if not bypass_cache:
+        cached_response = answer_cache.get(cache_key)
+        if cached_response is not None:
+            print(f"    Answer cache hit. Stats: {answer_cache.stats()}")
+            count_event("handler", "ai_cache_hit")
+            yield cached_response
+            return
+        count_event("handler", "ai_cache_miss")
+
+    permit = gemini_breaker.allow()
+    if not permit:
+        yield _local_fallback_response(user_input, spec_details)
+        return
+
+    call, leader = gemini_calls.begin(cache_key)
+    if not leader:
+        # The same question is being answered for another user right now; share that answer.
+        gemini_breaker.record_cancelled(permit)
+        try:
+            yield gemini_calls.wait(call, SHARED_CALL_TIMEOUT_SECONDS)
+        except (CallQueueTimeout, SharedCallAbandoned):
+            yield GEMINI_BUSY_MESSAGE
+        return
+
+    streamed = []
+    completed = False
+    try:
+        with gemini_limiter.slot():
+            for piece in _stream_model_response(model, user_input, spec_details, cache_key, permit):
+                streamed.append(piece)
+                yield piece
+        completed = True
+    except CallQueueTimeout:
+        gemini_breaker.record_cancelled(permit)
+        streamed.append(GEMINI_BUSY_MESSAGE)
+        completed = True
+        yield GEMINI_BUSY_MESSAGE
+    finally:
+        if completed:
+            gemini_calls.finish(cache_key, call, result="".join(streamed).strip() or " ")
+        else:
+            # Closed early (rerun, stop, deadline) or failed: the followers must not take the partial text as the answer.
+            gemini_calls.finish(cache_key, call, error=SharedCallAbandoned("the shared answer stream was closed before it was complete"))
+
+def _stream_model_response(model, user_input, spec_details, cache_key, permit):
+    """
+    Yields the chunks of one streamed Gemini answer and caches the complete answer.
+    The time to the first chunk (or to a failure) is reported to the circuit breaker,
+    which allowed the call with `permit`.
+    """
+    chunks = []
+    stream_start = time.perf_counter()
+    first_response_seconds = None
+    try:
+        for gen_response in model.generate_content(build_prompt(user_input, spec_details), stream=True):
+            if first_response_seconds is None:
+                first_response_seconds = time.perf_counter() - stream_start
+                gemini_breaker.record_success(permit, first_response_seconds)
+            if not gen_response.candidates:
+                if not chunks:
+                    yield _no_candidates_message(gen_response)
+                return
             candidate = gen_response.candidates[0]
-            if candidate.finish_reason == 'SAFETY': 
-                response_text = "Response blocked for safety."
+            if _is_safety_block(candidate):
                 if hasattr(candidate, 'safety_ratings'): print(f"    Safety ratings: {candidate.safety_ratings}")
-            elif candidate.content and candidate.content.parts: 
-                response_text = candidate.content.parts[0].text.strip()
-            else: 
-                response_text = "AI returned empty/unexpected content."
+                yield ("\n\n" if chunks else "") + "Response blocked for safety."
+                return
+            text = _candidate_text(candidate)
+            if text:
+                if not chunks:
+                    STAGE_SECONDS.observe(time.perf_counter() - stream_start, component="handler", stage="gemini_first_token")
+                    text = text.lstrip()
+                chunks.append(text)
+                yield text
+    except Exception as e:
+        print(f"!!! ERROR in stream_gemini_response: {type(e).__name__}: {e} !!!"); traceback.print_exc()
+        if first_response_seconds is None:
+            gemini_breaker.record_failure(permit, time.perf_counter() - stream_start)
+            yield _local_fallback_response(user_input, spec_details)
+        else:
+            yield "\n\nCritical error in handler. Check logs."
+        return
+    finally:
+        if first_response_seconds is None and not chunks:
+            gemini_breaker.record_cancelled(permit) # Abandoned before Gemini answered: free a half-open probe
+
+    STAGE_SECONDS.observe(time.perf_counter() - stream_start, component="handler", stage="gemini_stream_total")
+    response_text = "".join(chunks).strip()
+    if response_text:
+        count_event("handler", "ai_answer")
+        answer_cache.set(cache_key, response_text)
+        print(f"    Streamed AI Response: {response_text[:100]}...")
+    else:
+        yield "AI returned empty/unexpected content."
+
+def _get_local_response(user_input, spec_details):
+    """LOCAL DATA ONLY MODE: answers from the explainer tables, without the AI model."""
+    if looks_like_interchange(user_input):
+        print("    Local Mode: Input looks like a pasted interchange; explaining every segment.")
+        count_event("handler", "local_interchange")
+        return explain_interchange(user_input, spec_details)
+    
+    if not spec_details:
+        print("    Local Mode: No specific spec_details provided from UI. Asking user to select from dropdown.")
+        return "In Local Data mode, please select a specific EDI specification from the dropdown to query its details."
+
+    if user_input.startswith(f"Show information for {spec_details.get('display','the selected specification')}"):
+        return f"You've selected {spec_details.get('display','the specification')}. Please ask about a specific segment (e.g., 'What is UNH?')."
+
+    mentioned_segments = extract_segments_from_query(user_input)
+    segments_to_explain = resolve_query_segments(mentioned_segments, spec_details)[:MAX_SEGMENTS_PER_QUESTION]
+    if not segments_to_explain:
+        # No known segment code in the question; try the local free-text index before giving up.
+        with timed("handler", "local_search"):
+            search_answer = answer_from_search(user_input, spec_details)
+        if search_answer:
+            count_event("handler", "local_search_answer")
+            return search_answer
+    if not mentioned_segments:
+        count_event("handler", "local_no_segment")
+        return f"Could not identify a specific segment in your query '{user_input}' for {spec_details.get('display','the selected specification')}. Please ask about a specific segment (e.g., 'BGM', 'NAD+SE')."
+    if not segments_to_explain:
+        segments_to_explain = mentioned_segments[:1] # Let the explainer report that it is not in this spec
+
+    print(f"    Local Mode: Extracted segments {segments_to_explain} for spec '{spec_details.get('display', 'Unknown Spec')}'")
+    
+    payload = {
+        "standard": spec_details["standard"],
+        "message_type": spec_details["message_type"], 
+        "version": spec_details.get("version", "")
+    }
+    explainer_transport = get_explainer_transport()
+    
+    try:
+        if len(segments_to_explain) == 1:
+            payload["segment"] = segments_to_explain[0]
+            print(f"    Explainer Request ({explainer_transport.name}): explain_segment with payload: {payload}")
+            with timed("handler", f"explainer_call_{explainer_transport.name}"):
+                data = explainer_transport.explain_segment(payload) # HTTP transport can raise requests errors or json.JSONDecodeError
+            print(f"    Explainer Response Data: {data}")
+            count_event("handler", "local_segment_answer")
+            return data.get("explanation", f"No explanation found via API for segment '{segments_to_explain[0]}' in {spec_details.get('display', 'the selected specification')}.")
+
+        payload["segments"] = segments_to_explain
+        print(f"    Explainer Request ({explainer_transport.name}): explain_segments with payload: {payload}")
+        with timed("handler", f"explainer_batch_call_{explainer_transport.name}"):
+            data = explainer_transport.explain_segments(payload)
+        count_event("handler", "local_multi_segment_answer")
+        return "\n\n---\n\n".join(f"### {result['segment']}\n{result['explanation']}" for result in data.get("results", []))
+    except Exception as e:
+        if not is_transport_error(e): raise
+        count_event("handler", "local_error")
+        return _transport_error_message(e)
+
+def preload_spec(spec_details):
+    """
+    Preloads a spec's whole segment table into the explainer transport, so local
+    questions about it are answered without network calls. Returns False if the
+    download failed (questions then go to the explainer service one by one).
+    """
+    try:
+        with timed("handler", "spec_preload"):
+            return get_explainer_transport().preload_spec(spec_details["standard"], spec_details["message_type"], spec_details.get("version", ""))
+    except Exception as e:
+        if not is_transport_error(e): raise
+        print(f"WARN: Could not preload {spec_details.get('display', 'spec')}: {e}")
+        return False
+
+def _transport_error_message(e):
+    import requests # Already loaded: only the HTTP transport raises these errors
+    if isinstance(e, requests.exceptions.ConnectionError):
+        print(f"    ERROR: FastAPI Connection Error to {FASTAPI_BASE_URL}.")
+        return "Error: Could not connect to the local data service. Please ensure it's running and the URL is correct."
+    if isinstance(e, requests.exceptions.HTTPError):
+        api_response = e.response
+        print(f"    ERROR: FastAPI HTTP Error: {e}. Response: {api_response.text if api_response is not None else 'N/A'}")
+        return f"Error communicating with local data service (HTTP {api_response.status_code if api_response is not None else 'N/A'}). Please check service logs."
+    if isinstance(e, json.JSONDecodeError): # Response is not valid JSON
+        print(f"    ERROR: Could not decode JSON response from FastAPI: {e}")
+        return "Error: Received an invalid response from the local data service."
+    print(f"    ERROR: FastAPI Request Error: {e}")
+    return f"Error communicating with local data service: {e}"
+
+def identify_spec(user_input):
+    """
+    Spec details for the spec a question is about: the message type (and version)
+    named in it, e.g. 'DELFOR D96A', or else the first spec that defines a mentioned
+    segment. None if neither identifies one.
+    """
+    words = set(re.findall(r"[A-Z0-9]+", user_input.upper()))
+    named = [spec for spec in SPEC_REGISTRY if spec[1] in words]
+    candidates = [spec for spec in named if spec[2] in words] or named
+    if not candidates:
+        segments = extract_segments_from_query(user_input)
+        candidates = [spec for spec in SPEC_REGISTRY if any(any(find_segment_keys(*spec, segment)) for segment in segments)]
+    if not candidates:
+        return None
+    standard, message_type, version = candidates[0]
+    return {"display": spec_display_name(standard, message_type, version), "standard": standard, "message_type": message_type, "version": version}
+
+def _local_fallback_response(user_input, spec_details):
+    """Answer from the local explainer tables while Gemini is unavailable, or a short unavailable message."""
+    count_event("handler", "ai_fallback")
+    answer = None
+    with timed("handler", "ai_fallback"):
+        if looks_like_interchange(user_input):
+            answer = explain_interchange(user_input, spec_details)
+        else:
+            spec_details = spec_details or identify_spec(user_input)
+            if spec_details and extract_segments_from_query(user_input):
+                answer = _get_local_response(user_input, spec_details)
+            elif spec_details:
+                answer = answer_from_search(user_input, spec_details)
+    if not answer:
+        return AI_UNAVAILABLE_MESSAGE
+    return AI_FALLBACK_PREFIX.format(spec=spec_details["display"] if spec_details else "EDI") + answer
+
+def _get_ai_response(user_input, spec_details, bypass_cache):
+    """AI MODEL MODE: answers with Gemini, through the answer cache."""
+    model = get_model()
+    if not model: 
+        return "AI model is currently unavailable. API key might be missing or invalid."
+
+    cache_key = make_cache_key(user_input, spec_details, GEMINI_MODEL_NAME)
+    if not bypass_cache:
+        with timed("handler", "cache_lookup"):
+            cached_response = answer_cache.get(cache_key)
+        if cached_response is not None:
+            print(f"    Answer cache hit. Stats: {answer_cache.stats()}")
+            count_event("handler", "ai_cache_hit")
+            return cached_response
+        count_event("handler", "ai_cache_miss")
+
+    permit = gemini_breaker.allow()
+    if not permit:
+        return _local_fallback_response(user_input, spec_details)
+
+    prompt = build_prompt(user_input, spec_details)
+    
+    print("\n    --- Sending Prompt to Gemini ---")
+    print("    Prompt length:", len(prompt))
+    print("    --------------------------------\n")
+
+    def generate():
+        with gemini_limiter.slot():
+            start = time.perf_counter()
+            try:
+                with timed("handler", "gemini_generate"):
+                    gen_response = model.generate_content(prompt)
+            except Exception:
+                gemini_breaker.record_failure(permit, time.perf_counter() - start)
+                raise
+            gemini_breaker.record_success(permit, time.perf_counter() - start)
+        return _response_text(gen_response, cache_key)
+
+    try:
+        response_text, shared = gemini_calls.do(cache_key, generate, timeout=SHARED_CALL_TIMEOUT_SECONDS)
+    except (CallQueueTimeout, SharedCallAbandoned):
+        gemini_breaker.record_cancelled(permit)
+        count_event("handler", "ai_busy")
+        return GEMINI_BUSY_MESSAGE
+    except Exception as e:
+        print(f"!!! ERROR calling Gemini: {type(e).__name__}: {e} !!!"); traceback.print_exc()
+        count_event("handler", "ai_error")
+        return _local_fallback_response(user_input, spec_details)
+    if shared:
+        gemini_breaker.record_cancelled(permit)
+        print("    Shared the answer of an identical in-flight Gemini call.")
+    print(f"    Returning AI Response: {response_text[:100]}...")
+    return response_text if response_text else " "
+
+def _response_text(gen_response, cache_key):
+    """Answer text of a non-streamed Gemini response; complete answers are cached."""
+    print("    --- Received Response from Gemini ---")
+    response_text = ""
+    if gen_response.candidates:
+        candidate = gen_response.candidates[0]
+        if _is_safety_block(candidate): 
+            response_text = "Response blocked for safety."
+            count_event("handler", "ai_safety_block")
+            if hasattr(candidate, 'safety_ratings'): print(f"    Safety ratings: {candidate.safety_ratings}")
+        elif _candidate_text(candidate).strip(): 
+            response_text = _candidate_text(candidate).strip()
+            count_event("handler", "ai_answer")
+            answer_cache.set(cache_key, response_text)
         else: 
-            response_text = "AI returned no candidates."
-            if hasattr(gen_response, 'prompt_feedback') and gen_response.prompt_feedback and gen_response.prompt_feedback.block_reason:
-                 response_text += f" Reason: {gen_response.prompt_feedback.block_reason}"
-        
-        print(f"    Returning AI Response: {response_text[:100]}...")
-        return response_text if response_text else " "
+            response_text = "AI returned empty/unexpected content."
+            count_event("handler", "ai_empty")
+    else: 
+        response_text = _no_candidates_message(gen_response)
+        count_event("handler", "ai_no_candidates")
+    return response_text
+
+def get_gemini_response(user_input, spec_option=None, use_gemini_model=True, spec_details=None, bypass_cache=False):
+    print(f"\nGEMINI_HANDLER: Input='{user_input}', SpecOpt='{spec_option}', UseAI={use_gemini_model}, SpecDetails={spec_details}, BypassCache={bypass_cache}")
+
+    if _asks_for_specification_url(user_input):
+        return SPECIFICATION_URL_ANSWER
+
+    try:
+        if not use_gemini_model: # LOCAL DATA ONLY MODE (via the explainer transport)
+            print("    MODE: Local Data via explainer transport")
+            with timed("handler", "local_total"):
+                return _get_local_response(user_input, spec_details)
+
+        print("    MODE: AI Model (Gemini)")
+        with timed("handler", "ai_total"):
+            return _get_ai_response(user_input, spec_details, bypass_cache)
 
     except Exception as e:
         print(f"!!! ERROR in get_gemini_response: {type(e).__name__}: {e} !!!"); traceback.print_exc()
+        count_event("handler", "critical_error")
         return "Critical error in handler. Check logs."
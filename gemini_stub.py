@@ -0,0 +1,83 @@
+# gemini_stub.py
+"""
+Offline stand-in for google.generativeai.GenerativeModel.
+
+Implements the parts of the SDK response shape the handler relies on
+(candidates[0].finish_reason / content.parts[].text / prompt_feedback),
+including `generate_content(prompt, stream=True)`, so the AI path can be
+exercised without network access or an API key. Enable it in the handler with
+GEMINI_STUB_MODEL=1; GEMINI_STUB_LATENCY_SECONDS and
+GEMINI_STUB_CHUNK_DELAY_SECONDS set `latency` and `chunk_delay`.
+
+Prompts containing these markers simulate special outcomes:
+    [stub:safety]  the answer is blocked for safety after the first chunk
+    [stub:empty]   the model returns a candidate without content
+    [stub:blocked] the prompt is blocked (no candidates, with a block reason)
+    [stub:error]   generate_content raises
+"""
+import time
+from types import SimpleNamespace
+
+DEFAULT_ANSWER = (
+    "This is a stub answer from the offline model. In a real deployment Gemini "
+    "would explain the EDI segment or practice you asked about here."
+)
+
+
+def _response(text=None, finish_reason="STOP", block_reason=None, candidates=True):
+    if not candidates:
+        return SimpleNamespace(candidates=[], prompt_feedback=SimpleNamespace(block_reason=block_reason))
+    parts = [SimpleNamespace(text=text)] if text is not None else []
+    candidate = SimpleNamespace(
+        finish_reason=finish_reason,
+        content=SimpleNamespace(parts=parts),
+        safety_ratings=[],
+    )
+    return SimpleNamespace(candidates=[candidate], prompt_feedback=None)
+
+
+class StubGenerativeModel:
+    """
+    Args:
+        answer (str): Text returned for every prompt.
+        chunk_size (int): Characters per streamed chunk.
+        chunk_delay (float): Seconds to sleep before each streamed chunk.
+        latency (float): Seconds to sleep before a non-streamed response.
+    """
+
+    def __init__(self, answer=DEFAULT_ANSWER, chunk_size=16, chunk_delay=0.0, latency=0.0):
+        self.model_name = "stub"
+        self.answer = answer
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if "[stub:error]" in prompt:
+            raise RuntimeError("Stub model failure")
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self.latency)
+        if "[stub:blocked]" in prompt:
+            return _response(candidates=False, block_reason="SAFETY")
+        if "[stub:empty]" in prompt:
+            return _response()
+        if "[stub:safety]" in prompt:
+            return _response(finish_reason="SAFETY")
+        return _response(self.answer)
+
+    def _stream(self, prompt):
+        if "[stub:blocked]" in prompt:
+            yield _response(candidates=False, block_reason="SAFETY")
+            return
+        if "[stub:empty]" in prompt:
+            yield _response()
+            return
+        for i in range(0, len(self.answer), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            if "[stub:safety]" in prompt and i > 0:
+                yield _response(finish_reason="SAFETY")
+                return
+            yield _response(self.answer[i:i + self.chunk_size], finish_reason=None)
@@ -8,6 +8,12 @@ import traceback
 # For password hashing
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Firebase (or the local store) is initialized on first use, once per process (app_resources.app_db).
+from auth_db import db_status
+from app_resources import DEFAULT_APP_ID, announce_startup, app_db, app_model, load_spec_maps, read_css
+from chat_history import DEFAULT_WINDOW_SIZE, chat_history_from_env
+from conversation_log import get_conversation_log
+
 # --- Session State Initialization for Mock DB & App State ---
 if "_mock_db_users_store_session_data" not in st.session_state: 
     st.session_state._mock_db_users_store_session_data = {} 
@@ -21,140 +27,63 @@ if "user_email" not in st.session_state:
     st.session_state.user_email = None
 
 # --- Firebase Initialization ---
-app_id_global = 'default-app-id-local-dev' 
-db = None 
-IS_MOCK_DB = True # Assume mock initially
-print(f"--- SCRIPT START (Auth Debug v7) ---")
-
-if '__app_id' in globals():
-    app_id_global = globals()['__app_id']
-    print(f"CANVAS_ENV: Using provided __app_id: {app_id_global}")
-else:
-    print(f"LOCAL_ENV: __app_id not found in globals, using default: {app_id_global}")
-
+app_id_global = globals().get('__app_id', DEFAULT_APP_ID)
 USER_CREDENTIALS_COLLECTION = f"artifacts/{app_id_global}/user_auth_credentials" # Consistent collection name
+announce_startup(app_id_global, USER_CREDENTIALS_COLLECTION)
 
-class MockFirestoreDocument:
-    def __init__(self, doc_id, data=None):
-        self.id = doc_id; self._data = data if data is not None else {}; self._exists = data is not None
-    def get(self): return self 
-    def to_dict(self): return self._data
-    @property 
-    def exists(self): return self._exists
-    def set(self, data_to_set):
-        if self.id:
-            st.session_state._mock_db_users_store_session_data[self.id] = data_to_set 
-            self._data = data_to_set; self._exists = True
-            print(f"MOCK_DB_SET (Session): User '{self.id}'. Store: {st.session_state._mock_db_users_store_session_data}")
-        else: print("MOCK_DB_SET_ERROR: Document ID is None.")
-
-class MockFirestoreQuery: 
-    def __init__(self, field, op, value):
-        self._results = []
-        if field == "email" and op == "==" and value in st.session_state._mock_db_users_store_session_data:
-            self._results.append(MockFirestoreDocument(value, st.session_state._mock_db_users_store_session_data[value]))
-    def stream(self): return self._results; 
-    def get(self): return self._results
+# Streamlit re-executes this script on every interaction. Per-rerun trace lines
+# (page renders, handler arguments) are only printed with EDI_DEBUG_RERUNS set.
+DEBUG_RERUNS = bool(os.getenv("EDI_DEBUG_RERUNS"))
 
-class MockFirestoreCollection:
-    def document(self, doc_id=None): 
-        if doc_id: return MockFirestoreDocument(doc_id, st.session_state._mock_db_users_store_session_data.get(doc_id))
-        raise ValueError("Mock document requires an ID for user collection.")
-    def where(self, field, op, value): return MockFirestoreQuery(field, op, value)
+def debug_print(text):
+    if DEBUG_RERUNS: print(text)
 
-class MockDB: 
-    def collection(self, collection_name): 
-        print(f"MOCK_DB_ACCESS: Using MockDB for collection '{collection_name}'")
-        return MockFirestoreCollection()
 
 try:
-    print("FIREBASE_INIT: Attempting to initialize Firebase Admin SDK...")
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    
-    if not firebase_admin._apps:
-        cred_initialized = False
-        # 1. Try GOOGLE_APPLICATION_CREDENTIALS env var (for local development)
-        google_app_creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        if google_app_creds_path:
-            print(f"FIREBASE_INIT: Found GOOGLE_APPLICATION_CREDENTIALS env var: {google_app_creds_path}")
-            if os.path.exists(google_app_creds_path):
-                try:
-                    cred = credentials.Certificate(google_app_creds_path) # Use Certificate for explicit path
-                    firebase_admin.initialize_app(cred)
-                    db = firestore.client()
-                    IS_MOCK_DB = False
-                    print("SUCCESS: Firebase Admin SDK initialized using GOOGLE_APPLICATION_CREDENTIALS env var (path).")
-                    cred_initialized = True
-                except Exception as e_gac_path:
-                    print(f"WARN: Failed to init Firebase from GOOGLE_APPLICATION_CREDENTIALS path '{google_app_creds_path}': {e_gac_path}. Will try Streamlit secrets or mock.")
-            else:
-                print(f"WARN: GOOGLE_APPLICATION_CREDENTIALS path does not exist: {google_app_creds_path}. Will try Streamlit secrets or mock.")
-        
-        # 2. Try Streamlit Secrets (for deployed environment like Streamlit Cloud)
-        if not cred_initialized and "FIREBASE_SERVICE_ACCOUNT_JSON" in st.secrets:
-            print("FIREBASE_INIT: GOOGLE_APPLICATION_CREDENTIALS not used or failed. Trying Streamlit Secret.")
-            try:
-                cred_json_str = st.secrets["FIREBASE_SERVICE_ACCOUNT_JSON"]
-                cred_dict = json.loads(cred_json_str)
-                cred = credentials.Certificate(cred_dict)
-                # Check if an app is already initialized (might happen with st.secrets in some contexts)
-                if not firebase_admin._apps: # Re-check before initializing again
-                    firebase_admin.initialize_app(cred)
-                else: # If already initialized (e.g. by a failed GAC attempt that still created an app object)
-                    print("WARN: Firebase app object exists, but re-initializing with Streamlit Secret.")
-                    # This scenario is tricky; ideally, only one successful init.
-                    # Forcing re-init might be needed if the first attempt was partial/failed.
-                    # However, firebase_admin.initialize_app(cred) will error if default app exists.
-                    # A more robust solution might involve naming apps if multiple initializations are possible.
-                    # For now, assume if an app exists, it might be the one we want, or it's a problem.
-                    pass # db = firestore.client() will use the existing default app.
-
-                db = firestore.client(); IS_MOCK_DB = False
-                print("SUCCESS: Firebase Admin SDK initialized from Streamlit Secret (FIREBASE_SERVICE_ACCOUNT_JSON).")
-                cred_initialized = True
-            except Exception as e_streamlit_secret:
-                print(f"WARN: Failed to init Firebase from Streamlit JSON secret: {e_streamlit_secret}")
-        
-        if not cred_initialized:
-            print("INFO: No valid REAL Firebase Admin credentials found (env var or Streamlit Secret). Using MOCK Firestore.")
-            db = MockDB(); IS_MOCK_DB = True # Fallback to MockDB
-    else: # Firebase app already initialized
-        db = firestore.client(); IS_MOCK_DB = False
-        print("INFO: Firebase Admin SDK already initialized (Real Firestore).")
-
-except (ImportError, Exception) as e: 
-    print(f"WARN: General failure during Firebase Admin SDK init attempts ({type(e).__name__}: {e}). Using MOCK Firestore database.")
-    db = MockDB(); IS_MOCK_DB = True
-
-print(f"DB_STATUS: Using {'MockDB (persists in session)' if IS_MOCK_DB else 'Real Firestore'}. Collection path: {USER_CREDENTIALS_COLLECTION}")
-
-
-try:
-    from gemini_handler import get_gemini_response
-    EDI_SPEC_DETAILS_MAP = { 
-        "DELFOR_D04A": {"display": "DELFOR D04A", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D04A"},
-        "DELFOR_D96A": {"display": "DELFOR D96A", "standard": "EDIFACT", "message_type": "DELFOR", "version": "D96A"},
-        "DESADV_D07A": {"display": "DESADV D07A", "standard": "EDIFACT", "message_type": "DESADV", "version": "D07A"},
-        "DESADV_D96A": {"display": "DESADV D96A", "standard": "EDIFACT", "message_type": "DESADV", "version": "D96A"},
-    }
-    LOCAL_SPEC_OPTIONS_MAP = {"Select a Specification...": None}
-    for key, details in EDI_SPEC_DETAILS_MAP.items(): LOCAL_SPEC_OPTIONS_MAP[details["display"]] = key
+    from gemini_handler import get_gemini_response, stream_gemini_response, stream_interchange_explanations, preload_spec, get_chat_client, MAX_CHAT_ANNOTATED_SEGMENTS
+    from edi_explainers.interchange import format_annotation, looks_like_interchange
+    EDI_SPEC_DETAILS_MAP, LOCAL_SPEC_OPTIONS_MAP = load_spec_maps() # Built once per process (app_resources)
 except ImportError:
     print("WARNING: 'gemini_handler.py' not found."); LOCAL_SPEC_OPTIONS_MAP = {"Select a Specification...": None}; EDI_SPEC_DETAILS_MAP = {} 
-    def get_gemini_response(user_input, spec_option=None, use_gemini_model=True, spec_details=None): return f"(Placeholder) Response to: '{html.escape(user_input)}'"
+    def get_gemini_response(user_input, spec_option=None, use_gemini_model=True, spec_details=None, bypass_cache=False): return f"(Placeholder) Response to: '{html.escape(user_input)}'"
+    def looks_like_interchange(text): return False
+    def stream_gemini_response(user_input, spec_details=None, bypass_cache=False): yield get_gemini_response(user_input, spec_details=spec_details)
+    def preload_spec(spec_details): return False
+    def app_model(): return None
+    def get_chat_client(): return None
 
 def load_css(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding='utf-8') as f: st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    else: print(f"Warning: CSS file not found at {file_path}")
+    css = read_css(file_path) # Cached per process, re-read when the file changes
+    if css is not None: st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
+    else: debug_print(f"Warning: CSS file not found at {file_path}")
+
+def render_interchange_stream(user_input, spec_details):
+    """
+    Shows segment explanations of a pasted interchange as they stream in from
+    the FastAPI service and returns the answer to keep in the chat history.
+    Returns None if nothing was streamed (e.g. the service is unreachable).
+    """
+    status = st.empty()
+    results_area = st.container()
+    lines = []; segment_count = 0; found_count = 0
+    for annotation in stream_interchange_explanations(user_input, spec_details):
+        segment_count += 1; found_count += annotation["found"]
+        if segment_count <= MAX_CHAT_ANNOTATED_SEGMENTS:
+            line = format_annotation(annotation); lines.append(line); results_area.markdown(line)
+        if segment_count % 100 == 0: status.caption(f"Explained {found_count} of {segment_count} segments so far...")
+    status.empty()
+    if not segment_count: return None
+    if segment_count > MAX_CHAT_ANNOTATED_SEGMENTS: lines.append(f"... {segment_count - MAX_CHAT_ANNOTATED_SEGMENTS} more segments not shown.")
+    lines.append(f"Explained {found_count} of {segment_count} segments.")
+    return "\n\n".join(lines)
 
 def register_user(email, password):
-    print(f"AUTH_FUNC_REGISTER: Attempting for '{email}' using {'MockDB' if IS_MOCK_DB else 'Real Firestore'}")
+    db, is_mock_db = app_db()
+    print(f"AUTH_FUNC_REGISTER: Attempting for '{email}' using {db_status()}")
     if not db: st.error("Database service is not available."); return False, "Database error."
     try:
         user_doc_ref = db.collection(USER_CREDENTIALS_COLLECTION).document(email)
-        doc_snapshot = user_doc_ref.get() if not IS_MOCK_DB else user_doc_ref 
+        doc_snapshot = user_doc_ref.get() if not is_mock_db else user_doc_ref 
         print(f"AUTH_FUNC_REGISTER: User '{email}' exists check: {doc_snapshot.exists}")
         if doc_snapshot.exists: return False, "Email already registered."
         user_doc_ref.set({"email": email, "hashed_password": generate_password_hash(password)})
@@ -162,11 +91,12 @@ def register_user(email, password):
     except Exception as e: print(f"ERROR_REGISTER: {e}"); traceback.print_exc(); return False, f"Registration error."
 
 def login_user(email, password):
-    print(f"AUTH_FUNC_LOGIN: Attempting for '{email}' using {'MockDB' if IS_MOCK_DB else 'Real Firestore'}")
+    db, is_mock_db = app_db()
+    print(f"AUTH_FUNC_LOGIN: Attempting for '{email}' using {db_status()}")
     if not db: st.error("Database service is not available."); return False, "Database error."
     try:
         user_doc_ref = db.collection(USER_CREDENTIALS_COLLECTION).document(email)
-        doc_snapshot = user_doc_ref.get() if not IS_MOCK_DB else user_doc_ref
+        doc_snapshot = user_doc_ref.get() if not is_mock_db else user_doc_ref
         print(f"AUTH_FUNC_LOGIN: User '{email}' exists check: {doc_snapshot.exists}")
         if doc_snapshot.exists:
             user_data = doc_snapshot.to_dict()
@@ -175,12 +105,12 @@ def login_user(email, password):
                 return True, "Login successful!"
             print(f"AUTH_FUNC_LOGIN: Password mismatch for '{email}'.")
             return False, "Incorrect password."
-        print(f"AUTH_FUNC_LOGIN: Email '{email}' not found. Mock store: {st.session_state._mock_db_users_store_session_data if IS_MOCK_DB else 'N/A (Real Firestore checked)'}")
+        print(f"AUTH_FUNC_LOGIN: Email '{email}' not found in {db_status()}.")
         return False, "Email not found."
     except Exception as e: print(f"ERROR_LOGIN: {e}"); traceback.print_exc(); return False, f"Login error."
 
 def display_login_page():
-    print("PAGE_RENDER: display_login_page()")
+    debug_print("PAGE_RENDER: display_login_page()")
     if st.button("Don't have an account? Register here.", key="goto_register_btn_main_v7"):
         st.session_state.page = "register"; st.rerun()
     st.subheader("Login")
@@ -196,7 +126,7 @@ def display_login_page():
             else: st.error(message_text)
 
 def display_register_page():
-    print("PAGE_RENDER: display_register_page()")
+    debug_print("PAGE_RENDER: display_register_page()")
     st.subheader("Register New Account")
     with st.form("register_form_main_v7"): 
         email = st.text_input("Email", key="register_email_main_v7")
@@ -213,13 +143,32 @@ def display_register_page():
     if st.button("Already have an account? Login here.", key="goto_login_btn_main_v7"):
         st.session_state.page = "login"; st.rerun()
 
+CHAT_WINDOW_SIZE = DEFAULT_WINDOW_SIZE
+
+def get_chat_history():
+    """
+    The session's ChatHistory. Backed by the user's conversation log, so a
+    returning user gets the newest page of their earlier conversation back;
+    a new conversation starts with the greeting.
+    """
+    if "chat_history" not in st.session_state:
+        conversation_log = get_conversation_log()
+        user_email = st.session_state.get("user_email")
+        chat_history = chat_history_from_env(archive=conversation_log.for_user(user_email) if conversation_log and user_email else None)
+        if not len(chat_history):
+            chat_history.append("assistant", "Hello! I'm the EDI AI Assistant for Volvo Cars.")
+            chat_history.append("assistant", "How can I help you today?")
+        st.session_state.chat_history = chat_history
+    return st.session_state.chat_history
+
 def display_chat_app_page(): 
-    print("PAGE_RENDER: display_chat_app_page()")
+    debug_print("PAGE_RENDER: display_chat_app_page()")
     SELECTED_SPEC_KEY_STATE = "selected_spec_internal_key_v7" 
     st.sidebar.subheader(f"Welcome, {st.session_state.get('user_email', 'User').split('@')[0]}!")
     if st.sidebar.button("Logout", key="logout_chat_main_v7"):
         st.session_state.logged_in = False; st.session_state.user_email = None; st.session_state.page = "login"
-        if "messages" in st.session_state: del st.session_state.messages 
+        if "chat_history" in st.session_state: st.session_state.chat_history.close(); del st.session_state.chat_history
+        st.session_state.pop("chat_visible_count", None)
         if SELECTED_SPEC_KEY_STATE in st.session_state: del st.session_state[SELECTED_SPEC_KEY_STATE]
         st.rerun()
     
@@ -228,6 +177,9 @@ def display_chat_app_page():
     if SELECTED_SPEC_KEY_STATE not in st.session_state: st.session_state[SELECTED_SPEC_KEY_STATE] = None
     st.sidebar.markdown("---") 
     st.session_state.use_ai_model = st.sidebar.toggle("Use AI Model (Gemini)", value=st.session_state.use_ai_model, key="ai_model_toggle_sidebar_final_v7", help="Toggle ON for AI responses. Toggle OFF for local data lookup.")
+    if st.session_state.use_ai_model:
+        if not get_chat_client(): app_model() # Configured once per process, on the first AI-mode render rather than the first question
+        st.session_state.bypass_answer_cache = st.sidebar.checkbox("Force fresh answer", value=st.session_state.get("bypass_answer_cache", False), key="bypass_answer_cache_checkbox_v7", help="Skip cached AI answers and ask the model again.")
     current_selected_spec_details_for_handler = None 
     if not st.session_state.use_ai_model:
         display_options_list = list(LOCAL_SPEC_OPTIONS_MAP.keys())
@@ -240,16 +192,21 @@ def display_chat_app_page():
             st.session_state[SELECTED_SPEC_KEY_STATE] = newly_selected_key
             if newly_selected_key and newly_selected_key in EDI_SPEC_DETAILS_MAP: 
                 current_selected_spec_details_for_handler = EDI_SPEC_DETAILS_MAP[newly_selected_key]
-                if "messages" not in st.session_state: st.session_state.messages = []
-                st.session_state.messages.append({"role": "user", "content": f"Show information for {current_selected_spec_details_for_handler['display']}"})
+                preload_spec(current_selected_spec_details_for_handler) # Later questions about this spec are answered in-process
+                get_chat_history().append("user", f"Show information for {current_selected_spec_details_for_handler['display']}")
             st.rerun() 
         if st.session_state.get(SELECTED_SPEC_KEY_STATE) and st.session_state[SELECTED_SPEC_KEY_STATE] in EDI_SPEC_DETAILS_MAP:
              current_selected_spec_details_for_handler = EDI_SPEC_DETAILS_MAP.get(st.session_state[SELECTED_SPEC_KEY_STATE])
     st.markdown("<hr>", unsafe_allow_html=True)
     st.markdown('<div class="chat-messages-area" id="chat-messages-area-streamlit-chat">', unsafe_allow_html=True)
     with st.container(): 
-        if "messages" not in st.session_state: st.session_state.messages = [{"role": "assistant", "content": "Hello! I'm the EDI AI Assistant for Volvo Cars."},{"role": "assistant", "content": "How can I help you today?"}]
-        for i, msg_data in enumerate(st.session_state.messages):
+        # Only the newest messages are rendered; "Load earlier messages" pages back through the history.
+        chat_history = get_chat_history()
+        visible_count = st.session_state.get("chat_visible_count", CHAT_WINDOW_SIZE)
+        hidden_count = len(chat_history) - visible_count - chat_history.earliest_index()
+        if hidden_count > 0 and st.button(f"Load earlier messages ({hidden_count} more)", key="load_earlier_messages_btn_v7"):
+            st.session_state.chat_visible_count = visible_count + CHAT_WINDOW_SIZE; st.rerun()
+        for i, msg_data in chat_history.window(visible_count):
             message(msg_data["content"], is_user=(msg_data["role"] == "user"), key=f"msg_chat_display_session_final_v7_{i}", avatar_style="initials" if msg_data["role"] == "user" else "bottts", seed="User" if msg_data["role"] == "user" else "AI")
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="sticky-input-area">', unsafe_allow_html=True)
@@ -260,8 +217,8 @@ def display_chat_app_page():
         st.markdown("""<div class="footer-text"><p>Volvo Cars EDI AI Assistant provides AI-generated responses. Please verify important information.</p><p>© Copyright AB Volvo 2025 &nbsp;|&nbsp;<a href="#">Privacy</a> &nbsp;|&nbsp;<a href="https://www.volvocars.com">www.volvocars.com</a></p></div>""", unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     if submitted and user_input_value:
-        if "messages" not in st.session_state: st.session_state.messages = []
-        st.session_state.messages.append({"role": "user", "content": user_input_value})
+        get_chat_history().append("user", user_input_value)
+        st.session_state.chat_visible_count = CHAT_WINDOW_SIZE # Back to the newest page
         spec_option_key_to_pass = None; final_spec_details_for_handler = None 
         current_selected_key = st.session_state.get(SELECTED_SPEC_KEY_STATE)
         if current_selected_key and current_selected_key in EDI_SPEC_DETAILS_MAP: 
@@ -269,9 +226,19 @@ def display_chat_app_page():
             final_spec_details_for_handler = EDI_SPEC_DETAILS_MAP.get(spec_option_key_to_pass)
         if not st.session_state.use_ai_model and not final_spec_details_for_handler: 
              spec_option_key_to_pass = None 
-        print(f"[MAIN_APP DEBUG] Passing to handler: user_input='{user_input_value}', spec_option_key='{spec_option_key_to_pass}', spec_details='{final_spec_details_for_handler}', use_ai_model={st.session_state.use_ai_model}")
-        assistant_response = get_gemini_response(user_input_value, spec_option=spec_option_key_to_pass, use_gemini_model=st.session_state.use_ai_model, spec_details=final_spec_details_for_handler)
-        st.session_state.messages.append({"role": "assistant", "content": assistant_response})
+        debug_print(f"[MAIN_APP DEBUG] Passing to handler: user_input='{user_input_value}', spec_option_key='{spec_option_key_to_pass}', spec_details='{final_spec_details_for_handler}', use_ai_model={st.session_state.use_ai_model}")
+        assistant_response = None
+        if not st.session_state.use_ai_model and looks_like_interchange(user_input_value):
+            assistant_response = render_interchange_stream(user_input_value, final_spec_details_for_handler)
+        if assistant_response is None and st.session_state.use_ai_model:
+            # Render the answer token by token instead of blocking until the whole generation is done.
+            # With CHAT_TRANSPORT=http the FastAPI backend calls Gemini and this script only relays its stream.
+            chat_client = get_chat_client(); answer_stream = chat_client.stream if chat_client else stream_gemini_response
+            with st.chat_message("assistant"):
+                assistant_response = st.write_stream(answer_stream(user_input_value, spec_details=final_spec_details_for_handler, bypass_cache=st.session_state.get("bypass_answer_cache", False))) or " "
+        if assistant_response is None:
+            assistant_response = get_gemini_response(user_input_value, spec_option=spec_option_key_to_pass, use_gemini_model=st.session_state.use_ai_model, spec_details=final_spec_details_for_handler, bypass_cache=st.session_state.get("bypass_answer_cache", False))
+        get_chat_history().append("assistant", assistant_response)
         st.rerun()
 
 def main():
@@ -282,7 +249,7 @@ def main():
     if "logged_in" not in st.session_state: st.session_state.logged_in = False
     if "user_email" not in st.session_state: st.session_state.user_email = None
     
-    print(f"DEBUG_MAIN_APP: In main() - Current page: '{st.session_state.page}', Logged in: {st.session_state.logged_in}, DB is MOCK: {IS_MOCK_DB}")
+    debug_print(f"DEBUG_MAIN_APP: In main() - Current page: '{st.session_state.page}', Logged in: {st.session_state.logged_in}, DB: {db_status()}")
     
     if st.session_state.get('logged_in'): display_chat_app_page()
     elif st.session_state.get('page') == "register": display_register_page()
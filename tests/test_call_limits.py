@@ -0,0 +1,38 @@
+# tests/test_call_limits.py
+from call_limits import CircuitBreaker
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0)
+    early = breaker.allow()  # allowed while closed
+    breaker.record_failure(breaker.allow(), 1.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    probe = breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN and probe
+    return breaker, early, probe
+
+
+def test_earlier_success_does_not_close_half_open_circuit():
+    breaker, early, probe = _half_open_breaker()
+    breaker.record_success(early, 0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # the probe is still in flight
+    breaker.record_success(probe, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_earlier_failure_does_not_reopen_half_open_circuit():
+    breaker, early, probe = _half_open_breaker()
+    breaker.record_failure(early, 1.0)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure(probe, 1.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_only_the_probe_frees_the_probe_when_cancelled():
+    breaker, early, probe = _half_open_breaker()
+    breaker.record_cancelled(early)
+    assert not breaker.allow()
+    breaker.record_cancelled(probe)
+    assert breaker.allow()
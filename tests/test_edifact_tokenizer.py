@@ -0,0 +1,36 @@
+# tests/test_edifact_tokenizer.py
+from edi_explainers.edifact.tokenizer import SegmentReader, iter_segments
+
+
+def _parsed(source, chunk_size=64 * 1024):
+    return [(segment.tag, segment.elements) for segment in iter_segments(source, chunk_size=chunk_size)]
+
+
+def test_short_input_is_split_on_terminators():
+    assert _parsed("BGM+1'") == [("BGM", [["1"]])]
+    assert _parsed("BGM'DTM'") == [("BGM", []), ("DTM", [])]
+
+
+def test_short_input_without_final_terminator():
+    assert _parsed("BGM+1") == [("BGM", [["1"]])]
+
+
+def test_short_input_with_una():
+    assert _parsed("UNA:+.? 'BGM+1'") == [("UNA", [[":+.? '"]]), ("BGM", [["1"]])]
+    assert _parsed("UNA:+.?*_BGM+1_") == [("UNA", [[":+.?*_"]]), ("BGM", [["1"]])]
+
+
+def test_input_split_across_chunks():
+    text = "UNH+1+DELFOR:D:96A:UN'BGM+241+1?'2+5'DTM+137:20230803:102'UNT+4+1'"
+    expected = _parsed(text)
+    assert [tag for tag, _ in expected] == ["UNH", "BGM", "DTM", "UNT"]
+    assert expected[1] == ("BGM", [["241"], ["1'2"], ["5"]])
+    for chunk_size in (1, 2, 3, 5, 8, 13):
+        assert _parsed(text, chunk_size=chunk_size) == expected
+
+
+def test_reader_close_after_short_feeds():
+    reader = SegmentReader()
+    assert reader.feed("BG") == []
+    assert reader.feed("M'D") == []
+    assert [(segment.tag, segment.elements) for segment in reader.close()] == [("BGM", []), ("D", [])]
@@ -0,0 +1,37 @@
+# tests/test_interchange.py
+from edi_explainers.interchange import ENVELOPE_TAGS, annotate_interchange
+from edi_explainers.registry import SPEC_REGISTRY
+
+
+def _by_tag(text, **kwargs):
+    return {annotation["tag"]: annotation for annotation in annotate_interchange(text, **kwargs)}
+
+
+def test_edifact_envelope_before_unh_is_explained():
+    annotations = _by_tag("UNB+UNOC:3+SENDER+RECEIVER+230803:0501+1'UNH+1+DELFOR:D:04A:UN'BGM+241+1+5'UNT+3+1'UNZ+1+1'")
+    assert annotations["UNB"]["found"] and annotations["UNB"]["key"] == "UNB"
+    assert annotations["UNH"]["spec"] == "DELFOR D04A"
+    assert annotations["UNT"]["found"] and annotations["UNZ"]["found"]
+
+
+X12_856_005010 = (
+    "ISA*00*          *00*          *01*123456789      *ZZ*SUPPLIER01     *240803*0501*U*00501*000000101*0*P*>~"
+    "GS*SH*123456789*SUPPLIER01*20240803*0501*101*X*005010~"
+    "ST*856*0001~BSN*00*SHIP0001*20240803*0501~SE*3*0001~"
+    "GE*1*101~IEA*1*000000101~"
+)
+
+
+def test_every_x12_table_defines_the_envelope():
+    for (standard, message_type, version), table in SPEC_REGISTRY.items():
+        if standard == "X12":
+            assert ENVELOPE_TAGS["X12"] <= set(table), f"{message_type} {version}"
+
+
+def test_x12_envelope_is_explained_for_an_unregistered_version():
+    annotations = _by_tag(X12_856_005010, standard="X12")
+    for tag in ("ISA", "GS", "GE", "IEA"):
+        assert annotations[tag]["found"], tag
+        assert annotations[tag]["key"] == tag
+    # 005010 is not registered: the transaction set itself is not explained.
+    assert not annotations["BSN"]["found"]
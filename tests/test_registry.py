@@ -0,0 +1,19 @@
+# tests/test_registry.py
+from edi_explainers.registry import ambiguous_versions, explain_batch, spec_key
+
+
+def test_blank_version_is_filled_in_when_only_one_is_registered():
+    assert spec_key("x12", "830", "") == ("X12", "830", "004010")
+    assert spec_key("X12", "856", None) == ("X12", "856", "004010")
+    assert ambiguous_versions("X12", "830", "") == []
+
+
+def test_blank_version_stays_blank_when_several_are_registered():
+    assert spec_key("EDIFACT", "DELFOR", "") == ("EDIFACT", "DELFOR", "")
+    assert ambiguous_versions("EDIFACT", "DELFOR", "") == ["D04A", "D96A"]
+    assert ambiguous_versions("EDIFACT", "DELFOR", "D96A") == []
+
+
+def test_x12_lookup_without_version():
+    result = explain_batch([("X12", "830", "", "BFR")])[0]
+    assert result["found"] and result["version"] == "004010"